@@ -92,6 +92,23 @@ resource "aws_iam_role_policy_attachment" "S3AccessPolicy_attach" {
   policy_arn = aws_iam_policy.S3AccessPolicy.arn
 }
 
+# Read the receipts' OCR text sidecars (GET /receipts/{id})
+resource "aws_iam_role_policy" "api_receipt_text_policy" {
+  name = "receipt-api-receipt-text"
+  role = aws_iam_role.receipt-api-role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = "s3:GetObject"
+        Resource = "${aws_s3_bucket.receipt_text.arn}/*"
+      }
+    ]
+  })
+}
+
 # Lambda trust policy
 data "aws_iam_policy_document" "lambda_assume_role" {
   statement {
@@ -126,7 +143,59 @@ resource "aws_iam_role_policy_attachment" "lambda_dynamodb_full" {
   policy_arn = "arn:aws:iam::aws:policy/AmazonDynamoDBFullAccess"
 }
 
-# 4) Custom role policy (your JSON as an inline policy)
+# 4) AWSLambdaSQSQueueExecutionRole (receive/delete from the upload queue)
+resource "aws_iam_role_policy_attachment" "lambda_sqs_execution" {
+  role       = aws_iam_role.receipt_scanner_lambda_role.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaSQSQueueExecutionRole"
+}
+
+# 5) Read/write the OCR cache bucket
+resource "aws_iam_role_policy" "lambda_ocr_cache_policy" {
+  name = "receipt-processor-ocr-cache"
+  role = aws_iam_role.receipt_scanner_lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject"
+        ]
+        Resource = "${aws_s3_bucket.ocr_cache.arn}/*"
+      },
+      {
+        # Lets GetObject report a miss as NoSuchKey instead of AccessDenied
+        Effect   = "Allow"
+        Action   = "s3:ListBucket"
+        Resource = aws_s3_bucket.ocr_cache.arn
+      }
+    ]
+  })
+}
+
+# 5b) Write and read the receipts' OCR text sidecars (see lambda/text_store.py)
+resource "aws_iam_role_policy" "lambda_receipt_text_policy" {
+  name = "receipt-processor-receipt-text"
+  role = aws_iam_role.receipt_scanner_lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject"
+        ]
+        Resource = "${aws_s3_bucket.receipt_text.arn}/*"
+      }
+    ]
+  })
+}
+
+# 6) Custom role policy (your JSON as an inline policy)
 resource "aws_iam_role_policy" "lambda_custom_logs_policy" {
   name = "receipt-processor-custom-logs"
   role = aws_iam_role.receipt_scanner_lambda_role.id
@@ -660,6 +660,69 @@ resource "aws_api_gateway_integration_response" "presigned_url_options" { # Inte
     }
 }
 
+resource "aws_api_gateway_resource" "dashboard" { # /analytics/dashboard
+  rest_api_id = aws_api_gateway_rest_api.receipt_scanner.id
+  parent_id = aws_api_gateway_resource.analytics.id
+  path_part = "dashboard"
+}
+resource "aws_api_gateway_method" "dashboard_get" { # /analytics/dashboard-GET
+  rest_api_id = aws_api_gateway_rest_api.receipt_scanner.id
+  resource_id = aws_api_gateway_resource.dashboard.id
+  http_method = "GET"
+  authorization = "COGNITO_USER_POOLS"
+  authorizer_id = aws_api_gateway_authorizer.cognito.id
+}
+resource "aws_api_gateway_integration" "dashboard_get_lambda" { # Lambda Integration for dashboard-GET
+  rest_api_id = aws_api_gateway_rest_api.receipt_scanner.id
+  resource_id = aws_api_gateway_resource.dashboard.id
+  http_method = aws_api_gateway_method.dashboard_get.http_method
+
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri = aws_lambda_function.receipt-api.invoke_arn
+}
+resource "aws_api_gateway_method" "dashboard_options" { # /analytics/dashboard-OPTIONS(For CORS)
+  rest_api_id = aws_api_gateway_rest_api.receipt_scanner.id
+  resource_id = aws_api_gateway_resource.dashboard.id
+  http_method = "OPTIONS"
+  authorization = "NONE"
+}
+resource "aws_api_gateway_integration" "dashboard_options" { # Mock Integration for OPTIONS
+  rest_api_id = aws_api_gateway_rest_api.receipt_scanner.id
+  resource_id = aws_api_gateway_resource.dashboard.id
+  http_method = aws_api_gateway_method.dashboard_options.http_method
+  type        = "MOCK"
+
+  request_templates = {
+    "application/json" = "{\"statusCode\": 200}"
+  }
+}
+resource "aws_api_gateway_method_response" "dashboard_options" {  # Method Response for OPTIONS (CORS Headers)
+  rest_api_id = aws_api_gateway_rest_api.receipt_scanner.id
+  resource_id = aws_api_gateway_resource.dashboard.id
+  http_method = aws_api_gateway_method.dashboard_options.http_method
+  status_code = "200"
+
+  response_parameters = {
+    "method.response.header.Access-Control-Allow-Origin" = true
+    "method.response.header.Access-Control-Allow-Methods" = true
+    "method.response.header.Access-Control-Allow-Headers" = true
+  }
+}
+resource "aws_api_gateway_integration_response" "dashboard_options" { # Integration Response for OPTIONS (CORS Headers)
+  rest_api_id = aws_api_gateway_rest_api.receipt_scanner.id
+  resource_id = aws_api_gateway_resource.dashboard.id
+  http_method = aws_api_gateway_method.dashboard_options.http_method
+  status_code = aws_api_gateway_method_response.dashboard_options.status_code
+  depends_on = [ aws_api_gateway_integration.dashboard_options ]
+
+  response_parameters = {
+      "method.response.header.Access-Control-Allow-Origin" = "'*'"
+      "method.response.header.Access-Control-Allow-Methods" = "'GET,OPTIONS'"
+      "method.response.header.Access-Control-Allow-Headers" = "'Content-Type,Authorization'"
+    }
+}
+
 #######################################################################################
 resource "aws_api_gateway_deployment" "receipt-scanner-api" {
   rest_api_id = aws_api_gateway_rest_api.receipt_scanner.id
@@ -672,6 +735,8 @@ resource "aws_api_gateway_deployment" "receipt-scanner-api" {
     aws_api_gateway_integration.patterns_options,
     aws_api_gateway_integration.summary_get_lambda,
     aws_api_gateway_integration.summary_options,
+    aws_api_gateway_integration.dashboard_get_lambda,
+    aws_api_gateway_integration.dashboard_options,
     aws_api_gateway_integration.login_post_lambda,
     aws_api_gateway_integration.login_options,
     aws_api_gateway_integration.register_post_lambda,
@@ -42,7 +42,62 @@ resource "aws_dynamodb_table" "receipts" {
     attribute {
         name = "user_id"
         type = "S"
-    }      
+    }
+    # Per-user reads query this index instead of scanning the whole table
+    global_secondary_index {
+        name = "user_id-purchase_date-index"
+        hash_key = "user_id"
+        range_key = "purchase_date"
+        projection_type = "ALL"
+    }
+}
+
+
+# Per-user monthly spending rollups, maintained by the OCR lambda at ingest time
+resource "aws_dynamodb_table" "monthly_rollups" {
+    name = "ReceiptMonthlyRollups"
+    billing_mode = "PAY_PER_REQUEST"
+    hash_key = "user_id"
+    range_key = "year_month"
+    attribute {
+        name = "user_id"
+        type = "S"
+    }
+    attribute {
+        name = "year_month"
+        type = "S"
+    }
+}
+
+# Content hashes of every saved receipt per user, used by the OCR lambda to skip duplicate uploads
+resource "aws_dynamodb_table" "receipt_dedup" {
+    name = "ReceiptDedup"
+    billing_mode = "PAY_PER_REQUEST"
+    hash_key = "user_id"
+    range_key = "content_hash"
+    attribute {
+        name = "user_id"
+        type = "S"
+    }
+    attribute {
+        name = "content_hash"
+        type = "S"
+    }
+}
+
+# Serialized analytics responses shared by the API lambda's containers (see api/response_cache.py)
+resource "aws_dynamodb_table" "response_cache" {
+    name = "ApiResponseCache"
+    billing_mode = "PAY_PER_REQUEST"
+    hash_key = "cache_key"
+    attribute {
+        name = "cache_key"
+        type = "S"
+    }
+    ttl {
+        attribute_name = "expires_at"
+        enabled = true
+    }
 }
 
 
@@ -34,6 +34,21 @@ resource "null_resource" "docker_build_and_push" {
   triggers = {
     dockerfile_hash = filesha256("${path.module}/../lambda/Dockerfile")
     context_hash = filesha256("${path.module}/../lambda/app.py")
+    rollups_hash = filesha256("${path.module}/../lambda/rollups.py")
+    normalize_hash = filesha256("${path.module}/../lambda/normalize.py")
+    dedup_hash = filesha256("${path.module}/../lambda/dedup.py")
+    ocr_cache_hash = filesha256("${path.module}/../lambda/ocr_cache.py")
+    reparse_hash = filesha256("${path.module}/../lambda/reparse.py")
+    extraction_hash = filesha256("${path.module}/../lambda/extraction.py")
+    merchants_hash = filesha256("${path.module}/../lambda/merchants.py")
+    merchants_json_hash = filesha256("${path.module}/../lambda/merchants.json")
+    preprocess_hash = filesha256("${path.module}/../lambda/preprocess.py")
+    ocr_engine_hash = filesha256("${path.module}/../lambda/ocr_engine.py")
+    roi_hash = filesha256("${path.module}/../lambda/roi.py")
+    ingest_hash = filesha256("${path.module}/../lambda/ingest.py")
+    tracing_hash = filesha256("${path.module}/../lambda/tracing.py")
+    text_store_hash = filesha256("${path.module}/../lambda/text_store.py")
+    data_version_hash = filesha256("${path.module}/../lambda/data_version.py")
     requirements = filesha256("${path.module}/../lambda/requirements.txt")
     image_tag = var.image_tag
     repo_url = aws_ecr_repository.receipt_scanner.repository_url
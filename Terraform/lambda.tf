@@ -13,7 +13,17 @@ resource "aws_lambda_function" "receipt-api" {
       COGNITO_USER_POOL_ID = aws_cognito_user_pool.receipt_scanner.id
       DYNAMODB_RECEIPTS_TABLE = aws_dynamodb_table.receipts.name
       DYNAMODB_USERS_TABLE = aws_dynamodb_table.users.name
+      DYNAMODB_ROLLUPS_TABLE = aws_dynamodb_table.monthly_rollups.name
+      # Set to "true" once lambda/migrate_receipts.py has finished; analytics only read the rollups then
+      RECEIPTS_MIGRATED = "false"
       S3_BUCKET_NAME = aws_s3_bucket.public_storage.bucket
+      RAW_TEXT_BUCKET = aws_s3_bucket.receipt_text.bucket
+      LOG_LEVEL = "INFO"
+      SLOW_REQUEST_MS = "1000"
+      PROFILE_CACHE_SIZE = "1024"
+      PROFILE_CACHE_TTL_SECONDS = "60"
+      DYNAMODB_FANOUT_WORKERS = "8"
+      RESPONSE_CACHE_TABLE = aws_dynamodb_table.response_cache.name
     }
   }
 }
@@ -73,6 +83,17 @@ resource "aws_lambda_function" "receipt-ocr-container" {
   environment {
     variables = {
       DYNAMODB_RECEIPTS_TABLE = aws_dynamodb_table.receipts.name
+      DYNAMODB_ROLLUPS_TABLE = aws_dynamodb_table.monthly_rollups.name
+      DYNAMODB_DEDUP_TABLE = aws_dynamodb_table.receipt_dedup.name
+      DYNAMODB_USERS_TABLE = aws_dynamodb_table.users.name
+      DEDUP_MODE = "link"
+      OCR_CACHE_BUCKET = aws_s3_bucket.ocr_cache.bucket
+      RAW_TEXT_BUCKET = aws_s3_bucket.receipt_text.bucket
+      OCR_BACKEND = "auto"
+      OCR_FULL_TEXT = "false"
+      MAX_UPLOAD_MB = "25"
+      OCR_WARMUP = "true"
+      TRACING = "true"
       S3_BUCKET_NAME = aws_s3_bucket.public_storage.bucket
     }
   }
@@ -80,21 +101,60 @@ resource "aws_lambda_function" "receipt-ocr-container" {
   depends_on = [ null_resource.docker_build_and_push ]  # Ensure the image is built and pushed before creating the Lambda function
 }
 
-resource "aws_lambda_permission" "allow_s3_receipt_process" {
-  statement_id  = "AllowS3InvokeReceiptProcess"
-  action        = "lambda:InvokeFunction"
-  function_name = aws_lambda_function.receipt-ocr-container.function_name
-  principal     = "s3.amazonaws.com"
-  source_arn    = aws_s3_bucket.public_storage.arn
+# Uploads go through SQS so the OCR lambda receives them in batches and
+# reports per-message failures instead of retrying the whole batch.
+resource "aws_sqs_queue" "receipt_uploads_dlq" {
+  name = "receipt-uploads-dlq"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "receipt_uploads" {
+  name = "receipt-uploads"
+  visibility_timeout_seconds = 1800 # 6x the OCR lambda timeout, as AWS recommends for SQS triggers
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.receipt_uploads_dlq.arn
+    maxReceiveCount = 3
+  })
+}
+
+data "aws_iam_policy_document" "receipt_uploads_from_s3" {
+  statement {
+    effect = "Allow"
+    principals {
+      type        = "Service"
+      identifiers = ["s3.amazonaws.com"]
+    }
+    actions   = ["sqs:SendMessage"]
+    resources = [aws_sqs_queue.receipt_uploads.arn]
+    condition {
+      test     = "ArnEquals"
+      variable = "aws:SourceArn"
+      values   = [aws_s3_bucket.public_storage.arn]
+    }
+  }
+}
+
+resource "aws_sqs_queue_policy" "receipt_uploads" {
+  queue_url = aws_sqs_queue.receipt_uploads.id
+  policy = data.aws_iam_policy_document.receipt_uploads_from_s3.json
+}
+
+resource "aws_lambda_event_source_mapping" "receipt_uploads" {
+  event_source_arn = aws_sqs_queue.receipt_uploads.arn
+  function_name = aws_lambda_function.receipt-ocr-container.arn
+  batch_size = 10
+  maximum_batching_window_in_seconds = 5
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 resource "aws_s3_bucket_notification" "receipt_process_notification" {
   bucket = aws_s3_bucket.public_storage.id
 
-  lambda_function {
-    lambda_function_arn = aws_lambda_function.receipt-ocr-container.arn
-    events              = ["s3:ObjectCreated:*"]
+  queue {
+    queue_arn = aws_sqs_queue.receipt_uploads.arn
+    events    = ["s3:ObjectCreated:*"]
   }
 
-  depends_on = [aws_lambda_permission.allow_s3_receipt_process]
+  depends_on = [aws_sqs_queue_policy.receipt_uploads]
 }
\ No newline at end of file
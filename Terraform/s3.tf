@@ -108,6 +108,30 @@ data "aws_iam_policy_document" "public_storage_policy" {
     ]
   }
 }
+# Private bucket for cached raw OCR output (see lambda/ocr_cache.py)
+resource "aws_s3_bucket" "ocr_cache" {
+  bucket = "receipt-scanner-ocr-cache"
+}
+resource "aws_s3_bucket_public_access_block" "ocr_cache" {
+  bucket = aws_s3_bucket.ocr_cache.id
+
+  block_public_acls = true
+  block_public_policy = true
+  ignore_public_acls = true
+  restrict_public_buckets = true
+}
+# Private bucket for the receipts' OCR text, kept out of the DynamoDB items (see lambda/text_store.py)
+resource "aws_s3_bucket" "receipt_text" {
+  bucket = "receipt-scanner-receipt-text"
+}
+resource "aws_s3_bucket_public_access_block" "receipt_text" {
+  bucket = aws_s3_bucket.receipt_text.id
+
+  block_public_acls = true
+  block_public_policy = true
+  ignore_public_acls = true
+  restrict_public_buckets = true
+}
 # Create S3 bucket for receipts scanner dev
 resource "aws_s3_bucket" "nikhil_dev" {
   bucket = "receipt-scanner-nikhil-dev"
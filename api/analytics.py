@@ -0,0 +1,307 @@
+"""Single-pass receipt aggregation shared by the analytics routes.
+
+Each accumulator builds the payload of one endpoint from receipts fed to it
+one at a time (and, where possible, from monthly rollups). ReceiptAggregator
+hands every item of a single read to all accumulators whose date range
+contains it, so /analytics/dashboard builds every payload from one query
+while the individual routes stay thin views over the same code.
+"""
+from collections import deque
+from datetime import datetime, timedelta
+
+def parse_amount(amount_str):
+    """Parse a stored total_amount ("41,21" or "41.21") into a float"""
+    return float(amount_str.replace(',', '.'))
+
+def item_amount(item):
+    """Return a receipt's total as a float, preferring the canonical amount_cents"""
+    cents = item.get('amount_cents')
+    if cents is not None:
+        return float(cents) / 100
+    return parse_amount(item.get('total_amount', '0,00'))
+
+def parse_receipt_date(date_str):
+    """Parse an ISO or German DD.MM.YY[YY] purchase date, or return None"""
+    if '-' in date_str and len(date_str) == 10:
+        return datetime.strptime(date_str, '%Y-%m-%d')
+    if '.' in date_str:
+        parts = date_str.split('.')
+        if len(parts) == 3:
+            day, month, year = parts
+            if len(year) == 2:
+                year = '20' + year
+            return datetime(int(year), int(month), int(day))
+    return None
+
+def date_in_range(date_str, start_date=None, end_date=None):
+    """Mirror the purchase_date key condition: a plain string range comparison"""
+    if start_date and date_str < start_date:
+        return False
+    if end_date and date_str > end_date:
+        return False
+    return True
+
+class SummaryAccumulator:
+    """Category totals for /analytics/summary"""
+
+    def __init__(self):
+        self.category_totals = {}
+        self.total_amount = 0
+        self.total_receipts = 0
+
+    def add(self, item):
+        category = item.get('category', 'other')
+        try:
+            amount = item_amount(item)
+        except (ValueError, AttributeError):
+            return
+        self.category_totals[category] = self.category_totals.get(category, 0) + amount
+        self.total_amount += amount
+        self.total_receipts += 1
+
+    def add_month(self, month):
+        for category, amount in month['categories'].items():
+            self.category_totals[category] = self.category_totals.get(category, 0) + amount
+        self.total_amount += month['total']
+        self.total_receipts += month['count']
+
+    def payload(self, budget):
+        return {
+            'total_amount': round(self.total_amount, 2),
+            'total_receipts': self.total_receipts,
+            'by_category': {k: round(v, 2) for k, v in self.category_totals.items()},
+            'budget': budget,
+            'budget_used': round(self.total_amount, 2),
+            'budget_remaining': round(budget - self.total_amount, 2) if budget > 0 else 0
+        }
+
+class MonthlyAccumulator:
+    """Per-month totals with category breakdown for /analytics/monthly"""
+
+    def __init__(self):
+        self.monthly_data = {}
+
+    def add(self, item):
+        purchase_date = item.get('purchase_date')
+        if not purchase_date:
+            return
+        try:
+            month_key = None
+            if '-' in purchase_date and len(purchase_date) == 10:
+                month_key = purchase_date[:7]
+            elif '.' in purchase_date:
+                parts = purchase_date.split('.')
+                if len(parts) == 3:
+                    day, month, year = parts
+                    # Same century rule as parse_receipt_date and the rollups
+                    if len(year) == 2:
+                        year = '20' + year
+                    month_key = f"{year}-{month.zfill(2)}"
+            if not month_key:
+                return
+
+            amount = item_amount(item)
+        except (ValueError, AttributeError):
+            return
+        category = item.get('category', 'other')
+
+        data = self.monthly_data.setdefault(month_key, {'total': 0, 'count': 0, 'categories': {}})
+        data['total'] += amount
+        data['count'] += 1
+        data['categories'][category] = data['categories'].get(category, 0) + amount
+
+    def add_month(self, month_key, month):
+        self.monthly_data[month_key] = month
+
+    def payload(self):
+        return [
+            {
+                'month': month,
+                'total_amount': round(data['total'], 2),
+                'receipt_count': data['count'],
+                **{category: round(amount, 2) for category, amount in data['categories'].items()}
+            }
+            for month, data in sorted(self.monthly_data.items())
+        ]
+
+class MetricsAccumulator:
+    """Average, most expensive receipt, top merchant and month-over-month change for /analytics/metrics"""
+
+    def __init__(self, now=None):
+        now = now or datetime.now()
+        self.current_month = now.strftime('%Y-%m')
+        self.prev_month = (now.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+        self.receipt_count = 0
+        self.amount_sum = 0
+        self.most_expensive = None
+        self.merchant_counts = {}
+        self.current_total = 0
+        self.prev_total = 0
+
+    def add(self, item):
+        try:
+            amount = item_amount(item)
+        except (ValueError, AttributeError):
+            return
+        merchant = item.get('merchant', '')
+        date = item.get('purchase_date', '')
+
+        self.receipt_count += 1
+        self.amount_sum += amount
+        if self.most_expensive is None or amount > self.most_expensive['amount']:
+            self.most_expensive = {'amount': amount, 'merchant': merchant, 'date': date}
+        merchant_key = merchant or 'Unknown'
+        self.merchant_counts[merchant_key] = self.merchant_counts.get(merchant_key, 0) + 1
+        if self.current_month in date:
+            self.current_total += amount
+        if self.prev_month in date:
+            self.prev_total += amount
+
+    def payload(self):
+        if not self.receipt_count:
+            return {
+                'average_spending': 0,
+                'most_expensive': {'amount': 0, 'merchant': '', 'date': ''},
+                'most_frequent_merchant': {'name': '', 'count': 0},
+                'month_comparison': {'current': 0, 'previous': 0, 'change_percent': 0}
+            }
+
+        most_frequent = max(self.merchant_counts.items(), key=lambda x: x[1])
+        change_percent = ((self.current_total - self.prev_total) / self.prev_total * 100) if self.prev_total > 0 else 0
+        return {
+            'average_spending': round(self.amount_sum / self.receipt_count, 2),
+            'most_expensive': {
+                'amount': round(self.most_expensive['amount'], 2),
+                'merchant': self.most_expensive['merchant'],
+                'date': self.most_expensive['date']
+            },
+            'most_frequent_merchant': {
+                'name': most_frequent[0],
+                'count': most_frequent[1]
+            },
+            'month_comparison': {
+                'current': round(self.current_total, 2),
+                'previous': round(self.prev_total, 2),
+                'change_percent': round(change_percent, 1)
+            }
+        }
+
+class PatternsAccumulator:
+    """Weekday/weekend split and next-month forecast for /analytics/patterns"""
+
+    def __init__(self):
+        self.weekday_total = self.weekend_total = 0
+        self.weekday_count = self.weekend_count = 0
+        self.monthly_totals = {}
+
+    def add(self, item):
+        try:
+            amount = item_amount(item)
+            receipt_date = parse_receipt_date(item.get('purchase_date', ''))
+        except (ValueError, AttributeError, TypeError):
+            return
+        if not receipt_date:
+            return
+
+        if receipt_date.weekday() < 5:
+            self.weekday_total += amount
+            self.weekday_count += 1
+        else:
+            self.weekend_total += amount
+            self.weekend_count += 1
+        month_key = receipt_date.strftime('%Y-%m')
+        self.monthly_totals[month_key] = self.monthly_totals.get(month_key, 0) + amount
+
+    def add_month(self, month_key, month):
+        self.weekday_total += month['weekday_total']
+        self.weekday_count += month['weekday_count']
+        self.weekend_total += month['weekend_total']
+        self.weekend_count += month['weekend_count']
+        self.monthly_totals[month_key] = month['total']
+
+    def payload(self):
+        sorted_months = sorted(self.monthly_totals.items())[-3:]
+        avg_monthly = sum(total for _, total in sorted_months) / len(sorted_months) if sorted_months else 0
+        return {
+            'weekday_vs_weekend': {
+                'weekday_total': round(self.weekday_total, 2),
+                'weekend_total': round(self.weekend_total, 2),
+                'weekday_avg': round(self.weekday_total / self.weekday_count, 2) if self.weekday_count > 0 else 0,
+                'weekend_avg': round(self.weekend_total / self.weekend_count, 2) if self.weekend_count > 0 else 0
+            },
+            'prediction': {
+                'next_month_forecast': round(avg_monthly, 2),
+                'based_on_months': len(sorted_months)
+            }
+        }
+
+class ListingAccumulator:
+    """First page of receipts matching the /receipts filters, in the same order as /receipts
+
+    Receipts arrive oldest first. For a newest-first page only the last
+    ``limit`` matches are kept, newest at the front.
+    """
+
+    def __init__(self, category=None, merchant=None, limit=50, newest_first=True,
+                 omit=('raw_text', 'raw_text_gz', 'raw_text_key')):
+        self.category = category
+        self.merchant = merchant
+        self.limit = limit
+        self.newest_first = newest_first
+        self.omit = omit
+        self.receipts = deque(maxlen=limit) if newest_first else []
+        self.has_more = False
+
+    def add(self, item):
+        if self.category and item.get('category') != self.category:
+            return
+        if self.merchant and self.merchant not in (item.get('merchant') or ''):
+            return
+        if self.newest_first:
+            # A full deque drops its oldest receipt, which then follows on the next page
+            self.has_more = self.has_more or len(self.receipts) == self.limit
+            self.receipts.appendleft(item)
+        elif len(self.receipts) < self.limit:
+            self.receipts.append(item)
+        else:
+            self.has_more = True
+
+    def last_item(self):
+        """Last returned receipt when more follow; /receipts continues after it (see receipt_store.encode_cursor)"""
+        if not self.has_more or not self.receipts:
+            return None
+        return self.receipts[-1]
+
+    def payload(self):
+        # Same shape as the /receipts listing, which leaves out the OCR text
+        return [{k: v for k, v in receipt.items() if k not in self.omit} for receipt in self.receipts]
+
+class ReceiptAggregator:
+    """Feed one stream of receipts to several accumulators, each with its own date range"""
+
+    def __init__(self):
+        self.views = []
+
+    def add_view(self, accumulator, start_date=None, end_date=None):
+        self.views.append((accumulator, start_date, end_date))
+
+    def date_range(self):
+        """Smallest (start_date, end_date) range covering every view; None means unbounded"""
+        if not self.views:
+            return None, None
+        starts = [start for _, start, _ in self.views]
+        ends = [end for _, _, end in self.views]
+        start_date = min(starts) if all(starts) else None
+        end_date = max(ends) if all(ends) else None
+        return start_date, end_date
+
+    def add(self, item):
+        purchase_date = item.get('purchase_date', '')
+        for accumulator, start_date, end_date in self.views:
+            if date_in_range(purchase_date, start_date, end_date):
+                accumulator.add(item)
+
+    def consume(self, items):
+        for item in items:
+            self.add(item)
+        return self
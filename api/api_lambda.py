@@ -1,17 +1,57 @@
 import json
+import logging
 import boto3
 from decimal import Decimal
 from datetime import datetime, timedelta
 from boto3.dynamodb.conditions import Key, Attr
 import os
+from receipt_store import (
+    get_dynamodb_resource, list_user_receipts, encode_cursor, iter_user_receipts, iter_user_rollups,
+    read_receipt_text, submit, TEXT_ATTRIBUTES
+)
+from analytics import (
+    SummaryAccumulator, MonthlyAccumulator, MetricsAccumulator, PatternsAccumulator,
+    ListingAccumulator, ReceiptAggregator
+)
+from columnar import ColumnarAggregator
+from request_metrics import instrument_dynamodb, track_requests
+from profile_cache import ProfileStore
+from response_cache import (
+    ResponseCache, response_key, etag, if_none_match, RESPONSE_CACHE, RESPONSE_CACHE_TABLE
+)
+
+# Debug output (full events, DynamoDB responses) only with LOG_LEVEL=DEBUG; the
+# message arguments are formatted lazily, so the default path never builds them
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL)
+logging.getLogger().setLevel(LOG_LEVEL)
+logger = logging.getLogger(__name__)
 
 USER_POOL_ID = os.getenv('COGNITO_USER_POOL_ID')
 CLIENT_ID = os.getenv('COGNITO_CLIENT_ID')
 S3_BUCKET = os.getenv('S3_BUCKET_NAME')
+# Sidecar objects with the receipts' OCR text (see receipt_store.read_receipt_text)
+RAW_TEXT_BUCKET = os.getenv('RAW_TEXT_BUCKET')
+_s3_client = None
 
-dynamodb = boto3.resource('dynamodb')
+dynamodb = get_dynamodb_resource()
+# Every DynamoDB call reports its consumed capacity and item counts to the request metrics
+instrument_dynamodb(dynamodb.meta.client)
 table = dynamodb.Table(os.getenv('DYNAMODB_RECEIPTS_TABLE'))
 users_table = dynamodb.Table(os.getenv('DYNAMODB_USERS_TABLE'))
+# Users items cached per container with a TTL; writes through here keep the cache current
+profiles = ProfileStore(users_table)
+# Analytics responses by user data version, in memory and optionally in a shared table
+responses = ResponseCache(dynamodb.Table(RESPONSE_CACHE_TABLE) if RESPONSE_CACHE_TABLE else None)
+# Monthly rollups maintained by the OCR lambda; without them analytics read raw receipts.
+# Rollups put legacy DD.MM.YY dates in their real month, but date-range queries on raw
+# receipts compare strings. So until lambda/migrate_receipts.py has made every purchase_date
+# ISO (RECEIPTS_MIGRATED=true), the raw path is used alone to keep both paths' totals equal.
+ROLLUPS_TABLE = os.getenv('DYNAMODB_ROLLUPS_TABLE')
+RECEIPTS_MIGRATED = os.getenv('RECEIPTS_MIGRATED', 'false').lower() == 'true'
+rollups_table = dynamodb.Table(ROLLUPS_TABLE) if ROLLUPS_TABLE and RECEIPTS_MIGRATED else None
+# 'auto' uses the NumPy engine when NumPy is importable; 'python' forces the row-wise one
+ANALYTICS_ENGINE = os.getenv('ANALYTICS_ENGINE', 'auto')
 
 def decimal_default(obj):
     """JSON serializer for Decimal objects"""
@@ -39,17 +79,97 @@ def get_user_from_token(event):
         if user_id and len(user_id) > 10 and '-' in user_id:
             return user_id
         else:
-            print(f"Invalid user_id format from JWT: {user_id}")
+            logger.warning('Invalid user_id format from JWT: %s', user_id)
             return None
     except Exception as e:
-        print(f"Error extracting user_id from token: {e}")
+        logger.error('Error extracting user_id from token: %s', e)
+        return None
+
+def get_s3_client():
+    """S3 client for reading text sidecars, created on first use so other routes don't pay for it"""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+def rollup_month_range(start_date, end_date):
+    """Return (start_month, end_month) if the date range covers whole months, otherwise None"""
+    if rollups_table is None:
+        return None
+    try:
+        if start_date and datetime.strptime(start_date, '%Y-%m-%d').day != 1:
+            return None
+        if end_date:
+            end = datetime.strptime(end_date, '%Y-%m-%d')
+            # Nothing can be purchased after today, so a range ending today or
+            # later still covers its whole month.
+            if (end + timedelta(days=1)).day != 1 and end.date() < datetime.now().date():
+                return None
+    except ValueError:
         return None
+    return (start_date[:7] if start_date else None, end_date[:7] if end_date else None)
+
+def load_monthly_rollups(user_id, start_month=None, end_month=None):
+    """Return {month: {'total', 'count', 'weekday_*', 'weekend_*', 'categories'}} from the rollups table"""
+    monthly_data = {}
+    for item in iter_user_rollups(rollups_table, user_id, start_month, end_month):
+        monthly_data[item['year_month']] = {
+            'total': float(item.get('total_amount', 0)),
+            'count': int(item.get('receipt_count', 0)),
+            'weekday_total': float(item.get('weekday_total', 0)),
+            'weekday_count': int(item.get('weekday_count', 0)),
+            'weekend_total': float(item.get('weekend_total', 0)),
+            'weekend_count': int(item.get('weekend_count', 0)),
+            'categories': {
+                name[len('category_'):]: float(value)
+                for name, value in item.items() if name.startswith('category_')
+            }
+        }
+    return monthly_data
+
+def cached_response(event, path, query_params, user_id, handler):
+    """Answer an analytics request from the response cache, or call the handler and cache its response"""
+    if not RESPONSE_CACHE:
+        return handler(query_params, user_id)
+    try:
+        profile = profiles.refresh(user_id)
+    except Exception as e:
+        logger.warning('Data version lookup failed, not caching: %s', e)
+        return handler(query_params, user_id)
+    key = response_key(user_id, path, query_params, (profile or {}).get('data_version', 0))
+    headers = {
+        **cors_headers(),
+        'ETag': etag(key),
+        'Cache-Control': 'private, no-cache',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+    if etag(key) in if_none_match(event):
+        return {'statusCode': 304, 'headers': headers, 'body': ''}
+    
+    body = responses.get(key)
+    if body is None:
+        response = handler(query_params, user_id)
+        if response['statusCode'] != 200:
+            return response
+        body = response['body']
+        responses.put(key, body)
+        logger.info('Response cache miss for %s (%s)', path, responses.stats())
+    else:
+        logger.debug('Response cache hit for %s', path)
+    return {'statusCode': 200, 'headers': headers, 'body': body}
+
+def new_aggregator():
+    """Return the vectorized aggregator when available, else the row-wise one"""
+    if ColumnarAggregator is not None and ANALYTICS_ENGINE != 'python':
+        return ColumnarAggregator()
+    return ReceiptAggregator()
 
+@track_requests
 def lambda_handler(event, context):
     try:
         # Check if this is a direct profile update invocation
         if 'user_id' in event and 'monthly_budget' in event and 'httpMethod' not in event:
-            print(f"Direct profile update invocation: {event}")
+            logger.debug('Direct profile update invocation: %s', event)
             # Extract user_id and treat as profile update
             user_id = event.get('user_id')
             if user_id:
@@ -67,10 +187,7 @@ def lambda_handler(event, context):
         query_params = event.get('queryStringParameters') or {}
         path_params = event.get('pathParameters') or {}
         
-        print(f"Lambda handler called: {http_method} {path}")
-        print(f"Full event keys: {list(event.keys())}")
-        if path == '/profile' and http_method == 'PUT':
-            print(f"Profile update request received: {event.get('body', 'No body')}")
+        logger.debug('Lambda handler called: %s %s, event keys: %s', http_method, path, event.keys())
         
         # Public endpoints
         if path == '/test' and http_method == 'GET':
@@ -99,13 +216,15 @@ def lambda_handler(event, context):
             receipt_id = path_params.get('id')
             return get_receipt_by_id(receipt_id, user_id)
         elif path == '/analytics/summary' and http_method == 'GET':
-            return get_spending_summary(query_params, user_id)
+            return cached_response(event, path, query_params, user_id, get_spending_summary)
         elif path == '/analytics/monthly' and http_method == 'GET':
-            return get_monthly_trends(query_params, user_id)
+            return cached_response(event, path, query_params, user_id, get_monthly_trends)
         elif path == '/analytics/metrics' and http_method == 'GET':
-            return get_key_metrics(query_params, user_id)
+            return cached_response(event, path, query_params, user_id, get_key_metrics)
         elif path == '/analytics/patterns' and http_method == 'GET':
-            return get_spending_patterns(query_params, user_id)
+            return cached_response(event, path, query_params, user_id, get_spending_patterns)
+        elif path == '/analytics/dashboard' and http_method == 'GET':
+            return cached_response(event, path, query_params, user_id, get_dashboard)
         elif path == '/upload/presigned-url' and http_method == 'POST':
             return get_presigned_upload_url(event, user_id)
         elif path == '/profile' and http_method == 'GET':
@@ -117,8 +236,7 @@ def lambda_handler(event, context):
                 'body': json.dumps({'message': 'PUT request working', 'body': event.get('body')})
             }
         elif path == '/profile' and http_method == 'PUT':
-            print(f"PUT /profile - user_id: {user_id}")
-            print(f"Request context: {event.get('requestContext', {})}")
+            logger.debug('PUT /profile - user_id: %s, request context: %s', user_id, event.get('requestContext'))
             return update_user_profile(event, user_id)
         elif http_method == 'OPTIONS':
             return {
@@ -139,6 +257,7 @@ def lambda_handler(event, context):
             }
             
     except Exception as e:
+        logger.exception('Unhandled error: %s', e)
         return {
             'statusCode': 500,
             'headers': cors_headers(),
@@ -186,8 +305,8 @@ def register_user(event):
         user_id = response['User']['Username']
         
         try:
-            users_table.put_item(
-                Item={
+            profiles.put(
+                {
                     'user_id': user_id,
                     'email': email,
                     'name': name,
@@ -196,7 +315,7 @@ def register_user(event):
                 }
             )
         except Exception as table_error:
-            print(f"Users table error (non-critical): {table_error}")
+            logger.warning('Users table error (non-critical): %s', table_error)
         
         return {
             'statusCode': 201,
@@ -240,7 +359,7 @@ def login_user(event):
                 }
             )
         except Exception as auth_error:
-            print(f"Auth error: {auth_error}")
+            logger.warning('Auth error: %s', auth_error)
             return {
                 'statusCode': 401,
                 'headers': cors_headers(),
@@ -265,44 +384,47 @@ def login_user(event):
         }
 
 def get_receipts(query_params, user_id):
-    """Get user receipts with optional filtering"""
+    """Get one page of the user's receipts, newest first (order=asc for oldest first), with optional filtering"""
     try:
-        scan_kwargs = {}
-        filter_expressions = [Attr('user_id').eq(user_id)]
+        filter_expressions = []
         
         if query_params.get('category'):
             filter_expressions.append(Attr('category').eq(query_params['category']))
         
-        if query_params.get('start_date'):
-            filter_expressions.append(Attr('purchase_date').gte(query_params['start_date']))
-        if query_params.get('end_date'):
-            filter_expressions.append(Attr('purchase_date').lte(query_params['end_date']))
-        
         if query_params.get('merchant'):
             filter_expressions.append(Attr('merchant').contains(query_params['merchant']))
         
+        filter_expr = None
         if filter_expressions:
             filter_expr = filter_expressions[0]
-            if len(filter_expressions) > 1:
-                for expr in filter_expressions[1:]:
-                    filter_expr = filter_expr & expr
-            scan_kwargs['FilterExpression'] = filter_expr
-        
-        limit = int(query_params.get('limit', 50))
-        scan_kwargs['Limit'] = min(limit, 100)
+            for expr in filter_expressions[1:]:
+                filter_expr = filter_expr & expr
         
-        if query_params.get('last_key'):
-            scan_kwargs['ExclusiveStartKey'] = {'receipt_id': query_params['last_key']}
+        limit = max(1, min(int(query_params.get('limit', 50)), 100))
         
-        response = table.scan(**scan_kwargs)
+        try:
+            receipts, next_cursor, _ = list_user_receipts(
+                table, user_id, limit,
+                start_date=query_params.get('start_date'),
+                end_date=query_params.get('end_date'),
+                filter_expression=filter_expr,
+                cursor=query_params.get('cursor'),
+                newest_first=query_params.get('order') != 'asc'
+            )
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': cors_headers(),
+                'body': json.dumps({'error': str(e)})
+            }
         
         return {
             'statusCode': 200,
             'headers': cors_headers(),
             'body': json.dumps({
-                'receipts': response['Items'],
-                'count': response['Count'],
-                'last_key': response.get('LastEvaluatedKey', {}).get('receipt_id')
+                'receipts': receipts,
+                'count': len(receipts),
+                'next_cursor': next_cursor
             }, default=decimal_default)
         }
         
@@ -325,10 +447,17 @@ def get_receipt_by_id(receipt_id, user_id):
                 'body': json.dumps({'error': 'Receipt not found'})
             }
         
+        # The OCR text lives outside the item; only this view loads it
+        receipt = response['Item']
+        s3 = get_s3_client() if 'raw_text_key' in receipt else None
+        raw_text = read_receipt_text(receipt, s3, RAW_TEXT_BUCKET)
+        receipt = {k: v for k, v in receipt.items() if k not in TEXT_ATTRIBUTES}
+        receipt['raw_text'] = raw_text or ''
+        
         return {
             'statusCode': 200,
             'headers': cors_headers(),
-            'body': json.dumps(response['Item'], default=decimal_default)
+            'body': json.dumps(receipt, default=decimal_default)
         }
         
     except Exception as e:
@@ -338,87 +467,71 @@ def get_receipt_by_id(receipt_id, user_id):
             'body': json.dumps({'error': str(e)})
         }
 
+def summary_date_range(query_params):
+    """Resolve the summary date range, honouring the this_month/last_month filters"""
+    start_date = query_params.get('start_date')
+    end_date = query_params.get('end_date')
+    
+    if query_params.get('month_filter') == 'this_month':
+        now = datetime.now()
+        start_date = now.replace(day=1).strftime('%Y-%m-%d')
+        end_date = now.strftime('%Y-%m-%d')
+    elif query_params.get('month_filter') == 'last_month':
+        now = datetime.now()
+        last_month = now.replace(day=1) - timedelta(days=1)
+        start_date = last_month.replace(day=1).strftime('%Y-%m-%d')
+        end_date = last_month.strftime('%Y-%m-%d')
+    return start_date, end_date
+
+def get_user_budget(user_id):
+    """Return the user's monthly budget as a float (0 if unset)"""
+    budget = 0
+    try:
+        profile = profiles.get(user_id)
+        logger.debug('Profile for user %s: %s', user_id, profile)
+        if profile is not None:
+            budget_value = profile.get('monthly_budget', 0)
+            # Handle Decimal, string, or numeric values
+            if isinstance(budget_value, Decimal):
+                budget = float(budget_value)
+            elif isinstance(budget_value, str):
+                budget = float(budget_value) if budget_value else 0
+            else:
+                budget = float(budget_value) if budget_value else 0
+            logger.debug('Retrieved budget: %s', budget)
+    except Exception as e:
+        logger.error('Error retrieving budget: %s', e)
+        budget = 0
+    return budget
+
+def months_in_range(monthly_data, month_range):
+    """Yield (month, data) pairs of loaded rollups that fall inside a (start_month, end_month) range"""
+    start_month, end_month = month_range
+    for month_key, month in sorted(monthly_data.items()):
+        if (not start_month or month_key >= start_month) and (not end_month or month_key <= end_month):
+            yield month_key, month
+
 def get_spending_summary(query_params, user_id):
     """Get spending summary by category with budget comparison"""
     try:
-        # Handle month filters
-        start_date = query_params.get('start_date')
-        end_date = query_params.get('end_date')
-        
-        if query_params.get('month_filter') == 'this_month':
-            now = datetime.now()
-            start_date = now.replace(day=1).strftime('%Y-%m-%d')
-            end_date = now.strftime('%Y-%m-%d')
-        elif query_params.get('month_filter') == 'last_month':
-            now = datetime.now()
-            last_month = now.replace(day=1) - timedelta(days=1)
-            start_date = last_month.replace(day=1).strftime('%Y-%m-%d')
-            end_date = last_month.strftime('%Y-%m-%d')
-        
-        scan_kwargs = {}
-        filter_expressions = [Attr('user_id').eq(user_id)]
-        if start_date:
-            filter_expressions.append(Attr('purchase_date').gte(start_date))
-        if end_date:
-            filter_expressions.append(Attr('purchase_date').lte(end_date))
-        
-        if filter_expressions:
-            filter_expr = filter_expressions[0]
-            for expr in filter_expressions[1:]:
-                filter_expr = filter_expr & expr
-            scan_kwargs['FilterExpression'] = filter_expr
-        
-        response = table.scan(**scan_kwargs)
-        
-        # Calculate summary by category
-        category_totals = {}
-        total_amount = 0
-        total_receipts = 0
-        
-        for item in response['Items']:
-            category = item.get('category', 'other')
-            amount_str = item.get('total_amount', '0,00')
-            
-            try:
-                amount = float(amount_str.replace(',', '.'))
-                category_totals[category] = category_totals.get(category, 0) + amount
-                total_amount += amount
-                total_receipts += 1
-            except (ValueError, AttributeError):
-                continue
-        
-        # Get user budget
-        budget = 0
-        try:
-            profile_response = users_table.get_item(Key={'user_id': user_id})
-            print(f"Profile response for user {user_id}: {profile_response}")
-            if 'Item' in profile_response:
-                budget_value = profile_response['Item'].get('monthly_budget', 0)
-                # Handle Decimal, string, or numeric values
-                if isinstance(budget_value, Decimal):
-                    budget = float(budget_value)
-                elif isinstance(budget_value, str):
-                    budget = float(budget_value) if budget_value else 0
-                else:
-                    budget = float(budget_value) if budget_value else 0
-                print(f"Retrieved budget: {budget} (type: {type(budget)})")
-        except Exception as e:
-            print(f"Error retrieving budget: {e}")
-            budget = 0
+        start_date, end_date = summary_date_range(query_params)
+        summary = SummaryAccumulator()
+        # The budget doesn't depend on the spending; read it while the spending is read
+        budget = submit(get_user_budget, user_id)
+        
+        month_range = rollup_month_range(start_date, end_date)
+        if month_range:
+            for month in load_monthly_rollups(user_id, *month_range).values():
+                summary.add_month(month)
+        else:
+            aggregator = new_aggregator()
+            aggregator.add_view(summary)
+            aggregator.consume(iter_user_receipts(table, user_id, start_date=start_date, end_date=end_date))
         
         return {
             'statusCode': 200,
             'headers': cors_headers(),
-            'body': json.dumps({
-                'summary': {
-                    'total_amount': round(total_amount, 2),
-                    'total_receipts': total_receipts,
-                    'by_category': {k: round(v, 2) for k, v in category_totals.items()},
-                    'budget': budget,
-                    'budget_used': round(total_amount, 2),
-                    'budget_remaining': round(budget - total_amount, 2) if budget > 0 else 0
-                }
-            })
+            'body': json.dumps({'summary': summary.payload(budget.result())})
         }
         
     except Exception as e:
@@ -431,64 +544,19 @@ def get_spending_summary(query_params, user_id):
 def get_monthly_trends(query_params, user_id):
     """Get monthly spending trends with category breakdown"""
     try:
-        response = table.scan(
-            FilterExpression=Attr('user_id').eq(user_id)
-        )
-        
-        monthly_data = {}
-        
-        for item in response['Items']:
-            purchase_date = item.get('purchase_date')
-            if not purchase_date:
-                continue
-                
-            try:
-                month_key = None
-                
-                if '-' in purchase_date and len(purchase_date) == 10:
-                    month_key = purchase_date[:7]
-                elif '.' in purchase_date:
-                    parts = purchase_date.split('.')
-                    if len(parts) == 3:
-                        day, month, year = parts
-                        month_key = f"{year}-{month.zfill(2)}"
-                
-                if not month_key:
-                    continue
-                    
-                amount_str = item.get('total_amount', '0,00')
-                amount = float(amount_str.replace(',', '.'))
-                category = item.get('category', 'other')
-                
-                if month_key not in monthly_data:
-                    monthly_data[month_key] = {'total': 0, 'count': 0, 'categories': {}}
-                
-                monthly_data[month_key]['total'] += amount
-                monthly_data[month_key]['count'] += 1
-                
-                if category not in monthly_data[month_key]['categories']:
-                    monthly_data[month_key]['categories'][category] = 0
-                monthly_data[month_key]['categories'][category] += amount
-                
-            except (ValueError, AttributeError):
-                continue
-        
-        sorted_months = sorted(monthly_data.items())
+        monthly = MonthlyAccumulator()
+        if rollups_table is not None:
+            for month_key, month in load_monthly_rollups(user_id).items():
+                monthly.add_month(month_key, month)
+        else:
+            aggregator = new_aggregator()
+            aggregator.add_view(monthly)
+            aggregator.consume(iter_user_receipts(table, user_id))
         
         return {
             'statusCode': 200,
             'headers': cors_headers(),
-            'body': json.dumps({
-                'monthly_trends': [
-                    {
-                        'month': month,
-                        'total_amount': round(data['total'], 2),
-                        'receipt_count': data['count'],
-                        **{category: round(amount, 2) for category, amount in data['categories'].items()}
-                    }
-                    for month, data in sorted_months
-                ]
-            })
+            'body': json.dumps({'monthly_trends': monthly.payload()})
         }
         
     except Exception as e:
@@ -501,90 +569,19 @@ def get_monthly_trends(query_params, user_id):
 def get_key_metrics(query_params, user_id):
     """Get key metrics"""
     try:
-        scan_kwargs = {}
-        filter_expressions = [Attr('user_id').eq(user_id)]
-        if query_params.get('start_date'):
-            filter_expressions.append(Attr('purchase_date').gte(query_params['start_date']))
-        if query_params.get('end_date'):
-            filter_expressions.append(Attr('purchase_date').lte(query_params['end_date']))
-        
-        if filter_expressions:
-            filter_expr = filter_expressions[0]
-            for expr in filter_expressions[1:]:
-                filter_expr = filter_expr & expr
-            scan_kwargs['FilterExpression'] = filter_expr
-        
-        response = table.scan(**scan_kwargs)
-        receipts = []
-        
-        for receipt in response['Items']:
-            try:
-                amount = float(receipt.get('total_amount', '0,00').replace(',', '.'))
-                receipts.append({
-                    'amount': amount,
-                    'merchant': receipt.get('merchant', ''),
-                    'date': receipt.get('purchase_date', '')
-                })
-            except:
-                continue
-        
-        if not receipts:
-            return {
-                'statusCode': 200,
-                'headers': cors_headers(),
-                'body': json.dumps({
-                    'metrics': {
-                        'average_spending': 0,
-                        'most_expensive': {'amount': 0, 'merchant': '', 'date': ''},
-                        'most_frequent_merchant': {'name': '', 'count': 0},
-                        'month_comparison': {'current': 0, 'previous': 0, 'change_percent': 0}
-                    }
-                })
-            }
-        
-        amounts = [r['amount'] for r in receipts]
-        avg_spending = sum(amounts) / len(amounts)
-        
-        most_expensive = max(receipts, key=lambda x: x['amount'])
-        
-        merchant_counts = {}
-        for r in receipts:
-            merchant = r['merchant'] or 'Unknown'
-            merchant_counts[merchant] = merchant_counts.get(merchant, 0) + 1
-        
-        most_frequent = max(merchant_counts.items(), key=lambda x: x[1]) if merchant_counts else ('', 0)
-        
-        now = datetime.now()
-        current_month = now.strftime('%Y-%m')
-        prev_month = (now.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
-        
-        current_total = sum(r['amount'] for r in receipts if current_month in r['date'])
-        prev_total = sum(r['amount'] for r in receipts if prev_month in r['date'])
-        
-        change_percent = ((current_total - prev_total) / prev_total * 100) if prev_total > 0 else 0
+        metrics = MetricsAccumulator()
+        aggregator = new_aggregator()
+        aggregator.add_view(metrics)
+        aggregator.consume(iter_user_receipts(
+            table, user_id,
+            start_date=query_params.get('start_date'),
+            end_date=query_params.get('end_date')
+        ))
         
         return {
             'statusCode': 200,
             'headers': cors_headers(),
-            'body': json.dumps({
-                'metrics': {
-                    'average_spending': round(avg_spending, 2),
-                    'most_expensive': {
-                        'amount': round(most_expensive['amount'], 2),
-                        'merchant': most_expensive['merchant'],
-                        'date': most_expensive['date']
-                    },
-                    'most_frequent_merchant': {
-                        'name': most_frequent[0],
-                        'count': most_frequent[1]
-                    },
-                    'month_comparison': {
-                        'current': round(current_total, 2),
-                        'previous': round(prev_total, 2),
-                        'change_percent': round(change_percent, 1)
-                    }
-                }
-            })
+            'body': json.dumps({'metrics': metrics.payload()})
         }
         
     except Exception as e:
@@ -597,74 +594,97 @@ def get_key_metrics(query_params, user_id):
 def get_spending_patterns(query_params, user_id):
     """Get spending patterns"""
     try:
-        scan_kwargs = {}
-        filter_expressions = [Attr('user_id').eq(user_id)]
-        if query_params.get('start_date'):
-            filter_expressions.append(Attr('purchase_date').gte(query_params['start_date']))
-        if query_params.get('end_date'):
-            filter_expressions.append(Attr('purchase_date').lte(query_params['end_date']))
+        patterns = PatternsAccumulator()
         
-        if filter_expressions:
-            filter_expr = filter_expressions[0]
-            for expr in filter_expressions[1:]:
-                filter_expr = filter_expr & expr
-            scan_kwargs['FilterExpression'] = filter_expr
+        month_range = rollup_month_range(query_params.get('start_date'), query_params.get('end_date'))
+        if month_range:
+            for month_key, month in load_monthly_rollups(user_id, *month_range).items():
+                patterns.add_month(month_key, month)
+        else:
+            aggregator = new_aggregator()
+            aggregator.add_view(patterns)
+            aggregator.consume(iter_user_receipts(
+                table, user_id,
+                start_date=query_params.get('start_date'),
+                end_date=query_params.get('end_date')
+            ))
         
-        response = table.scan(**scan_kwargs)
-        weekday_total = weekend_total = 0
-        weekday_count = weekend_count = 0
-        monthly_totals = {}
+        return {
+            'statusCode': 200,
+            'headers': cors_headers(),
+            'body': json.dumps({'patterns': patterns.payload()})
+        }
         
-        for receipt in response['Items']:
-            try:
-                amount = float(receipt.get('total_amount', '0,00').replace(',', '.'))
-                date_str = receipt.get('purchase_date', '')
-                
-                receipt_date = None
-                if '-' in date_str and len(date_str) == 10:
-                    receipt_date = datetime.strptime(date_str, '%Y-%m-%d')
-                elif '.' in date_str:
-                    parts = date_str.split('.')
-                    if len(parts) == 3:
-                        day, month, year = parts
-                        if len(year) == 2:
-                            year = '20' + year
-                        receipt_date = datetime(int(year), int(month), int(day))
-                
-                if receipt_date:
-                    if receipt_date.weekday() < 5:
-                        weekday_total += amount
-                        weekday_count += 1
-                    else:
-                        weekend_total += amount
-                        weekend_count += 1
-                    
-                    month_key = receipt_date.strftime('%Y-%m')
-                    monthly_totals[month_key] = monthly_totals.get(month_key, 0) + amount
-                    
-            except:
-                continue
-        
-        sorted_months = sorted(monthly_totals.items())[-3:]
-        avg_monthly = sum(total for _, total in sorted_months) / len(sorted_months) if sorted_months else 0
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': cors_headers(),
+            'body': json.dumps({'error': str(e)})
+        }
+
+def get_dashboard(query_params, user_id):
+    """Get receipts, summary, monthly trends, metrics and patterns from a single read"""
+    try:
+        start_date = query_params.get('start_date')
+        end_date = query_params.get('end_date')
+        summary_start, summary_end = summary_date_range(query_params)
+        
+        summary = SummaryAccumulator()
+        monthly = MonthlyAccumulator()
+        metrics = MetricsAccumulator()
+        patterns = PatternsAccumulator()
+        listing = ListingAccumulator(
+            category=query_params.get('category'),
+            merchant=query_params.get('merchant'),
+            limit=max(1, min(int(query_params.get('limit', 50)), 100)),
+            newest_first=query_params.get('order') != 'asc'
+        )
+        
+        # Whatever the rollups can answer is read from them (one item per month);
+        # everything else shares a single query over the union of the date ranges.
+        # The rollups and the budget are read concurrently with that query.
+        aggregator = new_aggregator()
+        summary_months = rollup_month_range(summary_start, summary_end)
+        pattern_months = rollup_month_range(start_date, end_date)
+        rollups_future = submit(load_monthly_rollups, user_id) if rollups_table is not None else None
+        budget = submit(get_user_budget, user_id)
+        
+        if not summary_months:
+            aggregator.add_view(summary, summary_start, summary_end)
+        if rollups_future is None:
+            aggregator.add_view(monthly)
+        if not pattern_months:
+            aggregator.add_view(patterns, start_date, end_date)
+        aggregator.add_view(metrics, start_date, end_date)
+        aggregator.add_view(listing, start_date, end_date)
+        
+        query_start, query_end = aggregator.date_range()
+        aggregator.consume(iter_user_receipts(table, user_id, start_date=query_start, end_date=query_end))
+        last_item = listing.last_item()
+        
+        if rollups_future is not None:
+            rollups = rollups_future.result()
+            if summary_months:
+                for _, month in months_in_range(rollups, summary_months):
+                    summary.add_month(month)
+            for month_key, month in rollups.items():
+                monthly.add_month(month_key, month)
+            if pattern_months:
+                for month_key, month in months_in_range(rollups, pattern_months):
+                    patterns.add_month(month_key, month)
         
         return {
             'statusCode': 200,
             'headers': cors_headers(),
             'body': json.dumps({
-                'patterns': {
-                    'weekday_vs_weekend': {
-                        'weekday_total': round(weekday_total, 2),
-                        'weekend_total': round(weekend_total, 2),
-                        'weekday_avg': round(weekday_total / weekday_count, 2) if weekday_count > 0 else 0,
-                        'weekend_avg': round(weekend_total / weekend_count, 2) if weekend_count > 0 else 0
-                    },
-                    'prediction': {
-                        'next_month_forecast': round(avg_monthly, 2),
-                        'based_on_months': len(sorted_months)
-                    }
-                }
-            })
+                'receipts': listing.payload(),
+                'count': len(listing.receipts),
+                'next_cursor': encode_cursor(last_item) if last_item else None,
+                'summary': summary.payload(budget.result()),
+                'monthly_trends': monthly.payload(),
+                'metrics': metrics.payload(),
+                'patterns': patterns.payload()
+            }, default=decimal_default)
         }
         
     except Exception as e:
@@ -744,29 +764,19 @@ def get_presigned_upload_url(event, user_id):
 def get_user_profile(user_id):
     """Get user profile information"""
     try:
-        response = users_table.get_item(Key={'user_id': user_id})
-        
-        if 'Item' not in response:
-            default_profile = {
-                'user_id': user_id,
-                'name': '',
-                'email': '',
-                'monthly_budget': 0,
-                'created_at': datetime.now().isoformat()
-            }
-            users_table.put_item(Item=default_profile)
-            return {
-                'statusCode': 200,
-                'headers': cors_headers(),
-                'body': json.dumps(default_profile, default=decimal_default)
-            }
-        
-        profile = response['Item']
+        profile = profiles.get(user_id)
+        defaults = {
+            'name': '',
+            'email': '',
+            'monthly_budget': 0,
+            'created_at': datetime.now().isoformat()
+        }
         
-        # Add monthly_budget if it doesn't exist (for existing users)
-        if 'monthly_budget' not in profile:
-            profile['monthly_budget'] = 0
-            users_table.put_item(Item=profile)
+        # New users, older items without monthly_budget, and the bare items the OCR
+        # lambda creates for data_version get the missing defaults. Only missing
+        # attributes are set, so a concurrent data_version bump is never overwritten.
+        if profile is None or any(name not in profile for name in defaults):
+            profile = profiles.fill_defaults(user_id, defaults)
         
         return {
             'statusCode': 200,
@@ -785,7 +795,7 @@ def update_user_profile(event, user_id):
     """Update user profile information"""
     try:
         body = json.loads(event.get('body', '{}'))
-        print(f"Received profile update for user {user_id}: {body}")
+        logger.debug('Received profile update for user %s: %s', user_id, body)
         
         # Validate monthly_budget - convert to Decimal for DynamoDB
         monthly_budget = body.get('monthly_budget', 0)
@@ -794,14 +804,13 @@ def update_user_profile(event, user_id):
         except (ValueError, TypeError):
             monthly_budget = Decimal('0')
         
-        print(f"Parsed monthly_budget: {monthly_budget}")
+        logger.debug('Parsed monthly_budget: %s', monthly_budget)
         
         try:
-            response = users_table.get_item(Key={'user_id': user_id})
-            current_profile = response.get('Item', {})
-            print(f"Current profile: {current_profile}")
+            current_profile = profiles.get(user_id) or {}
+            logger.debug('Current profile: %s', current_profile)
         except Exception as e:
-            print(f"Error getting current profile: {e}")
+            logger.error('Error getting current profile: %s', e)
             current_profile = {}
         
         updated_profile = {
@@ -817,34 +826,38 @@ def update_user_profile(event, user_id):
         else:
             updated_profile['created_at'] = current_profile['created_at']
         
-        print(f"About to save profile: {updated_profile}")
+        logger.debug('About to save profile: %s', updated_profile)
         
         try:
             # Use update_item instead of put_item for better reliability
-            update_response = users_table.update_item(
-                Key={'user_id': user_id},
-                UpdateExpression='SET #name = :name, email = :email, monthly_budget = :budget, updated_at = :updated',
+            # Caches the item as written, so this container's next read sees the update
+            update_response = profiles.update(
+                user_id,
+                # The budget is part of the summary, so cached analytics go stale too
+                UpdateExpression='SET #name = :name, email = :email, monthly_budget = :budget, updated_at = :updated '
+                                 'ADD data_version :one',
                 ExpressionAttributeNames={'#name': 'name'},
                 ExpressionAttributeValues={
                     ':name': updated_profile['name'],
                     ':email': updated_profile['email'],
                     ':budget': updated_profile['monthly_budget'],
-                    ':updated': updated_profile['updated_at']
-                },
-                ReturnValues='ALL_NEW'
+                    ':updated': updated_profile['updated_at'],
+                    ':one': 1
+                }
             )
-            print(f"DynamoDB update_item response: {update_response}")
-            print("Profile updated successfully in DynamoDB")
+            logger.debug('DynamoDB update_item response: %s', update_response)
+            logger.info('Profile updated for user %s', user_id)
         except Exception as db_error:
-            print(f"DynamoDB error: {db_error}")
+            logger.error('DynamoDB error: %s', db_error)
             raise db_error
         
-        # Verify the save by reading back
-        try:
-            verify_response = users_table.get_item(Key={'user_id': user_id})
-            print(f"Verification read: {verify_response.get('Item', {})}")
-        except Exception as verify_error:
-            print(f"Verification read error: {verify_error}")
+        # Verify the save by reading back past the cache; an extra read, so only when debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            try:
+                verify_response = users_table.get_item(Key={'user_id': user_id})
+                logger.debug('Verification read: %s', verify_response.get('Item', {}))
+            except Exception as verify_error:
+                logger.debug('Verification read error: %s', verify_error)
         
         return {
             'statusCode': 200,
@@ -853,9 +866,7 @@ def update_user_profile(event, user_id):
         }
         
     except Exception as e:
-        print(f"Full error in update_user_profile: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception('Error in update_user_profile: %s', e)
         return {
             'statusCode': 500,
             'headers': cors_headers(),
@@ -0,0 +1,86 @@
+"""Benchmark the row-wise and NumPy analytics engines on synthetic receipts.
+
+    python api/benchmarks/bench_analytics.py [rows ...]
+
+Builds the same five views as /analytics/dashboard with each engine, checks
+that the payloads are identical and prints the best-of-N wall time.
+"""
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from analytics import (
+    SummaryAccumulator, MonthlyAccumulator, MetricsAccumulator, PatternsAccumulator,
+    ListingAccumulator, ReceiptAggregator
+)
+from columnar import ColumnarAggregator
+
+CATEGORIES = ['grocery', 'restaurant', 'drogerie', 'gas_station', 'clothing', 'electronics', 'other']
+MERCHANTS = ['REWE', 'EDEKA', 'ALDI', 'LIDL', 'DM', 'ROSSMANN', 'SHELL', 'ZARA', 'H&M', 'ACTION', '']
+
+def make_receipts(rows, seed=42):
+    rng = random.Random(seed)
+    today = date.today()
+    receipts = []
+    for i in range(rows):
+        amount = f"{rng.randint(50, 25000) / 100:.2f}"
+        receipts.append({
+            'receipt_id': str(i),
+            'user_id': 'benchmark-user',
+            'purchase_date': (today - timedelta(days=rng.randint(0, 730))).isoformat(),
+            'total_amount': amount.replace('.', ',') if rng.random() < 0.7 else amount,
+            'category': rng.choice(CATEGORIES),
+            'merchant': rng.choice(MERCHANTS),
+        })
+    receipts.sort(key=lambda r: r['purchase_date'])
+    return receipts
+
+def run(aggregator_class, receipts, start_date, end_date):
+    summary, monthly = SummaryAccumulator(), MonthlyAccumulator()
+    metrics, patterns = MetricsAccumulator(), PatternsAccumulator()
+    listing = ListingAccumulator()
+    aggregator = aggregator_class()
+    aggregator.add_view(summary, start_date, end_date)
+    aggregator.add_view(monthly)
+    aggregator.add_view(metrics, start_date, end_date)
+    aggregator.add_view(patterns, start_date, end_date)
+    aggregator.add_view(listing, start_date, end_date)
+    aggregator.consume(receipts)
+    return json.dumps({
+        'summary': summary.payload(0),
+        'monthly_trends': monthly.payload(),
+        'metrics': metrics.payload(),
+        'patterns': patterns.payload(),
+        'receipts': listing.payload(),
+    }, sort_keys=True)
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+if __name__ == '__main__':
+    if ColumnarAggregator is None:
+        sys.exit('NumPy is not installed; nothing to compare')
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    start_date = (date.today() - timedelta(days=365)).isoformat()
+    end_date = date.today().isoformat()
+    for rows in sizes:
+        receipts = make_receipts(rows)
+        expected = run(ReceiptAggregator, receipts, start_date, end_date)
+        assert run(ColumnarAggregator, receipts, start_date, end_date) == expected, 'engines disagree'
+
+        repeat = 5 if rows <= 10_000 else 2
+        row_wise = best_time(lambda: run(ReceiptAggregator, receipts, start_date, end_date), repeat)
+        columnar = best_time(lambda: run(ColumnarAggregator, receipts, start_date, end_date), repeat)
+        print(f"{rows:>8} rows  row-wise {row_wise * 1000:8.1f} ms  "
+              f"columnar {columnar * 1000:8.1f} ms  speedup {row_wise / columnar:4.1f}x")
@@ -0,0 +1,144 @@
+"""Benchmark concurrent DynamoDB reads in the analytics handlers against a local endpoint.
+
+    java -Djava.library.path=DynamoDBLocal_lib -jar DynamoDBLocal.jar -inMemory   # or: moto_server -p 8000
+    DYNAMODB_ENDPOINT_URL=http://localhost:8000 python api/benchmarks/bench_fanout.py [rows] [--segments 4]
+
+Creates and seeds Bench* tables on the endpoint (once), then serves the
+dashboard and summary routes through api_lambda twice:
+- sequentially, with DYNAMODB_FANOUT_WORKERS=0 and one query segment
+- with the fan-out pool and date-range query segments
+
+It checks that both runs return the same bodies and prints the best-of-N
+latency of each. Response caching is switched off so every request reads
+DynamoDB.
+
+Local endpoints answer in about a millisecond, and moto_server handles one
+request at a time. That hides what concurrency buys against DynamoDB itself,
+where every call is a network round trip. ``--latency-ms`` adds that round
+trip to each call.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+HERE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', '..', 'lambda'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-central-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+os.environ.update(
+    DYNAMODB_RECEIPTS_TABLE='BenchReceipts',
+    DYNAMODB_USERS_TABLE='BenchUsers',
+    DYNAMODB_ROLLUPS_TABLE='BenchMonthlyRollups',
+    RECEIPTS_MIGRATED='true',
+    RESPONSE_CACHE='false',
+    REQUEST_METRICS='false',
+    LOG_LEVEL='WARNING',
+)
+
+import receipt_store
+from bench_analytics import best_time, make_receipts
+from rollups import rollup_increments
+
+USER_ID = 'benchmark-user-0000-0000'
+
+def create_tables(dynamodb):
+    existing = set(dynamodb.meta.client.list_tables()['TableNames'])
+    string = lambda name: {'AttributeName': name, 'AttributeType': 'S'}
+    specs = {
+        'BenchReceipts': {
+            'KeySchema': [{'AttributeName': 'receipt_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [string('receipt_id'), string('user_id'), string('purchase_date')],
+            'GlobalSecondaryIndexes': [{
+                'IndexName': receipt_store.USER_DATE_INDEX,
+                'KeySchema': [{'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                              {'AttributeName': 'purchase_date', 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'ALL'},
+            }],
+        },
+        'BenchUsers': {
+            'KeySchema': [{'AttributeName': 'user_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [string('user_id')],
+        },
+        'BenchMonthlyRollups': {
+            'KeySchema': [{'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                          {'AttributeName': 'year_month', 'KeyType': 'RANGE'}],
+            'AttributeDefinitions': [string('user_id'), string('year_month')],
+        },
+    }
+    created = False
+    for name, spec in specs.items():
+        if name not in existing:
+            dynamodb.create_table(TableName=name, BillingMode='PAY_PER_REQUEST', **spec).wait_until_exists()
+            created = True
+    return created
+
+def seed(dynamodb, rows):
+    receipts = make_receipts(rows)
+    rollups = {}
+    with dynamodb.Table('BenchReceipts').batch_writer() as batch:
+        for receipt in receipts:
+            batch.put_item(Item={**receipt, 'user_id': USER_ID})
+            increments = rollup_increments(receipt)
+            if not increments:
+                continue
+            year_month, values = increments
+            totals = rollups.setdefault(year_month, {})
+            for name, value in values.items():
+                totals[name] = totals.get(name, Decimal(0)) + value
+    with dynamodb.Table('BenchMonthlyRollups').batch_writer() as batch:
+        for year_month, totals in rollups.items():
+            batch.put_item(Item={'user_id': USER_ID, 'year_month': year_month, **totals})
+    dynamodb.Table('BenchUsers').put_item(Item={'user_id': USER_ID, 'monthly_budget': Decimal(800)})
+
+def request(path, query_params=None):
+    return {
+        'httpMethod': 'GET',
+        'path': path,
+        'queryStringParameters': query_params,
+        'requestContext': {'authorizer': {'claims': {'sub': USER_ID}}},
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('rows', type=int, nargs='?', default=2000)
+    parser.add_argument('--segments', type=int, default=4, help='date-range query segments of the concurrent run')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency-ms', type=float, default=0, help='simulated round trip added to every call')
+    args = parser.parse_args()
+    if not os.getenv('DYNAMODB_ENDPOINT_URL'):
+        sys.exit('Set DYNAMODB_ENDPOINT_URL to a DynamoDB Local or moto_server endpoint')
+
+    import api_lambda
+    if create_tables(api_lambda.dynamodb):
+        seed(api_lambda.dynamodb, args.rows)
+    if args.latency_ms:
+        api_lambda.dynamodb.meta.client.meta.events.register(
+            'before-send.dynamodb', lambda **kwargs: time.sleep(args.latency_ms / 1000)
+        )
+
+    today = date.today()
+    routes = [
+        ('dashboard', request('/analytics/dashboard')),
+        ('dashboard, last 365 days', request('/analytics/dashboard', {
+            'start_date': (today - timedelta(days=365)).isoformat(), 'end_date': today.isoformat()
+        })),
+        ('summary, mid-month range', request('/analytics/summary', {
+            'start_date': (today - timedelta(days=200)).isoformat(), 'end_date': today.isoformat()
+        })),
+    ]
+    for name, event in routes:
+        serve = lambda: api_lambda.lambda_handler(event, None)['body']
+        receipt_store.FANOUT_WORKERS, receipt_store.QUERY_SEGMENTS = 0, 1
+        expected = serve()
+        sequential = best_time(serve, args.repeat)
+        receipt_store.FANOUT_WORKERS, receipt_store.QUERY_SEGMENTS = 8, args.segments
+        assert serve() == expected, f'{name}: concurrent reads changed the response'
+        concurrent = best_time(serve, args.repeat)
+        print(f"{name:<26} sequential {sequential * 1000:8.1f} ms  "
+              f"concurrent {concurrent * 1000:8.1f} ms  speedup {sequential / concurrent:4.1f}x")
@@ -0,0 +1,264 @@
+"""Vectorized (NumPy) engine for the analytics accumulators.
+
+ColumnarAggregator has the same interface as analytics.ReceiptAggregator but
+converts receipts, a chunk at a time, into compact columns: amounts as
+float64 cents, dates as datetime64[D], categories and merchants as integer
+codes. Each view's totals, month buckets, weekday/weekend split, most
+expensive receipt and merchant mode are then computed with vectorized
+group-bys and written into the accumulator, so both engines share the same
+payload code.
+
+NumPy is optional; without it ``ColumnarAggregator`` is None and callers use
+the row-by-row ReceiptAggregator.
+"""
+from datetime import datetime
+from itertools import islice
+
+from analytics import (
+    SummaryAccumulator, MonthlyAccumulator, MetricsAccumulator, PatternsAccumulator,
+    ReceiptAggregator
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHUNK_SIZE = 1000
+
+def _iso_date(date_str):
+    """Normalize a purchase date to ISO for datetime64 parsing ('NaT' if unparseable)"""
+    if not isinstance(date_str, str):
+        return 'NaT'
+    if len(date_str) == 10 and date_str[4] == '-':
+        return date_str
+    parts = date_str.split('.')
+    if len(parts) == 3:
+        day, month, year = parts
+        if len(year) == 2:
+            year = '20' + year
+        try:
+            return datetime(int(year), int(month), int(day)).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    return 'NaT'
+
+def _parse_dates(iso_strings):
+    try:
+        return np.array(iso_strings, dtype='datetime64[D]')
+    except ValueError:
+        # One malformed ISO-looking value; fall back to per-value parsing.
+        parsed = []
+        for value in iso_strings:
+            try:
+                parsed.append(np.datetime64(value, 'D'))
+            except ValueError:
+                parsed.append(np.datetime64('NaT'))
+        return np.array(parsed, dtype='datetime64[D]')
+
+def _parse_cents(amount_strings):
+    """Parse amount strings into float64 cents (NaN where unparseable)"""
+    try:
+        amounts = np.char.replace(np.array(amount_strings, dtype=str), ',', '.').astype(np.float64)
+    except ValueError:
+        amounts = np.empty(len(amount_strings))
+        for i, value in enumerate(amount_strings):
+            try:
+                amounts[i] = float(value.replace(',', '.'))
+            except (ValueError, AttributeError):
+                amounts[i] = np.nan
+    return np.round(amounts * 100)
+
+def _item_cents(items):
+    """Cents column for a chunk, using amount_cents and parsing total_amount only for legacy items"""
+    cents = np.empty(len(items))
+    legacy_rows, legacy_amounts = [], []
+    for i, item in enumerate(items):
+        value = item.get('amount_cents')
+        if value is not None:
+            cents[i] = float(value)
+        else:
+            amount = item.get('total_amount', '0,00')
+            legacy_rows.append(i)
+            legacy_amounts.append(amount if isinstance(amount, str) else 'nan')
+    if legacy_rows:
+        cents[legacy_rows] = _parse_cents(legacy_amounts)
+    return cents
+
+class ReceiptColumns:
+    """Receipts as parallel NumPy arrays; string columns are integer codes in first-seen order"""
+
+    def __init__(self):
+        self.category_codes = {}
+        self.merchant_codes = {}
+        self._chunks = []
+
+    def add_items(self, items):
+        items = list(items)
+        if not items:
+            return
+        date_strings, categories, merchants = [], [], []
+        for item in items:
+            date_strings.append(item.get('purchase_date', ''))
+            categories.append(self.category_codes.setdefault(item.get('category', 'other'), len(self.category_codes)))
+            merchants.append(self.merchant_codes.setdefault(item.get('merchant', ''), len(self.merchant_codes)))
+
+        self._chunks.append((
+            _item_cents(items),
+            np.array(date_strings, dtype=str),
+            _parse_dates([_iso_date(d) for d in date_strings]),
+            np.array(categories, dtype=np.int32),
+            np.array(merchants, dtype=np.int32),
+        ))
+
+    def finish(self):
+        if self._chunks:
+            columns = [np.concatenate(parts) for parts in zip(*self._chunks)]
+        else:
+            columns = [np.empty(0), np.empty(0, dtype=str), np.empty(0, dtype='datetime64[D]'),
+                       np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)]
+        self._chunks = []
+        self.cents, self.raw_dates, self.dates, self.categories, self.merchants = columns
+        self.has_amount = ~np.isnan(self.cents)
+        self.has_date = ~np.isnat(self.dates)
+        self.is_iso = (np.char.str_len(self.raw_dates) == 10) & (np.char.find(self.raw_dates, '-') == 4)
+        return self
+
+    def range_mask(self, start_date=None, end_date=None):
+        """Rows whose raw purchase_date falls in the range, using the same string comparison as the key condition"""
+        mask = np.ones(len(self.cents), dtype=bool)
+        if start_date:
+            mask &= self.raw_dates >= start_date
+        if end_date:
+            mask &= self.raw_dates <= end_date
+        return mask
+
+    def fill_summary(self, summary, mask):
+        rows = mask & self.has_amount
+        cents = self.cents[rows]
+        sums = np.bincount(self.categories[rows], weights=cents, minlength=len(self.category_codes))
+        first_seen = self._first_seen(self.categories, rows, len(self.category_codes))
+        names = list(self.category_codes)
+        for code in np.argsort(first_seen, kind='stable'):
+            if np.isfinite(first_seen[code]):
+                summary.category_totals[names[code]] = sums[code] / 100
+        summary.total_amount = cents.sum() / 100
+        summary.total_receipts = int(rows.sum())
+
+    def fill_monthly(self, monthly, mask):
+        rows = mask & self.has_amount & self.has_date
+        months = self.dates[rows].astype('datetime64[M]')
+        unique_months, month_index = np.unique(months, return_inverse=True)
+        cents = self.cents[rows]
+        categories = self.categories[rows]
+        n_categories = len(self.category_codes)
+        names = list(self.category_codes)
+
+        totals = np.bincount(month_index, weights=cents, minlength=len(unique_months))
+        counts = np.bincount(month_index, minlength=len(unique_months))
+        cells = np.bincount(month_index * n_categories + categories, weights=cents,
+                            minlength=len(unique_months) * n_categories).reshape(-1, n_categories)
+        present = np.bincount(month_index * n_categories + categories,
+                              minlength=len(unique_months) * n_categories).reshape(-1, n_categories)
+        for i, month in enumerate(np.datetime_as_string(unique_months, unit='M')):
+            monthly.monthly_data[month] = {
+                'total': totals[i] / 100,
+                'count': int(counts[i]),
+                'categories': {names[c]: cells[i, c] / 100 for c in range(n_categories) if present[i, c]},
+            }
+
+    def fill_metrics(self, metrics, mask):
+        rows = np.flatnonzero(mask & self.has_amount)
+        if not len(rows):
+            return
+        cents = self.cents[rows]
+        merchant_names = list(self.merchant_codes)
+
+        metrics.receipt_count = len(rows)
+        metrics.amount_sum = cents.sum() / 100
+        top = rows[np.argmax(cents)]  # argmax returns the first maximum, like the row-wise scan
+        metrics.most_expensive = {
+            'amount': self.cents[top] / 100,
+            'merchant': merchant_names[self.merchants[top]],
+            'date': str(self.raw_dates[top]),
+        }
+
+        # Merchant mode: '' counts as 'Unknown'; ties go to the merchant seen first.
+        mode_names = [name or 'Unknown' for name in merchant_names]
+        mode_codes = {}
+        for name in mode_names:
+            mode_codes.setdefault(name, len(mode_codes))
+        to_mode = np.array([mode_codes[name] for name in mode_names], dtype=np.int32)
+        row_modes = to_mode[self.merchants[rows]]
+        counts = np.bincount(row_modes, minlength=len(mode_codes))
+        first_seen = self._first_seen(row_modes, None, len(mode_codes))
+        best = min(np.flatnonzero(counts == counts.max()), key=lambda code: first_seen[code])
+        metrics.merchant_counts = {list(mode_codes)[best]: int(counts[best])}
+
+        months = self.dates[rows].astype('datetime64[M]')
+        iso_rows = self.is_iso[rows]
+        current = iso_rows & (months == np.datetime64(metrics.current_month, 'M'))
+        previous = iso_rows & (months == np.datetime64(metrics.prev_month, 'M'))
+        metrics.current_total = cents[current].sum() / 100
+        metrics.prev_total = cents[previous].sum() / 100
+
+    def fill_patterns(self, patterns, mask):
+        rows = mask & self.has_amount & self.has_date
+        cents = self.cents[rows]
+        dates = self.dates[rows]
+        # 1970-01-01 was a Thursday, so (days + 3) % 7 gives Monday=0 ... Sunday=6.
+        weekday = (dates.astype(np.int64) + 3) % 7 < 5
+
+        patterns.weekday_total = cents[weekday].sum() / 100
+        patterns.weekday_count = int(weekday.sum())
+        patterns.weekend_total = cents[~weekday].sum() / 100
+        patterns.weekend_count = int((~weekday).sum())
+
+        unique_months, month_index = np.unique(dates.astype('datetime64[M]'), return_inverse=True)
+        totals = np.bincount(month_index, weights=cents, minlength=len(unique_months))
+        for month, total in zip(np.datetime_as_string(unique_months, unit='M'), totals):
+            patterns.monthly_totals[str(month)] = total / 100
+
+    @staticmethod
+    def _first_seen(codes, rows, size):
+        first = np.full(size, np.inf)
+        positions = np.arange(len(codes))
+        if rows is not None:
+            codes, positions = codes[rows], positions[rows]
+        np.minimum.at(first, codes, positions)
+        return first
+
+class _ColumnarAggregator(ReceiptAggregator):
+    """Drop-in ReceiptAggregator that computes the analytics views column-wise"""
+
+    FILLERS = {
+        SummaryAccumulator: ReceiptColumns.fill_summary,
+        MonthlyAccumulator: ReceiptColumns.fill_monthly,
+        MetricsAccumulator: ReceiptColumns.fill_metrics,
+        PatternsAccumulator: ReceiptColumns.fill_patterns,
+    }
+
+    def consume(self, items):
+        columns = ReceiptColumns()
+        row_views = [view for view in self.views if type(view[0]) not in self.FILLERS]
+        items = iter(items)
+        while True:
+            chunk = list(islice(items, CHUNK_SIZE))
+            if not chunk:
+                break
+            columns.add_items(chunk)
+            # Views without a vectorized form (e.g. the receipt listing) still get items.
+            for item in chunk:
+                purchase_date = item.get('purchase_date', '')
+                for accumulator, start_date, end_date in row_views:
+                    if (not start_date or purchase_date >= start_date) and (not end_date or purchase_date <= end_date):
+                        accumulator.add(item)
+        columns.finish()
+
+        for accumulator, start_date, end_date in self.views:
+            fill = self.FILLERS.get(type(accumulator))
+            if fill:
+                fill(columns, accumulator, columns.range_mask(start_date, end_date))
+        return self
+
+ColumnarAggregator = _ColumnarAggregator if np is not None else None
@@ -0,0 +1,134 @@
+"""Per-container cache of Users items.
+
+A warm API lambda serves the same few users over and over. Every summary or
+dashboard used to read the budget from the Users table, and every profile
+view read it again. ``ProfileStore`` keeps recently read items in an LRU of
+PROFILE_CACHE_SIZE entries, each valid for PROFILE_CACHE_TTL_SECONDS:
+
+* ``get`` answers from the cache and reads DynamoDB only on a miss or after
+  the TTL. Users without a profile are cached too, as None.
+* ``put`` and ``update`` write to the table and then store the written item
+  (write-through). ``fill_defaults`` only sets missing attributes and then
+  drops the cached entry. A container always sees its own writes. Other containers
+  see them once their entry expires, which bounds staleness to the TTL.
+
+``refresh`` skips the cache but still stores what it read. The response
+cache uses it for the data_version check, so later budget lookups in the same
+request come from the cache.
+
+Hits are logged at DEBUG level and misses at INFO, together with the running
+hit and miss counts. PROFILE_CACHE_SIZE=0 turns the cache off.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', '1024'))
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv('PROFILE_CACHE_TTL_SECONDS', '60'))
+
+_MISSING = object()
+
+class TTLCache:
+    """LRU cache whose entries also expire after ``ttl`` seconds"""
+
+    def __init__(self, max_size=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL_SECONDS, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The cached value, or _MISSING if absent or expired"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return _MISSING
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self.entries[key] = (self.clock() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+class ProfileStore:
+    """Users table reads and writes through a TTLCache; items are copied so callers can't alter cached ones"""
+
+    def __init__(self, users_table, cache=None):
+        self.table = users_table
+        self.cache = cache if cache is not None else TTLCache()
+
+    def get(self, user_id):
+        """The user's profile item, or None if there is none"""
+        cached = self.cache.get(user_id)
+        if cached is not _MISSING:
+            logger.debug('Profile cache hit for %s', user_id)
+            return dict(cached) if cached is not None else None
+        logger.info('Profile cache miss for %s (%s)', user_id, self.cache.stats())
+        item = self.table.get_item(Key={'user_id': user_id}).get('Item')
+        self.cache.set(user_id, item)
+        return dict(item) if item is not None else None
+
+    def refresh(self, user_id):
+        """Read the item from the table even if it is cached, for reads that must be current"""
+        item = self.table.get_item(Key={'user_id': user_id}, ConsistentRead=True).get('Item')
+        self.cache.set(user_id, item)
+        return dict(item) if item is not None else None
+
+    def put(self, item):
+        try:
+            self.table.put_item(Item=item)
+        except Exception:
+            # The table may or may not hold the item now; let the next get find out
+            self.cache.invalidate(item['user_id'])
+            raise
+        self.cache.set(item['user_id'], dict(item))
+
+    def fill_defaults(self, user_id, defaults):
+        """Set the attributes the item lacks to their defaults and return the item; existing values are kept"""
+        names = {f'#a{i}': name for i, name in enumerate(defaults)}
+        values = {f':v{i}': value for i, value in enumerate(defaults.values())}
+        try:
+            response = self.table.update_item(
+                Key={'user_id': user_id},
+                UpdateExpression='SET ' + ', '.join(f'#a{i} = if_not_exists(#a{i}, :v{i})' for i in range(len(defaults))),
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                ReturnValues='ALL_NEW'
+            )
+        finally:
+            # The next get reads the item as it is now, data_version included
+            self.cache.invalidate(user_id)
+        return response['Attributes']
+
+    def update(self, user_id, **update_kwargs):
+        """update_item, caching the item as written; returns its new attributes"""
+        try:
+            response = self.table.update_item(Key={'user_id': user_id}, ReturnValues='ALL_NEW', **update_kwargs)
+        except Exception:
+            self.cache.invalidate(user_id)
+            raise
+        self.cache.set(user_id, dict(response['Attributes']))
+        return response['Attributes']
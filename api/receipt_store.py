@@ -0,0 +1,281 @@
+"""Data access for the Receipts table.
+
+All per-user reads go through the user_id/purchase_date global secondary
+index, so a request only reads the caller's receipts in the requested date
+range instead of scanning the whole table.
+
+``list_user_receipts`` serves the paginated /receipts listing. DynamoDB
+applies ``Limit`` before the filter expression, so a single filtered page
+can return anything from zero items to the whole limit. The listing keeps
+querying until it has ``limit`` matching receipts, the index is exhausted,
+or LIST_MAX_PAGES requests have been made. A ProjectionExpression limits it
+to LISTING_ATTRIBUTES. Its position is handed to the client as an opaque
+cursor that never contains the user_id.
+
+The OCR text is kept out of the items (see lambda/text_store.py) and only
+``read_receipt_text`` fetches it, for the single-receipt view.
+
+Reads that don't depend on each other run concurrently. ``submit`` puts
+them on a per-container thread pool of DYNAMODB_FANOUT_WORKERS threads, and
+they share one client whose connection pool is large enough for the pool and
+the query segments together. With RECEIPTS_QUERY_SEGMENTS above one, a user
+query with both dates set is split into that many date ranges, which are read
+in parallel. DynamoDB can't segment a query the way it segments a scan.
+"""
+import base64
+import gzip
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, timedelta
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.config import Config
+
+USER_DATE_INDEX = os.getenv('DYNAMODB_RECEIPTS_USER_DATE_INDEX', 'user_id-purchase_date-index')
+
+# Items per request page (0 = let DynamoDB fill its 1 MB page) and the number
+# of date ranges a bounded user query is split into (see iter_user_receipts).
+PAGE_SIZE = int(os.getenv('RECEIPTS_PAGE_SIZE', '0'))
+QUERY_SEGMENTS = int(os.getenv('RECEIPTS_QUERY_SEGMENTS', '1'))
+
+# Threads for concurrent reads within a request (0 = run them one after another)
+# and the HTTP connections kept open to DynamoDB, enough for every thread at once
+FANOUT_WORKERS = int(os.getenv('DYNAMODB_FANOUT_WORKERS', '8'))
+MAX_POOL_CONNECTIONS = int(os.getenv(
+    'DYNAMODB_MAX_POOL_CONNECTIONS', str(max(10, FANOUT_WORKERS + QUERY_SEGMENTS))
+))
+_executor = None
+_executor_lock = threading.Lock()
+
+# Request budget of one /receipts page, and the items read per request while a
+# filter is active (a larger page means fewer round trips for sparse matches)
+LIST_MAX_PAGES = int(os.getenv('RECEIPTS_LIST_MAX_PAGES', '5'))
+LIST_FILTER_PAGE_SIZE = int(os.getenv('RECEIPTS_LIST_FILTER_PAGE_SIZE', '200'))
+# Everything the listing shows; the OCR text is left to the single-receipt view
+LISTING_ATTRIBUTES = (
+    'receipt_id', 'user_id', 'file_name', 'upload_date', 'merchant', 'purchase_date',
+    'purchase_time', 'total_amount', 'amount_cents', 'category', 'year_month', 'duplicate_files'
+)
+# Where an item keeps its OCR text: inline (older items), gzip binary, or an S3 sidecar
+TEXT_ATTRIBUTES = ('raw_text', 'raw_text_gz', 'raw_text_key')
+# The index key of a receipt; the user_id part is never taken from a cursor
+CURSOR_KEYS = ('receipt_id', 'purchase_date')
+
+def get_dynamodb_resource():
+    """Return a DynamoDB resource, honouring DYNAMODB_ENDPOINT_URL for DynamoDB Local or moto_server"""
+    config = Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        # Warm containers reuse their connections instead of paying a TLS handshake per request
+        tcp_keepalive=True,
+        retries={'mode': 'standard'}
+    )
+    endpoint_url = os.getenv('DYNAMODB_ENDPOINT_URL')
+    if endpoint_url:
+        return boto3.resource('dynamodb', endpoint_url=endpoint_url, config=config)
+    return boto3.resource('dynamodb', config=config)
+
+def submit(fn, *args, **kwargs):
+    """Start fn(*args, **kwargs) on the shared fan-out pool and return its Future"""
+    global _executor
+    if FANOUT_WORKERS <= 0:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+    return _executor.submit(fn, *args, **kwargs)
+
+def user_range_condition(user_id, sort_key, start=None, end=None):
+    """Build a key condition for a user's partition with an optional sort key range"""
+    condition = Key('user_id').eq(user_id)
+    if start and end:
+        return condition & Key(sort_key).between(start, end)
+    if start:
+        return condition & Key(sort_key).gte(start)
+    if end:
+        return condition & Key(sort_key).lte(end)
+    return condition
+
+def user_date_condition(user_id, start_date=None, end_date=None):
+    """Build the key condition for a user's receipts in an optional ISO date range"""
+    return user_range_condition(user_id, 'purchase_date', start_date, end_date)
+
+def query_user_receipts(table, user_id, start_date=None, end_date=None, **query_kwargs):
+    """Query one page of a user's receipts from the user_id/purchase_date index.
+
+    Extra keyword arguments (FilterExpression, Limit, ExclusiveStartKey, ...)
+    are passed straight through to ``table.query``. ``table`` can be any object
+    with a boto3-compatible ``query`` method, e.g. a DynamoDB Local table or an
+    in-memory fake.
+    """
+    if start_date and end_date and start_date > end_date:
+        # DynamoDB rejects an inverted BETWEEN; an empty range has no receipts.
+        return {'Items': [], 'Count': 0, 'ScannedCount': 0}
+
+    return table.query(
+        IndexName=USER_DATE_INDEX,
+        KeyConditionExpression=user_date_condition(user_id, start_date, end_date),
+        **query_kwargs
+    )
+
+def iter_pages(operation, page_size=PAGE_SIZE, **request_kwargs):
+    """Yield successive response pages of a query or scan, following LastEvaluatedKey"""
+    if page_size:
+        request_kwargs['Limit'] = page_size
+    while True:
+        response = operation(**request_kwargs)
+        yield response
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        request_kwargs['ExclusiveStartKey'] = last_key
+
+def read_receipt_text(item, s3, bucket):
+    """A receipt's OCR text in whichever layout its item uses, or None; mirrors lambda/text_store.read_text"""
+    if 'raw_text' in item:
+        return item['raw_text']
+    if 'raw_text_gz' in item:
+        return gzip.decompress(bytes(item['raw_text_gz'])).decode('utf-8')
+    if 'raw_text_key' in item and bucket:
+        obj = s3.get_object(Bucket=bucket, Key=item['raw_text_key'])
+        return json.loads(gzip.decompress(obj['Body'].read()))['text']
+    return None
+
+def encode_cursor(item):
+    """Opaque cursor for the position right after ``item`` in the user's index"""
+    key = {name: item[name] for name in CURSOR_KEYS}
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, user_id):
+    """ExclusiveStartKey for a cursor from encode_cursor; raises ValueError for anything else"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(key, dict) or set(key) != set(CURSOR_KEYS) or not all(isinstance(v, str) for v in key.values()):
+        raise ValueError('Invalid cursor')
+    return {**key, 'user_id': user_id}
+
+def projection(attributes):
+    """ProjectionExpression and its ExpressionAttributeNames (placeholders avoid reserved words)"""
+    names = {f'#p{i}': name for i, name in enumerate(attributes)}
+    return {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+
+def list_user_receipts(table, user_id, limit, start_date=None, end_date=None, filter_expression=None,
+                       cursor=None, newest_first=True, max_pages=LIST_MAX_PAGES):
+    """Return (receipts, next cursor or None, requests made) for one page of the /receipts listing.
+
+    Receipts come newest first unless ``newest_first`` is False. Fills the
+    page up to ``limit`` matching receipts across as many requests as
+    ``max_pages`` allows. When the budget runs out first, the page is short but
+    the cursor still continues from where reading stopped.
+    """
+    if start_date and end_date and start_date > end_date:
+        return [], None, 0
+
+    query_kwargs = {
+        'IndexName': USER_DATE_INDEX,
+        'KeyConditionExpression': user_date_condition(user_id, start_date, end_date),
+        'ScanIndexForward': not newest_first,
+        # One extra item tells whether another page exists without another request
+        'Limit': limit + 1 if filter_expression is None else max(limit + 1, LIST_FILTER_PAGE_SIZE),
+    }
+    if filter_expression is not None:
+        query_kwargs['FilterExpression'] = filter_expression
+    query_kwargs.update(projection(LISTING_ATTRIBUTES))
+    if cursor:
+        query_kwargs['ExclusiveStartKey'] = decode_cursor(cursor, user_id)
+
+    receipts = []
+    requests = 0
+    while True:
+        response = table.query(**query_kwargs)
+        requests += 1
+        page = response['Items']
+        last_key = response.get('LastEvaluatedKey')
+        if len(receipts) + len(page) > limit:
+            # More matches than fit: continue right after the last one returned
+            receipts.extend(page[:limit - len(receipts)])
+            return receipts, encode_cursor(receipts[-1]), requests
+        receipts.extend(page)
+        if not last_key:
+            return receipts, None, requests
+        if len(receipts) == limit or requests >= max_pages:
+            return receipts, encode_cursor(last_key), requests
+        query_kwargs['ExclusiveStartKey'] = last_key
+
+def date_segments(start_date, end_date, segments):
+    """Split an ISO date range into up to ``segments`` (start, next start) pairs of about equal length"""
+    try:
+        first, last = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    except (TypeError, ValueError):
+        return None
+    days = (last - first).days + 1
+    segments = min(segments, days)
+    if segments <= 1:
+        return None
+    starts = [(first + timedelta(days=days * i // segments)).isoformat() for i in range(segments)]
+    return list(zip(starts, starts[1:] + [None]))
+
+def query_date_segment(table, user_id, start, next_start, end_date, page_size, query_kwargs):
+    """All receipts from ``start`` up to (not including) ``next_start``, or up to ``end_date`` for the last segment"""
+    if next_start is None:
+        return list(iter_user_receipts(table, user_id, start, end_date, page_size, segments=1, **query_kwargs))
+    # BETWEEN is inclusive; receipts dated exactly next_start belong to the next segment
+    items = iter_user_receipts(table, user_id, start, next_start, page_size, segments=1, **query_kwargs)
+    return [item for item in items if item.get('purchase_date') != next_start]
+
+def iter_user_receipts(table, user_id, start_date=None, end_date=None, page_size=PAGE_SIZE,
+                       segments=None, **query_kwargs):
+    """Lazily yield every receipt of a user in an optional date range, across all pages.
+
+    With several segments (default RECEIPTS_QUERY_SEGMENTS) and both dates
+    given, the range is read as that many concurrent queries. A segment's items
+    are held until the earlier segments have been yielded, so the order is the
+    same as a single query's.
+    """
+    if start_date and end_date and start_date > end_date:
+        return
+
+    segments = QUERY_SEGMENTS if segments is None else segments
+    ranges = date_segments(start_date, end_date, segments) if segments > 1 and start_date and end_date else None
+    if ranges:
+        # Segment queries run on the fan-out pool, so don't call this from a task on that pool
+        futures = [
+            submit(query_date_segment, table, user_id, start, next_start, end_date, page_size, query_kwargs)
+            for start, next_start in ranges
+        ]
+        if query_kwargs.get('ScanIndexForward') is False:
+            futures.reverse()
+        for future in futures:
+            yield from future.result()
+        return
+
+    pages = iter_pages(
+        table.query,
+        page_size=page_size,
+        IndexName=USER_DATE_INDEX,
+        KeyConditionExpression=user_date_condition(user_id, start_date, end_date),
+        **query_kwargs
+    )
+    for page in pages:
+        yield from page['Items']
+
+def iter_user_rollups(rollups_table, user_id, start_month=None, end_month=None):
+    """Yield a user's monthly rollup items (oldest first) in an optional YYYY-MM range"""
+    if start_month and end_month and start_month > end_month:
+        return
+
+    pages = iter_pages(
+        rollups_table.query,
+        KeyConditionExpression=user_range_condition(user_id, 'year_month', start_month, end_month)
+    )
+    for page in pages:
+        yield from page['Items']
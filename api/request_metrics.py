@@ -0,0 +1,145 @@
+"""Per-request metrics for the API lambda.
+
+``instrument_dynamodb`` hooks the DynamoDB client's botocore events. Every
+read and write then asks for ``ReturnConsumedCapacity='TOTAL'``, and its
+consumed capacity, ScannedCount and Count are added to the request being
+served. This is how the handlers and receipt_store report them without
+passing anything around.
+
+``track_requests`` wraps the lambda handler. Once per request it prints a
+CloudWatch Embedded Metric Format line with the latency, the DynamoDB
+capacity and call count, the items scanned and returned, and the response
+size, with the route as the dimension. A request slower than SLOW_REQUEST_MS
+is also logged as a structured JSON warning together with its query
+parameter names.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.getenv('METRICS_NAMESPACE', 'ReceiptScanner')
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '1000'))
+
+# Operations that accept ReturnConsumedCapacity
+CAPACITY_OPERATIONS = (
+    'GetItem', 'PutItem', 'UpdateItem', 'DeleteItem', 'Query', 'Scan',
+    'BatchGetItem', 'BatchWriteItem', 'TransactGetItems', 'TransactWriteItems'
+)
+METRIC_UNITS = {
+    'latency_ms': 'Milliseconds',
+    'response_bytes': 'Bytes',
+    'dynamodb_calls': 'Count',
+    'consumed_capacity': 'Count',
+    'items_scanned': 'Count',
+    'items_returned': 'Count',
+}
+
+class RequestMetrics:
+    """Counters of one API request; DynamoDB calls from worker threads add to them too."""
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.dynamodb_calls = 0
+        self.consumed_capacity = 0.0
+        self.items_scanned = 0
+        self.items_returned = 0
+        self._lock = threading.Lock()
+
+    def add_dynamodb_call(self, response):
+        # GetItem reports neither count; it read one item if it found one
+        found = 1 if 'Item' in response else 0
+        capacity = response.get('ConsumedCapacity') or []
+        # Batch and transaction calls report one entry per table
+        if isinstance(capacity, dict):
+            capacity = [capacity]
+        with self._lock:
+            self.dynamodb_calls += 1
+            self.consumed_capacity += sum(entry.get('CapacityUnits', 0) for entry in capacity)
+            self.items_scanned += response.get('ScannedCount', found)
+            self.items_returned += response.get('Count', found)
+
+    def record(self, response):
+        body = response.get('body') or ''
+        return {
+            'route': self.route,
+            'status': response.get('statusCode'),
+            'latency_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'response_bytes': len(body.encode()) if isinstance(body, str) else len(body),
+            'dynamodb_calls': self.dynamodb_calls,
+            'consumed_capacity': round(self.consumed_capacity, 2),
+            'items_scanned': self.items_scanned,
+            'items_returned': self.items_returned,
+        }
+
+# The request being served; Lambda runs one request per container at a time
+_current = None
+
+def _add_return_consumed_capacity(params, **kwargs):
+    if _current is not None:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+def _count_dynamodb_call(http_response, parsed, **kwargs):
+    if _current is not None and isinstance(parsed, dict) and 'Error' not in parsed:
+        _current.add_dynamodb_call(parsed)
+
+def instrument_dynamodb(client):
+    """Register the capacity and item counting hooks on a DynamoDB client (``resource.meta.client``)"""
+    if not REQUEST_METRICS:
+        return
+    for operation in CAPACITY_OPERATIONS:
+        client.meta.events.register(f'before-parameter-build.dynamodb.{operation}', _add_return_consumed_capacity)
+        client.meta.events.register(f'after-call.dynamodb.{operation}', _count_dynamodb_call)
+
+def route_of(event):
+    """Route template such as 'GET /receipts/{id}', so per-route metrics don't split by ID"""
+    method = event.get('httpMethod') or event.get('requestContext', {}).get('http', {}).get('method')
+    # API Gateway REST events carry the resource template, HTTP APIs the route key
+    if event.get('routeKey') and event['routeKey'] != '$default':
+        return event['routeKey']
+    path = event.get('resource') or event.get('path') or event.get('requestContext', {}).get('http', {}).get('path')
+    return f'{method} {path}' if method else 'direct'
+
+def emf_record(record):
+    """CloudWatch Embedded Metric Format line for one request, with the route as the dimension"""
+    return {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Route']],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, unit in METRIC_UNITS.items()],
+            }],
+        },
+        'Route': record['route'],
+        **{name: value for name, value in record.items() if name != 'route'},
+    }
+
+def track_requests(handler):
+    """Wrap a lambda handler so that every request is measured and slow ones are logged"""
+    if not REQUEST_METRICS:
+        return handler
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _current
+        request = RequestMetrics(route_of(event))
+        _current = request
+        response = None
+        try:
+            response = handler(event, context)
+            return response
+        finally:
+            _current = None
+            record = request.record(response or {'statusCode': 500})
+            print(json.dumps(emf_record(record), separators=(',', ':')))
+            if record['latency_ms'] >= SLOW_REQUEST_MS:
+                record['query_params'] = sorted((event.get('queryStringParameters') or {}).keys())
+                logger.warning('Slow request %s', json.dumps(record))
+    return wrapper
@@ -0,0 +1,100 @@
+"""Cached analytics responses, validated by the user's data version.
+
+The OCR lambda bumps ``data_version`` on a user's Users item with every
+receipt it saves. Profile updates bump it too, because the budget is part of
+the summary. An analytics response is therefore fully determined by the user,
+the route, the query parameters, that version and the current date. The date
+matters because the default summary range is relative to today.
+``response_key`` hashes those inputs.
+
+* The ETag is derived from the key, so a request whose If-None-Match matches
+  gets a 304 without anything being computed. Browsers send If-None-Match by
+  themselves once a response carried an ETag and ``Cache-Control: no-cache``.
+* Bodies are kept in a per-container LRU of RESPONSE_CACHE_SIZE entries.
+  With RESPONSE_CACHE_TABLE set, they are also kept gzip-compressed in a
+  DynamoDB table shared by all containers, with a DynamoDB TTL on
+  ``expires_at``.
+
+A new version changes the key, so stale entries are never served. They
+simply age out. Bump RESPONSE_FORMAT when a payload's shape changes.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import date
+
+from boto3.dynamodb.types import Binary
+
+from profile_cache import TTLCache, _MISSING
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE = os.getenv('RESPONSE_CACHE', 'true').lower() == 'true'
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '128'))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '86400'))
+RESPONSE_CACHE_TABLE = os.getenv('RESPONSE_CACHE_TABLE')
+RESPONSE_FORMAT = 1
+
+def response_key(user_id, route, query_params, version):
+    """Hash of everything an analytics response depends on"""
+    # Empty parameters are the same as missing ones
+    params = sorted((name, value) for name, value in (query_params or {}).items() if value not in (None, ''))
+    material = [RESPONSE_FORMAT, user_id, route, params, str(version), date.today().isoformat()]
+    return hashlib.sha256(json.dumps(material, separators=(',', ':')).encode()).hexdigest()
+
+def etag(key):
+    return f'"{key[:32]}"'
+
+def if_none_match(event):
+    """ETags listed in the request's If-None-Match header, weak ones included"""
+    headers = event.get('headers') or {}
+    value = next((v for name, v in headers.items() if name.lower() == 'if-none-match'), None)
+    if not value:
+        return set()
+    return {tag.strip().removeprefix('W/') for tag in value.split(',')}
+
+class ResponseCache:
+    """Serialized response bodies by response_key, in memory and optionally in a shared table"""
+
+    def __init__(self, shared_table=None, max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS):
+        self.memory = TTLCache(max_size=max_size, ttl=ttl)
+        self.shared_table = shared_table
+        self.ttl = ttl
+
+    def get(self, key):
+        body = self.memory.get(key)
+        if body is not _MISSING:
+            return body
+        if self.shared_table is None:
+            return None
+        try:
+            item = self.shared_table.get_item(Key={'cache_key': key}).get('Item')
+        except Exception as e:
+            logger.warning('Response cache read failed: %s', e)
+            return None
+        # DynamoDB deletes expired items only eventually
+        if item is None or item['expires_at'] <= time.time():
+            return None
+        body = gzip.decompress(bytes(item['body'])).decode()
+        self.memory.set(key, body)
+        return body
+
+    def put(self, key, body):
+        self.memory.set(key, body)
+        if self.shared_table is None:
+            return
+        try:
+            self.shared_table.put_item(Item={
+                'cache_key': key,
+                'body': Binary(gzip.compress(body.encode())),
+                'expires_at': int(time.time()) + self.ttl,
+            })
+        except Exception as e:
+            # The response is still served; only other containers miss out
+            logger.warning('Response cache write failed: %s', e)
+
+    def stats(self):
+        return self.memory.stats()
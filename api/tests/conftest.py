@@ -0,0 +1,34 @@
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-central-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.pop('DYNAMODB_ENDPOINT_URL', None)
+
+import receipt_store
+
+@pytest.fixture
+def receipts_table():
+    """Empty Receipts table with the user/date index, in moto"""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb')
+        string = lambda name: {'AttributeName': name, 'AttributeType': 'S'}
+        yield dynamodb.create_table(
+            TableName='Receipts',
+            BillingMode='PAY_PER_REQUEST',
+            KeySchema=[{'AttributeName': 'receipt_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[string('receipt_id'), string('user_id'), string('purchase_date')],
+            GlobalSecondaryIndexes=[{
+                'IndexName': receipt_store.USER_DATE_INDEX,
+                'KeySchema': [{'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                              {'AttributeName': 'purchase_date', 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'ALL'},
+            }],
+        )
@@ -0,0 +1,160 @@
+from datetime import date, timedelta
+
+import pytest
+from boto3.dynamodb.conditions import Attr
+
+import receipt_store
+from analytics import ListingAccumulator
+from receipt_store import decode_cursor, encode_cursor, iter_user_receipts, list_user_receipts
+
+USER_ID = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
+START = date(2024, 1, 1)
+
+def seed(table, days=60, user_id=USER_ID, prefix='r'):
+    """One receipt per day from START, alternating between two categories"""
+    receipts = []
+    with table.batch_writer() as batch:
+        for i in range(days):
+            receipt = {
+                'receipt_id': f'{prefix}{i:03d}',
+                'user_id': user_id,
+                'purchase_date': (START + timedelta(days=i)).isoformat(),
+                'merchant': 'REWE' if i % 2 else 'ALDI',
+                'category': 'groceries' if i % 2 else 'household',
+                'total_amount': f'{i}.99',
+                'raw_text': 'SUMME EUR',
+            }
+            batch.put_item(Item=receipt)
+            receipts.append(receipt)
+    return receipts
+
+def test_user_query_reads_only_the_users_range(receipts_table):
+    seed(receipts_table)
+    seed(receipts_table, user_id='someone-else', prefix='other-')
+    items = list(iter_user_receipts(receipts_table, USER_ID, '2024-01-10', '2024-01-19', page_size=3))
+    assert [item['receipt_id'] for item in items] == [f'r{i:03d}' for i in range(9, 19)]
+    assert len(list(iter_user_receipts(receipts_table, USER_ID, start_date='2024-02-01'))) == 29
+    assert len(list(iter_user_receipts(receipts_table, USER_ID, end_date='2024-01-05'))) == 5
+    assert list(iter_user_receipts(receipts_table, USER_ID, '2024-02-01', '2024-01-01')) == []
+
+def read_all(table, limit, cursor=None, **kwargs):
+    """Every receipt of the listing, page by page; returns the ids and the pages' lengths"""
+    ids, lengths = [], []
+    while True:
+        receipts, cursor, _ = list_user_receipts(table, USER_ID, limit, cursor=cursor, **kwargs)
+        ids.extend(receipt['receipt_id'] for receipt in receipts)
+        lengths.append(len(receipts))
+        if cursor is None:
+            return ids, lengths
+
+def test_cursor_round_trip():
+    item = {'receipt_id': 'r001', 'purchase_date': '2024-01-02', 'user_id': 'someone-else', 'merchant': 'REWE'}
+    cursor = encode_cursor(item)
+    assert 'someone-else' not in cursor and '=' not in cursor
+    # The user always comes from the request, never from the cursor
+    assert decode_cursor(cursor, USER_ID) == {'receipt_id': 'r001', 'purchase_date': '2024-01-02', 'user_id': USER_ID}
+
+@pytest.mark.parametrize('cursor', ['not a cursor', encode_cursor({'receipt_id': 'r', 'purchase_date': 'd'})[:-3], 'W10'])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, USER_ID)
+
+def test_pages_cover_every_receipt_once(receipts_table):
+    receipts = seed(receipts_table)
+    ids, lengths = read_all(receipts_table, 25)
+    assert ids == [receipt['receipt_id'] for receipt in reversed(receipts)]
+    assert lengths == [25, 25, 10]
+
+def test_first_page_holds_the_newest_receipts(receipts_table):
+    seed(receipts_table)
+    receipts, cursor, _ = list_user_receipts(receipts_table, USER_ID, 5)
+    assert [receipt['purchase_date'] for receipt in receipts] == [f'2024-02-{day}' for day in range(29, 24, -1)]
+    assert cursor is not None
+
+def test_oldest_first(receipts_table):
+    receipts = seed(receipts_table)
+    ids, _ = read_all(receipts_table, 7, newest_first=False)
+    assert ids == [receipt['receipt_id'] for receipt in receipts]
+
+@pytest.mark.parametrize('newest_first', [True, False])
+def test_dashboard_listing_matches_the_first_page(receipts_table, newest_first):
+    seed(receipts_table)
+    listing = ListingAccumulator(category='groceries', limit=10, newest_first=newest_first)
+    for item in iter_user_receipts(receipts_table, USER_ID):
+        listing.add(item)
+    only = Attr('category').eq('groceries')
+    expected, _, _ = list_user_receipts(receipts_table, USER_ID, 10, filter_expression=only,
+                                        newest_first=newest_first, max_pages=10)
+    assert [receipt['receipt_id'] for receipt in listing.payload()] == [receipt['receipt_id'] for receipt in expected]
+    # Its cursor continues in /receipts where the dashboard stopped
+    ids, _ = read_all(receipts_table, 10, filter_expression=only, newest_first=newest_first, max_pages=10,
+                      cursor=encode_cursor(listing.last_item()))
+    groceries = [f'r{i:03d}' for i in range(1, 60, 2)]
+    assert [receipt['receipt_id'] for receipt in listing.payload()] + ids == (groceries[::-1] if newest_first else groceries)
+
+def test_limit_plus_one_look_ahead(receipts_table):
+    seed(receipts_table, days=10)
+    receipts, cursor, requests = list_user_receipts(receipts_table, USER_ID, 10)
+    # The extra item shows that nothing follows, so no cursor and no second request
+    assert len(receipts) == 10 and cursor is None and requests == 1
+    receipts, cursor, requests = list_user_receipts(receipts_table, USER_ID, 9)
+    assert len(receipts) == 9 and cursor is not None and requests == 1
+
+def test_listing_leaves_out_the_text(receipts_table):
+    seed(receipts_table, days=3)
+    receipts, _, _ = list_user_receipts(receipts_table, USER_ID, 10)
+    assert all('raw_text' not in receipt for receipt in receipts)
+
+def test_filters_fill_the_page(receipts_table, monkeypatch):
+    receipts = seed(receipts_table)
+    # Requests of limit + 1 items, of which only about half match
+    monkeypatch.setattr(receipt_store, 'LIST_FILTER_PAGE_SIZE', 1)
+    expected = [receipt['receipt_id'] for receipt in receipts if receipt['category'] == 'groceries']
+    receipts, cursor, requests = list_user_receipts(
+        receipts_table, USER_ID, 10, filter_expression=Attr('category').eq('groceries'), max_pages=10
+    )
+    assert [receipt['receipt_id'] for receipt in receipts] == expected[::-1][:10]
+    assert requests > 1 and cursor is not None
+
+    ids, lengths = read_all(receipts_table, 10, filter_expression=Attr('category').eq('groceries'), max_pages=10)
+    assert ids == expected[::-1]
+    assert lengths == [10, 10, 10]
+
+def test_short_page_when_the_request_budget_runs_out(receipts_table, monkeypatch):
+    seed(receipts_table)
+    # Requests of six items, so three of them stop well before the one match
+    monkeypatch.setattr(receipt_store, 'LIST_FILTER_PAGE_SIZE', 6)
+    only = Attr('merchant').contains('ALDI') & Attr('total_amount').eq('2.99')
+    receipts_page, cursor, requests = list_user_receipts(receipts_table, USER_ID, 5, filter_expression=only, max_pages=3)
+    assert receipts_page == [] and requests == 3 and cursor is not None
+    ids, _ = read_all(receipts_table, 5, filter_expression=only, max_pages=3)
+    assert ids == ['r002']
+
+def test_date_range_and_other_users(receipts_table):
+    seed(receipts_table)
+    seed(receipts_table, user_id='someone-else', prefix='other-')
+    ids, _ = read_all(receipts_table, 4, start_date='2024-01-10', end_date='2024-01-19')
+    assert ids == [f'r{i:03d}' for i in range(18, 8, -1)]
+    assert list_user_receipts(receipts_table, USER_ID, 4, start_date='2024-02-01', end_date='2024-01-01') == ([], None, 0)
+
+@pytest.mark.parametrize('segments', [2, 3, 7, 100])
+@pytest.mark.parametrize('workers', [0, 4])
+@pytest.mark.parametrize('forward', [True, False])
+def test_segments_match_a_single_query(receipts_table, monkeypatch, segments, workers, forward):
+    seed(receipts_table)
+    # Receipts on the segment boundaries must be read exactly once
+    with receipts_table.batch_writer() as batch:
+        for i in range(20):
+            batch.put_item(Item={'receipt_id': f'same-day-{i}', 'user_id': USER_ID, 'purchase_date': '2024-01-31'})
+    monkeypatch.setattr(receipt_store, 'FANOUT_WORKERS', workers)
+    kwargs = {'start_date': '2024-01-05', 'end_date': '2024-02-20', 'page_size': 7, 'ScanIndexForward': forward}
+
+    expected = list(iter_user_receipts(receipts_table, USER_ID, segments=1, **kwargs))
+    assert len(expected) == 47 + 20
+    assert list(iter_user_receipts(receipts_table, USER_ID, segments=segments, **kwargs)) == expected
+
+def test_segments_need_both_dates(receipts_table):
+    seed(receipts_table)
+    assert len(list(iter_user_receipts(receipts_table, USER_ID, start_date='2024-02-01', segments=4))) == 29
+    assert receipt_store.date_segments('2024-01-01', None, 4) is None
+    assert receipt_store.date_segments('2024-01-01', '2024-01-02', 4) == [('2024-01-01', '2024-01-02'), ('2024-01-02', None)]
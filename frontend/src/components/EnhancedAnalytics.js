@@ -68,63 +68,18 @@ function EnhancedAnalytics() {
         params.category = filters.category;
       }
 
-      // Fetch core analytics first
       const token = localStorage.getItem('id_token');
       const headers = token ? { Authorization: `Bearer ${token}` } : {};
       
-      const [receiptsRes, analyticsRes, trendsRes] = await Promise.all([
-        axios.get(`${API_BASE_URL}/receipts`, { params, headers }),
-        axios.get(`${API_BASE_URL}/analytics/summary`, { params, headers }),
-        axios.get(`${API_BASE_URL}/analytics/monthly`, { params, headers })
-      ]);
+      // One request: the API reads the receipts once and builds every payload from them
+      const dashboardRes = await axios.get(`${API_BASE_URL}/analytics/dashboard`, { params, headers });
+      const dashboard = dashboardRes.data;
 
-      setReceipts(receiptsRes.data.receipts);
-      setAnalytics(analyticsRes.data.summary);
-      setMonthlyTrends(trendsRes.data.monthly_trends);
-
-      // Try to fetch advanced analytics, but don't fail if they're not available
-      try {
-        const [metricsRes, patternsRes] = await Promise.all([
-          axios.get(`${API_BASE_URL}/analytics/metrics`, { params, headers }),
-          axios.get(`${API_BASE_URL}/analytics/patterns`, { params, headers })
-        ]);
-        setKeyMetrics(metricsRes.data.metrics);
-        setSpendingPatterns(patternsRes.data.patterns);
-      } catch (advancedError) {
-        console.warn('Advanced analytics not available:', advancedError);
-        // Calculate basic metrics from receipts as fallback
-        if (receiptsRes.data.receipts.length > 0) {
-          const amounts = receiptsRes.data.receipts.map(r => parseFloat(r.total_amount?.replace(',', '.') || 0));
-          const avgSpending = amounts.reduce((a, b) => a + b, 0) / amounts.length;
-          const maxReceipt = receiptsRes.data.receipts.reduce((max, r) => {
-            const amount = parseFloat(r.total_amount?.replace(',', '.') || 0);
-            return amount > parseFloat(max.total_amount?.replace(',', '.') || 0) ? r : max;
-          });
-          const merchants = receiptsRes.data.receipts.reduce((acc, r) => {
-            acc[r.merchant] = (acc[r.merchant] || 0) + 1;
-            return acc;
-          }, {});
-          const topMerchant = Object.entries(merchants).sort((a, b) => b[1] - a[1])[0];
-          
-          setKeyMetrics({
-            average_spending: avgSpending.toFixed(2),
-            most_expensive: {
-              amount: parseFloat(maxReceipt.total_amount?.replace(',', '.') || 0).toFixed(2),
-              merchant: maxReceipt.merchant || '',
-              date: maxReceipt.purchase_date || ''
-            },
-            most_frequent_merchant: {
-              name: topMerchant ? topMerchant[0] : '',
-              count: topMerchant ? topMerchant[1] : 0
-            },
-            month_comparison: {
-              current: 0,
-              previous: 0,
-              change_percent: 0
-            }
-          });
-        }
-      }
+      setReceipts(dashboard.receipts);
+      setAnalytics(dashboard.summary);
+      setMonthlyTrends(dashboard.monthly_trends);
+      setKeyMetrics(dashboard.metrics);
+      setSpendingPatterns(dashboard.patterns);
     } catch (error) {
       console.error('Error fetching data:', error);
       setError('Failed to load analytics data. Please try again.');
@@ -1,215 +1,202 @@
+import importlib.util
 import json
 import os
-import io
-import re
+import threading
+import time
 import boto3
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from urllib.parse import unquote_plus
-from PIL import Image, ImageEnhance, ImageFilter
-import pytesseract
-from pdf2image import convert_from_bytes
-import cv2
-import numpy as np
+from rollups import apply_rollup
+from normalize import canonical_fields
+from extraction import extract_fields
+from ocr_engine import OCR_LANG, TESSERACT_CONFIG, create_backend
+from dedup import receipt_hashes, find_duplicate, find_similar, same_receipt, link_duplicate, remember_receipt
+from ocr_cache import ocr_cache_key, load_ocr, store_ocr
+from ingest import Upload, UploadRejected, download, open_image
+from reparse import reparse_and_refresh
+from tracing import NULL_TRACE, emit, new_trace
+from text_store import read_text, store_text
+import data_version
 
 s3 = boto3.client("s3")
 dynamodb = boto3.resource("dynamodb")
 table = dynamodb.Table("Receipts")
+# Monthly rollups are optional so the handler still works before the table exists
+ROLLUPS_TABLE = os.environ.get("DYNAMODB_ROLLUPS_TABLE")
+rollups_table = dynamodb.Table(ROLLUPS_TABLE) if ROLLUPS_TABLE else None
+# Duplicate uploads skip OCR when the dedup table is configured (see dedup.py)
+DEDUP_TABLE = os.environ.get("DYNAMODB_DEDUP_TABLE")
+dedup_table = dynamodb.Table(DEDUP_TABLE) if DEDUP_TABLE else None
+DEDUP_MODE = os.environ.get("DEDUP_MODE", "link")
+# Every change to a user's receipts bumps data_version on their Users item; the API
+# derives its ETags and response cache keys from it (see api/response_cache.py)
+USERS_TABLE = os.environ.get("DYNAMODB_USERS_TABLE")
+users_table = dynamodb.Table(USERS_TABLE) if USERS_TABLE else None
 
-# --- NEW: simple field extractor ---------------------------------
-def extract_fields(text: str) -> dict:
-    """Return merchant, purchase_date, purchase_time, total_amount, and category from OCR text."""
+# Receipts of one batch are OCR'd in parallel, one worker per vCPU by default
+MAX_WORKERS = int(os.environ.get("OCR_MAX_WORKERS", "0")) or os.cpu_count() or 1
+# Keep each tesseract engine single-threaded so parallel workers don't oversubscribe the vCPUs
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+# PDFs are rasterized one page at a time. PDF_PAGE_WORKERS caps the pages held at once
+# across the whole batch, so peak memory is about PDF_PAGE_WORKERS rasterized pages plus
+# one decoded image per batch worker that is on a photo, however many PDFs the batch has
+PDF_DPI = int(os.environ.get("PDF_DPI", "200"))
+PDF_PAGE_WORKERS = int(os.environ.get("PDF_PAGE_WORKERS", "0")) or MAX_WORKERS
+_pdf_page_slots = threading.BoundedSemaphore(PDF_PAGE_WORKERS)
 
-    # Merchant: look for company name patterns
-    merchant = ""
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
-    
-    # Known German store names to prioritize
-    known_stores = ["KAUFLAND", "REWE", "EDEKA", "ALDI", "LIDL", "NETTO", "PENNY", "REAL", 
-                   "DM", "ROSSMANN", "SHELL", "ARAL", "ESSO", "BP", "MCDONALD", "BURGER KING",
-                   "EUROSHOP", "SCHUM", "ZARA", "H&M", "C&A", "ACTION", "TEDI", "NKD",
-                   "SATURN", "MEDIAMARKT", "CONRAD", "CYBERPORT", "APPLE",
-                   "APOTHEKE", "PHARMACY", "SUBWAY", "KFC", "DOMINOS", "TANKSTELLE",
-                   "PRIMARK", "NIKE", "ADIDAS", "REEBOK", "NEW YORKER",
-                   ]
-    
-    # First, try to find known store names
-    for line in lines:
-        line_upper = line.upper()
-        # Clean the line of special characters for better matching
-        cleaned_line = re.sub(r'[^A-Z0-9\s]', ' ', line_upper)
-        for store in known_stores:
-            if store in line_upper or store in cleaned_line:
-                if len(line.strip()) < 50:  # Avoid long lines
-                    merchant = store  # Use the clean store name instead of OCR text
-                    break
-        if merchant:
-            break
-    
-    # If no known store found, use improved heuristics
-    if not merchant:
-        for line in lines:
-            # Skip promotional/reward text
-            if re.search(r"(?:earned|points|purchase|You|o\s|danken|Einkauf)", line, re.IGNORECASE):
-                continue
-            # Skip lines with phone numbers, dates, or IDs
-            if re.search(r"(?:Tel|UID|Datum|Uhrzeit|\d{5,}|DE\d+|www\.|Terminal)", line, re.IGNORECASE):
-                continue
-            # Skip payment method text
-            if re.search(r"(?:GIROCARD|MAESTRO|VPAY|VISA|MASTERCARD|Kartennummer|Terminal ID)", line, re.IGNORECASE):
-                continue
-            # Look for company patterns (GmbH, Co.KG, etc.)
-            if re.search(r"(?:GmbH|Co\.?KG|AG|e\.V\.|UG)", line, re.IGNORECASE):
-                merchant = re.sub(r"[^a-zA-Z0-9\s&.]", "", line).strip()  # Clean special chars
-                break
-            # Look for lines with letters but not too long
-            if (re.search(r"[A-Za-z]{3,}", line) and 
-                len(line.strip()) < 40 and
-                not re.search(r"\d{3,}", line)):
-                merchant = line.strip()
-                break
-
-    # Date: German format patterns (DD.MM.YYYY and DD.MM.YY)
-    date_patterns = [
-        r"Datum\s+(\d{1,2}\.\d{1,2}\.\d{2,4})\s+",  # Datum 18.09.23 
-        r"(?:Datum|Date)\s*[:\-]?\s*(\d{1,2}\.\d{1,2}\.\d{4})",  # Datum: 16.08.2025
-        r"(?:Datum|Date)\s*[:\-]?\s*(\d{1,2}\.\d{1,2}\.\d{2})",  # Datum: 15.09.25
-        r"\b(\d{1,2}\.\d{1,2}\.\d{4})\b",  # 16.08.2025
-        r"\b(\d{1,2}\.\d{1,2}\.\d{2})\b",  # 15.09.25
-        r"\b(\d{4}-\d{1,2}-\d{1,2})\b",  # 2025-08-16
-        r"TSE-Start:\s*(\d{4}-\d{2}-\d{2})",  # TSE-Start: 2025-08-16
-    ]
-    found_date = ""
-    for pattern in date_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            found_date = match.group(1)
-            break
-
-    # Try to normalize to ISO YYYY-MM-DD
-    parsed_date = ""
-    if found_date:
-        date_formats = [
-            "%d.%m.%Y",  # German format 4-digit year
-            "%d.%m.%y",  # German format 2-digit year
-            "%Y-%m-%d",  # ISO format
-        ]
-        for fmt in date_formats:
-            try:
-                parsed_date = datetime.strptime(found_date, fmt).date().isoformat()
-                break
-            except Exception:
-                pass
-    if not parsed_date:
-        parsed_date = found_date
-
-    # Time: German format patterns
-    time_patterns = [
-        r"(?:Uhrzeit|Zeit)\s*[:\-]?\s*(\d{1,2}:\d{2}(?::\d{2})?)",  # Uhrzeit: 11:42:11
-        r"AS-Zeit\s+\d{2}\.\d{2}\.\s+(\d{1,2}:\d{2})",  # AS-Zeit 16.08. 11:42
-        r"\b(\d{1,2}:\d{2}(?::\d{2})?)\s+Uhr\b",  # 11:42:11 Uhr
-    ]
-    found_time = ""
-    for pattern in time_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            found_time = match.group(1)
-            break
-
-    # Total amount: German receipt patterns
-    amt_patterns = [
-        r"SUMME\s+(\d+[,.]\d{2})",  # ACTION format: SUMME 41.21 or 41,21
-        r"GESAMT\s+\d+\s+(\d+,\d{2})",  # GESAMT 3 23,05 (ZARA format)
-        r"Betrag:\s+(\d+,\d{2})",  # Betrag: 23,05
-        r"(?:TOTAL|Total)\s+EUR\s+(\d+[,.]\d{2})",  # TOTAL EUR 0.55 or 0,55
-        r"girocard\s+EUR\s+(\d+,\d{2})",  # girocard EUR 0,55
-        r"kontaktlos\s+girocard\s+EUR\s+(\d+,\d{2})",  # kontaktlos girocard EUR 0,55
-        r"Summe\s+(\d+,\d{2})",  # Kaufland: Summe 11,45
-        r"SUMME\s+EUR\s+(\d+,\d{2})",  # SUMME EUR 4,56
-        r"Betrag\s+EUR\s+(\d+,\d{2})",  # Betrag EUR 4,56
-        r"EUR\s+(\d+,\d{2})\s*$",  # EUR 11,45 at line end
-        r"Kartenzahlung\s+(\d+,\d{2})",  # Kartenzahlung 11,45
-        r"Gesamtbetrag\s+[\d,]+\s+[\d,]+\s+(\d+,\d{2})",  # Gesamtbetrag line
-        r"(?:Total|Gesamt)\s*[:\-]?\s*EUR?\s*(\d+,\d{2})",  # Total/Gesamt EUR 4,56
-        r"fotal\s+EUR\s+(\d+,\d{2})",  # OCR misread "Total" as "fotal"
-    ]
-    
-    total_amount = ""
-    for pattern in amt_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            total_amount = match.group(1)
-            break
-
-    # Category: determine based on merchant name
-    category_mapping = {
-        "grocery": ["REWE", "EDEKA", "ALDI", "LIDL", "KAUFLAND", "NETTO", "PENNY", "REAL", "SUPERMARKT"],
-        "restaurant": ["MCDONALD", "DOMINOS", "BURGER KING", "KFC", "SUBWAY", "PIZZA", "RESTAURANT", "CAFE", "BAR"],
-        "drogerie": ["APOTHEKE", "PHARMACY", "DM", "ROSSMANN", "DROGERIE"],
-        "gas_station": ["SHELL", "ARAL", "ESSO", "BP", "TOTAL", "TANKSTELLE", "JET"],
-        "clothing": ["H&M", "ZARA", "C&A", "PRIMARK", "NIKE", "ADIDAS", "REEBOK", "FASHION", "NEW YORKER", "HUGO BOSS", "PUMA"],
-        "electronics": ["MEDIA MARKT", "SATURN", "CONRAD", "CYBERPORT", "APPLE"],
-        "other": ["ACTION", "EUROSHOP", "SCHUM", "TEDI", "NKD"]
-    }
-    
-    category = "other"  # default
-    merchant_upper = merchant.upper()
-    for cat, keywords in category_mapping.items():
-        if any(keyword in merchant_upper for keyword in keywords):
-            category = cat
-            break
+# Tesseract stays loaded in memory across warm invocations (see ocr_engine.py).
+# It is created by the init-phase warmup, or else by the first OCR.
+_ocr_backend = None
+_ocr_backend_lock = threading.Lock()
+# Preload the OCR path and run a tiny OCR while the container initializes
+OCR_WARMUP = os.environ.get("OCR_WARMUP", "true").lower() == "true"
 
-    return {
-        "merchant": merchant,
-        "purchase_date": parsed_date,
-        "purchase_time": found_time,
-        "total_amount": total_amount,
-        "category": category
-    }
-# -----------------------------------------------------------------
+# Photos are OCR'd only in their header and totals bands (see roi.py) unless the full text is needed
+OCR_FULL_TEXT = os.environ.get("OCR_FULL_TEXT", "false").lower() == "true"
 
-def preprocess_image(img):
-    """Enhance image for better OCR accuracy"""
-    print("Applying image preprocessing...")
-    
-    # Convert PIL to OpenCV format
-    img_array = np.array(img)
-    if len(img_array.shape) == 3:
-        img_cv = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+# Raw OCR output is cached in S3 (see ocr_cache.py) when OCR_CACHE_BUCKET is set
+OCR_CACHE_BUCKET = os.environ.get("OCR_CACHE_BUCKET")
+OCR_CACHE_WORDS = os.environ.get("OCR_CACHE_WORDS", "false").lower() == "true"
+# CLAHE only runs when OpenCV is installed (see preprocess.py); checked without importing cv2
+PREPROCESS_VERSION = "v3+clahe" if importlib.util.find_spec("cv2") else "v3"
+# The traineddata variant baked into the image (fast or best, see the Dockerfile)
+TESSDATA = os.environ.get("TESSDATA", "fast")
+# Everything besides the file and Tesseract itself that shapes the OCR text; part of the cache key
+OCR_PIPELINE = f"{TESSERACT_CONFIG}|preprocess={PREPROCESS_VERSION}|tessdata={TESSDATA}|pdf_dpi={PDF_DPI}|words={OCR_CACHE_WORDS}|full_text={OCR_FULL_TEXT}"
+
+def _words_and_text(data: dict) -> tuple[list, str]:
+    """Word boxes from image_to_data output, and the text rebuilt line by line from them."""
+    words, lines = [], {}
+    for i, word in enumerate(data["text"]):
+        if not word.strip():
+            continue
+        words.append({
+            "text": word,
+            "conf": float(data["conf"][i]),
+            "box": [data["left"][i], data["top"][i], data["width"][i], data["height"][i]],
+            "line": [data["block_num"][i], data["par_num"][i], data["line_num"][i]],
+        })
+        lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(word)
+    return words, "\n".join(" ".join(line) for line in lines.values())
+
+def get_ocr_backend():
+    global _ocr_backend
+    with _ocr_backend_lock:
+        if _ocr_backend is None:
+            _ocr_backend = create_backend(OCR_LANG, TESSERACT_CONFIG)
+    return _ocr_backend
+
+def _recognize(img) -> tuple[str, list | None]:
+    backend = get_ocr_backend()
+    if OCR_CACHE_WORDS:
+        words, text = _words_and_text(backend.image_to_data(img))
+        return text, words
+    return backend.image_to_string(img), None
+
+def _has_all_fields(text: str) -> bool:
+    fields = extract_fields(text)
+    return bool(fields["merchant"] and fields["purchase_date"] and fields["total_amount"])
+
+def ocr_image(img, source: str = "photo") -> tuple[str, list | None, dict]:
+    """Preprocess and OCR one receipt image or PDF page; returns (text, word boxes or None, stage timings in ms)."""
+    # cv2 and NumPy load with the first image, so paths without OCR never import them
+    from preprocess import StageTimer, preprocess
+    from roi import ocr_regions
+
+    print(f"Original image size: {img.width}x{img.height}")
+    processed_img, timings, decisions = preprocess(img, source)
+    print(f"Preprocessed to {processed_img.width}x{processed_img.height}: {decisions}")
+
+    print(f"Running tesseract ({get_ocr_backend().name}) with German language support...")
+    timer = StageTimer(timings)
+    if OCR_FULL_TEXT or source != "photo":
+        with timer.stage("tesseract"):
+            text, words = _recognize(processed_img)
     else:
-        img_cv = img_array
-    
-    # Convert to grayscale
-    if len(img_cv.shape) == 3:
-        gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
+        text, words, regions = ocr_regions(processed_img, _recognize, _has_all_fields, timer)
+        print(f"Region OCR: {regions}")
+    print(f"Tesseract completed successfully, stage timings (ms): {timings}")
+    return text, words, timings
+
+def _ocr_pdf_page(pdf_path: str, page_number: int) -> tuple[str, list | None, dict]:
+    from pdf2image import convert_from_path
+
+    # Rasterize just this page, and only once one of the batch-wide page slots is free
+    started = time.perf_counter()
+    with _pdf_page_slots:
+        wait_ms = round((time.perf_counter() - started) * 1000, 1)
+        started = time.perf_counter()
+        pages = convert_from_path(pdf_path, dpi=PDF_DPI, first_page=page_number, last_page=page_number, grayscale=True)
+        rasterize_ms = round((time.perf_counter() - started) * 1000, 1)
+        if not pages:
+            return "", None, {"page_wait": wait_ms, "rasterize": rasterize_ms}
+        text, words, timings = ocr_image(pages[0], source="pdf")
+        del pages
+    for word in words or []:
+        word["page"] = page_number
+    return text, words, {"page_wait": wait_ms, "rasterize": rasterize_ms, **timings}
+
+def ocr_pdf(pdf_path: str) -> tuple[str, list | None, dict]:
+    """OCR a PDF page by page on a bounded pool, joining the page texts in order; timings are summed over pages.
+
+    Pages of all PDFs in the batch share PDF_PAGE_WORKERS slots (see _ocr_pdf_page).
+    """
+    from pdf2image import pdfinfo_from_path
+
+    page_count = pdfinfo_from_path(pdf_path)["Pages"]
+    print(f"PDF has {page_count} pages, rasterizing at {PDF_DPI} DPI")
+    if not page_count:
+        return "", None, {}
+    with ThreadPoolExecutor(max_workers=min(PDF_PAGE_WORKERS, page_count)) as executor:
+        pages = list(executor.map(lambda page_number: _ocr_pdf_page(pdf_path, page_number), range(1, page_count + 1)))
+    text = "\n".join(page_text for page_text, _, _ in pages)
+    words = [word for _, page_words, _ in pages for word in page_words] if OCR_CACHE_WORDS else None
+    timings = {}
+    for _, _, page_timings in pages:
+        for stage, ms in page_timings.items():
+            timings[stage] = round(timings.get(stage, 0) + ms, 1)
+    return text, words, timings
+
+def ocr_file(upload: Upload, img, file_hash: str) -> tuple[str, list | None, str | None, dict]:
+    """Return (OCR text, word boxes or None, cache key, stage timings) for an upload, using the OCR cache when this file and pipeline were seen before."""
+    cache_key = ocr_cache_key(file_hash, OCR_LANG, OCR_PIPELINE) if OCR_CACHE_BUCKET else None
+    if cache_key:
+        try:
+            cached = load_ocr(s3, OCR_CACHE_BUCKET, cache_key)
+        except Exception as e:
+            print(f"Error reading OCR cache: {e}")
+            cached = None
+        if cached:
+            print("OCR cache hit")
+            return cached["text"], cached.get("words"), cache_key, {}
+
+    if img is None:
+        print("Processing PDF...")
+        text, words, timings = ocr_pdf(upload.path)
     else:
-        gray = img_cv
-    
-    # Apply Gaussian blur to reduce noise
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    
-    # Enhance contrast using CLAHE
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    enhanced = clahe.apply(blurred)
-    
-    # Apply binary threshold (Otsu's method)
-    _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    
-    # Morphological operations to clean up
-    kernel = np.ones((2, 2), np.uint8)
-    cleaned = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
-    
-    # Convert back to PIL Image
-    processed_img = Image.fromarray(cleaned)
-    
-    print(f"Image preprocessing completed. Size: {processed_img.size}")
-    return processed_img
+        print("Processing image...")
+        text, words, timings = ocr_image(img)
 
-def lambda_handler(event, context):
-    print("Event:", json.dumps(event, indent=2))
-    record = event['Records'][0]
-    bucket = record['s3']['bucket']['name']
-    key = unquote_plus(record['s3']['object']['key'])
+    if cache_key:
+        try:
+            store_ocr(s3, OCR_CACHE_BUCKET, cache_key, text, words)
+        except Exception as e:
+            print(f"Error writing OCR cache: {e}")
+            cache_key = None
+    return text, words, cache_key, timings
+
+def load_receipt_text(item: dict) -> str | None:
+    """A receipt's OCR text: from the item or its sidecar (see text_store.py), else from the OCR cache."""
+    text = read_text(s3, item)
+    if text is None and OCR_CACHE_BUCKET and item.get("ocr_cache_key"):
+        cached = load_ocr(s3, OCR_CACHE_BUCKET, item["ocr_cache_key"])
+        text = cached["text"] if cached else None
+    return text
+
+def process_receipt(bucket: str, key: str, trace=NULL_TRACE) -> dict:
+    """OCR one uploaded receipt, save it and return its result; each stage is recorded in trace (see tracing.py)."""
     print(f"Processing file: {key} from bucket: {bucket}")
     
     # Validate bucket name
@@ -217,59 +204,93 @@ def lambda_handler(event, context):
     if bucket != expected_bucket:
         print(f"Warning: Processing file from unexpected bucket: {bucket}, expected: {expected_bucket}")
 
+    # Extract user_id from S3 key path (receipts/user_id/filename)
+    path_parts = key.split('/')
+    user_id = path_parts[1] if len(path_parts) >= 3 and path_parts[0] == 'receipts' else 'unknown'
+
+    # Validate user_id before downloading anything
+    if user_id == 'unknown' or not user_id or user_id == 'None':
+        print(f"Invalid user_id extracted from path: {key}")
+        # Retrying won't fix the path, so don't send it back to the queue
+        return {"status": "error", "message": "Invalid file path structure", "retryable": False}
+
     try:
         print("Getting S3 object...")
-        obj = s3.get_object(Bucket=bucket, Key=key)
-        file_bytes = obj['Body'].read()
-        
-        # Extract user_id from S3 key path (receipts/user_id/filename)
-        path_parts = key.split('/')
-        user_id = path_parts[1] if len(path_parts) >= 3 and path_parts[0] == 'receipts' else 'unknown'
-        
-        # Validate user_id
-        if user_id == 'unknown' or not user_id or user_id == 'None':
-            print(f"Invalid user_id extracted from path: {key}")
-            return {"status": "error", "message": "Invalid file path structure"}
-            
-        print(f"File size: {len(file_bytes)} bytes, User ID: {user_id}")
+        # Streamed to a temporary file; the format comes from the file's magic bytes (see ingest.py)
+        with trace.span("download") as span:
+            upload = download(s3, bucket, key)
+            span["bytes"] = upload.size
+        print(f"File size: {upload.size} bytes, format: {upload.format}, User ID: {user_id}")
+    except UploadRejected as e:
+        print(f"Rejected upload {key}: {e}")
+        return {"status": "error", "message": str(e), "retryable": False}
     except Exception as e:
         print(f"Error getting object: {e}")
         return {"status": "error", "message": str(e)}
 
+    img = None
+    if upload.format != "pdf":
+        # Images are decoded once up front, so their file can go right away
+        with upload:
+            try:
+                with trace.span("decode") as span:
+                    img = open_image(upload)
+                    span["pixels"] = img.width * img.height
+            except UploadRejected as e:
+                print(f"Error opening image: {e}")
+                return {"status": "error", "message": f"OCR failed: {str(e)}", "retryable": False}
+
+    file_hash = upload.sha256
+    hashes = []
+    similar = None
+    if dedup_table is not None:
+        try:
+            with trace.span("dedup"):
+                hashes = receipt_hashes(file_hash, img)
+                original = find_duplicate(dedup_table, table, user_id, hashes)
+                # A look-alike image is only a candidate; the OCR'd fields decide below
+                similar = find_similar(dedup_table, table, user_id, hashes) if original is None else None
+        except Exception as e:
+            # Dedup is an optimization; fall back to a normal upload
+            print(f"Error checking for duplicates: {e}")
+            original = None
+        if original:
+            upload.close()
+            return reuse_duplicate(original, key, user_id)
+
     try:
         print("Starting OCR processing...")
-        if key.lower().endswith(".pdf"):
-            print("Processing PDF...")
-            pages = convert_from_bytes(file_bytes)
-            text_output = "\n".join([pytesseract.image_to_string(page, lang='deu+eng') for page in pages])
-        else:
-            print("Processing image...")
-            img = Image.open(io.BytesIO(file_bytes))
-            if img.width > 2000 or img.height > 2000:
-                print("Resizing large image...")
-                img.thumbnail((2000, 2000), Image.Resampling.LANCZOS)
-            print(f"Original image size: {img.width}x{img.height}")
-            
-            # Apply image preprocessing for better OCR
-            processed_img = preprocess_image(img)
-            
-            print("Running tesseract with German language support...")
-            # Enhanced Tesseract config for better text recognition
-            custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyzÄÖÜäöüß.,:-€ '
-            text_output = pytesseract.image_to_string(processed_img, lang='deu+eng', config=custom_config, timeout=60)
-            print("Tesseract completed successfully")
+        with trace.span("ocr") as span:
+            text_output, words, cache_key, timings = ocr_file(upload, img, file_hash)
+            # An empty timings dict means the text came from the OCR cache
+            span["cache"] = "hit" if cache_key and not timings else "miss" if cache_key else "off"
+        for stage, ms in timings.items():
+            trace.add(f"ocr.{stage}", ms)
 
         print(f"OCR completed. Text length: {len(text_output)}")
         print("Extracted text:", text_output[:200] + "..." if len(text_output) > 200 else text_output)
     except Exception as e:
         print(f"Error during OCR: {e}")
         return {"status": "error", "message": f"OCR failed: {str(e)}"}
+    finally:
+        # Deletes a PDF's temporary file
+        upload.close()
 
     # --- NEW: extract structured fields ---------------------------
-    fields = extract_fields(text_output)
+    with trace.span("extract"):
+        fields = extract_fields(text_output)
     print("Parsed fields:", fields)
     # ---------------------------------------------------------------
 
+    if similar is not None and same_receipt(similar, fields):
+        print(f"Similar image with the same merchant, date and total as receipt {similar['receipt_id']}")
+        try:
+            # This file's bytes now point to the original too, so a resend skips OCR
+            remember_receipt(dedup_table, user_id, hashes[:1], similar["receipt_id"])
+        except Exception as e:
+            print(f"Error registering duplicate for dedup: {e}")
+        return reuse_duplicate(similar, key, user_id)
+
     try:
         print("Saving to DynamoDB...")
         receipt_id = str(uuid.uuid4())
@@ -277,29 +298,209 @@ def lambda_handler(event, context):
         # Final validation before saving
         if not user_id or user_id in ['unknown', 'None', '']:
             print(f"Refusing to save receipt with invalid user_id: {user_id}")
-            return {"status": "error", "message": "Invalid user identification"}
+            return {"status": "error", "message": "Invalid user identification", "retryable": False}
+        
+        # The text goes first, so a saved receipt never points at a missing sidecar
+        with trace.span("store_text") as span:
+            text_attributes = store_text(s3, receipt_id, text_output, words)
+            span["bytes"] = len(text_output.encode())
             
-        table.put_item(
-            Item={
-                "receipt_id": receipt_id,
-                "user_id": user_id,
-                "file_name": key,
-                "raw_text": text_output,
-                "upload_date": datetime.utcnow().isoformat(),
-                "merchant": fields["merchant"],
-                "purchase_date": fields["purchase_date"],
-                "purchase_time": fields["purchase_time"],
-                "total_amount": fields["total_amount"],
-                "category": fields["category"],
-            }
-        )
+        upload_date = datetime.utcnow().isoformat()
+        item = {
+            "receipt_id": receipt_id,
+            "user_id": user_id,
+            "file_name": key,
+            **text_attributes,
+            "upload_date": upload_date,
+            "merchant": fields["merchant"],
+            "purchase_time": fields["purchase_time"],
+            "total_amount": fields["total_amount"],
+            "category": fields["category"],
+            "file_hash": file_hash,
+            # amount_cents, ISO purchase_date and year_month, so readers never re-parse
+            **canonical_fields(fields["total_amount"], fields["purchase_date"], upload_date),
+        }
+        if cache_key:
+            item["ocr_cache_key"] = cache_key
+        with trace.span("put_item"):
+            table.put_item(Item=item)
         print("Successfully saved to DynamoDB")
     except Exception as e:
         print(f"Error saving to DynamoDB: {e}")
         return {"status": "error", "message": f"Database save failed: {str(e)}"}
 
+    if rollups_table is not None:
+        try:
+            # The receipt is already saved; a failed rollup update is repaired by
+            # `python rollups.py`, so don't fail the upload over it.
+            with trace.span("rollup"):
+                apply_rollup(rollups_table, item)
+        except Exception as e:
+            print(f"Error updating monthly rollup: {e}")
+
+    try:
+        with trace.span("data_version"):
+            bump_data_version(user_id)
+    except Exception as e:
+        print(f"Error bumping data version: {e}")
+
+    if hashes:
+        try:
+            with trace.span("dedup_register"):
+                remember_receipt(dedup_table, user_id, hashes, receipt_id)
+        except Exception as e:
+            print(f"Error registering receipt for dedup: {e}")
+
     return {
         "status": "success",
         "receipt_id": receipt_id,
-        "parsed": fields
+        "parsed": fields,
+        "dedup": "miss" if hashes else None,
+        "timings_ms": timings
+    }
+
+
+def bump_data_version(user_id: str):
+    """Tell the API that the user's receipts changed, so its cached responses and ETags go stale."""
+    data_version.bump_data_version(users_table, user_id)
+
+
+def reuse_duplicate(original: dict, key: str, user_id: str) -> dict:
+    """Result for an upload that duplicates an existing receipt; no new row."""
+    receipt_id = original["receipt_id"]
+    # A redelivered message finds its own receipt; that's not a user duplicate
+    if original.get("file_name") != key:
+        if DEDUP_MODE == "link":
+            link_duplicate(table, receipt_id, key)
+            bump_data_version(user_id)
+        print(f"Duplicate upload {key} {'linked to' if DEDUP_MODE == 'link' else 'skipped for'} receipt {receipt_id}")
+    return {
+        "status": "duplicate",
+        "receipt_id": receipt_id,
+        "parsed": {name: original.get(name, "") for name in ["merchant", "purchase_date", "purchase_time", "total_amount", "category"]},
+        "dedup": "hit"
+    }
+
+
+def iter_s3_objects(event: dict, malformed: list | None = None):
+    """Yield (message_id, bucket, key) for every object in an S3 notification or an SQS batch of them.
+
+    message_id is the SQS messageId, or None for records delivered straight from S3.
+    A record that can't be parsed is skipped, and an error result for it is
+    appended to ``malformed``, so one bad message doesn't fail the whole batch.
+    """
+    for record in event.get("Records", []):
+        message_id = record.get("messageId") if record.get("eventSource") == "aws:sqs" else None
+        try:
+            if message_id is not None:
+                # s3:TestEvent messages have no Records and are simply acknowledged
+                s3_records = json.loads(record["body"]).get("Records", [])
+            else:
+                s3_records = [record]
+            objects = [
+                (message_id, s3_record["s3"]["bucket"]["name"], unquote_plus(s3_record["s3"]["object"]["key"]))
+                for s3_record in s3_records
+            ]
+        except Exception as e:
+            print(f"Malformed record {message_id}: {e!r}")
+            if malformed is not None:
+                malformed.append({"message_id": message_id, "key": None, "status": "error",
+                                  "message": f"Malformed message: {e!r}"})
+            continue
+        yield from objects
+
+
+def _process_object(job: tuple) -> tuple[dict, object]:
+    message_id, bucket, key = job
+    trace = new_trace()
+    try:
+        result = process_receipt(bucket, key, trace)
+    except Exception as e:
+        print(f"Unexpected error processing {key}: {e}")
+        result = {"status": "error", "message": str(e)}
+    result = {"message_id": message_id, "key": key, **result}
+    if trace.enabled:
+        result["trace"] = trace.result()
+    return result, trace
+
+
+def warmup() -> dict:
+    """Import the OCR path, load the traineddata and OCR a tiny image; returns the time of each step in ms."""
+    timings = {}
+    started = time.perf_counter()
+    from PIL import Image, ImageDraw
+    # Loaded for their import cost only; process_receipt imports them lazily
+    for module in ("preprocess", "roi"):
+        importlib.import_module(module)
+    timings["imports"] = round((time.perf_counter() - started) * 1000, 1)
+
+    started = time.perf_counter()
+    get_ocr_backend()
+    timings["engine"] = round((time.perf_counter() - started) * 1000, 1)
+
+    started = time.perf_counter()
+    img = Image.new("L", (320, 64), 255)
+    ImageDraw.Draw(img).text((10, 20), "SUMME EUR 1,00", fill=0)
+    ocr_image(img)
+    timings["ocr"] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"Warmup done (ms): {timings}")
+    return timings
+
+
+def lambda_handler(event, context):
+    print("Event:", json.dumps(event, indent=2))
+    if event.get("mode") == "warmup":
+        # Keep-warm pings and the cold start benchmark; cheap once the container is initialized
+        return {"status": "success", "warmup": warmup()}
+    if event.get("mode") == "reparse":
+        # Bulk re-extraction after extract_fields changes; no S3 downloads, no OCR
+        counts = reparse_and_refresh(table, extract_fields, load_text=load_receipt_text, rollups_table=rollups_table,
+                                     users_table=users_table, segments=int(event.get("segments", 4)),
+                                     dry_run=bool(event.get("dry_run")))
+        return {"status": "success", **counts}
+
+    malformed = []
+    jobs = list(iter_s3_objects(event, malformed))
+    if not jobs and not malformed:
+        return {"status": "success", "results": [], "dedup": {"hits": 0, "misses": 0, "hit_ratio": 0}, "batchItemFailures": []}
+
+    # Tesseract releases the GIL (or runs in a subprocess), so threads give real parallelism here
+    processed = []
+    if jobs:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(jobs))) as executor:
+            processed = list(executor.map(_process_object, jobs))
+    # Unparseable messages are reported back like failed receipts
+    results = malformed + [result for result, _ in processed]
+    # One structured line per invocation with the stage latencies of every receipt
+    emit([trace for _, trace in processed])
+
+    # SQS partial batch response: only messages with a retryable failure go back on the queue
+    failed_messages = []
+    for result in results:
+        message_id = result["message_id"]
+        if result["status"] == "error" and result.get("retryable", True) and message_id and message_id not in failed_messages:
+            failed_messages.append(message_id)
+
+    failed = sum(result["status"] == "error" for result in results)
+    hits = sum(result.get("dedup") == "hit" for result in results)
+    misses = sum(result.get("dedup") == "miss" for result in results)
+    print(f"Processed {len(results)} receipts, {failed} failed, dedup {hits} hits / {misses} misses")
+    return {
+        "status": "success" if not failed else "partial" if failed < len(results) else "error",
+        "results": results,
+        "dedup": {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0,
+        },
+        "batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed_messages],
     }
+
+
+# Module code runs in Lambda's init phase, before the first request is timed
+if OCR_WARMUP:
+    try:
+        warmup()
+    except Exception as e:
+        # A broken OCR setup fails the first OCR instead of every invocation (reparse doesn't need it)
+        print(f"Warmup failed: {e}")
@@ -0,0 +1,93 @@
+"""Cold start benchmark of the OCR container in the Lambda Runtime Interface Emulator.
+
+    docker build -t receipt-ocr lambda/
+    python lambda/benchmarks/bench_cold_start.py --image receipt-ocr [--image receipt-ocr:old] [--runs 5]
+
+The AWS base image ships with the RIE. Each run starts a fresh container,
+sends it a ``{"mode": "warmup"}`` invocation and then a second one. The run
+is done once with the init-phase warmup (OCR_WARMUP=true) and once without.
+The first invocation of a fresh container includes the init phase, so it
+measures the cold start. The handler's own warmup timings show how much
+OCR setup was still left for the request. The second invocation is the warm
+baseline. The RIE's REPORT lines (Init Duration, Duration) are printed when
+present. No AWS access is needed: the warmup event touches neither S3 nor
+DynamoDB.
+
+Give --image several times to compare builds, for example the image before
+and after a Dockerfile change. The size of each image is printed first.
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import time
+import urllib.error
+import urllib.request
+
+INVOKE_PATH = "/2015-03-31/functions/function/invocations"
+REPORT_RE = re.compile(r"(Init Duration|Duration): ([\d.]+) ms")
+
+
+def invoke(port: int, event: dict, timeout: float = 120) -> tuple[float, dict]:
+    """(seconds until the response, response) for one invocation, retrying until the RIE is listening."""
+    started = time.perf_counter()
+    request = urllib.request.Request(f"http://localhost:{port}{INVOKE_PATH}", data=json.dumps(event).encode())
+    while True:
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return time.perf_counter() - started, json.load(response)
+        except (urllib.error.URLError, ConnectionError):
+            if time.perf_counter() - started > timeout:
+                raise
+            time.sleep(0.01)
+
+
+def cold_start(image: str, port: int, warmup: bool) -> dict:
+    container = subprocess.run(
+        ["docker", "run", "-d", "--rm", "-p", f"{port}:8080",
+         "-e", "AWS_REGION=eu-central-1", "-e", f"OCR_WARMUP={'true' if warmup else 'false'}", image],
+        capture_output=True, text=True, check=True).stdout.strip()
+    try:
+        first_s, first = invoke(port, {"mode": "warmup"})
+        second_s, _ = invoke(port, {"mode": "warmup"})
+        logs = subprocess.run(["docker", "logs", container], capture_output=True, text=True).stdout
+    finally:
+        subprocess.run(["docker", "stop", container], capture_output=True)
+    return {
+        "first_ms": first_s * 1000,
+        "second_ms": second_s * 1000,
+        "request_warmup": first.get("warmup", {}),
+        "report": REPORT_RE.findall(logs),
+    }
+
+
+def image_size_mb(image: str) -> float:
+    size = subprocess.run(["docker", "image", "inspect", "--format", "{{.Size}}", image],
+                          capture_output=True, text=True, check=True).stdout
+    return int(size) / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", action="append", help="image to run, can be given several times (default receipt-ocr)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+    images = args.image or ["receipt-ocr"]
+
+    for image in images:
+        print(f"{image}: {image_size_mb(image):.0f} MB")
+    for image in images:
+        for warmup in (False, True):
+            runs = [cold_start(image, args.port, warmup) for _ in range(args.runs)]
+            print(f"{image} OCR_WARMUP={str(warmup).lower()}")
+            for run in runs:
+                print(f"  first {run['first_ms']:7.0f} ms, second {run['second_ms']:5.0f} ms, "
+                      f"OCR setup left for the request {run['request_warmup']}, RIE {run['report']}")
+            print(f"  median first invocation {statistics.median(run['first_ms'] for run in runs):.0f} ms, "
+                  f"median engine load in the request {statistics.median(run['request_warmup'].get('engine', 0) for run in runs):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Benchmark extract_fields on a corpus of sample receipt texts.
+
+    python lambda/benchmarks/bench_extraction.py [corpus.txt ...]
+
+A corpus file holds OCR texts separated by lines of ``=====`` (the default is
+sample_receipts.txt next to this script). Prints the fields and best-of-N
+extraction time of every receipt, then the mean per-receipt time.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from extraction import extract_fields
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "sample_receipts.txt")
+
+
+def load_corpus(paths):
+    texts = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            texts.extend(text for text in f.read().split("=====\n") if text.strip())
+    return texts
+
+
+def best_time(fn, repeat, number):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+if __name__ == "__main__":
+    texts = load_corpus(sys.argv[1:] or [DEFAULT_CORPUS])
+    times = []
+    for text in texts:
+        fields = extract_fields(text)
+        elapsed = best_time(lambda: extract_fields(text), repeat=5, number=200)
+        times.append(elapsed)
+        print(f"{elapsed * 1e6:8.1f} us  {fields['merchant'][:24]:<24} {fields['purchase_date']:<10} "
+              f"{fields['purchase_time']:<8} {fields['total_amount']:>7}  {fields['category']}")
+    print(f"{len(texts)} receipts, mean {sum(times) / len(times) * 1e6:.1f} us per receipt")
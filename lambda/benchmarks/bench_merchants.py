@@ -0,0 +1,71 @@
+"""Benchmark the merchant matcher against a per-store substring loop.
+
+    python lambda/benchmarks/bench_merchants.py [sizes ...]
+
+Grows the merchant dictionary with synthetic chains to each size (default
+50, 500 and 5000), then times, per receipt of sample_receipts.txt, the trie
+matcher against the substring loop the extractor used to run (every line
+against every store name). Also prints how long compiling the matcher takes,
+which is paid once per cold start.
+"""
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from merchants import DEFAULT_MERCHANTS_FILE, MerchantMatcher, MAX_LINE_LENGTH
+from bench_extraction import DEFAULT_CORPUS, load_corpus, best_time
+
+CATEGORIES = ["grocery", "restaurant", "drogerie", "gas_station", "clothing", "electronics", "other"]
+SYLLABLES = ["KA", "RO", "MI", "TEN", "BUR", "LO", "SAN", "VEL", "DOR", "NA", "XI", "QUA", "ZEN", "PA", "LUX"]
+
+
+def grow_dictionary(entries, size, seed=7):
+    rng = random.Random(seed)
+    entries = list(entries)
+    names = {entry["name"] for entry in entries}
+    while len(entries) < size:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if rng.random() < 0.3:
+            name += " " + rng.choice(["MARKT", "SHOP", "STORE", "CENTER"])
+        if name not in names:
+            names.add(name)
+            entries.append({"name": name, "aliases": [], "category": rng.choice(CATEGORIES)})
+    return entries[:size]
+
+
+def substring_loop(lines, stores):
+    """The former known_stores scan: every short line against every store name."""
+    for line in lines:
+        if len(line) >= MAX_LINE_LENGTH:
+            continue
+        line_upper = line.upper()
+        cleaned_line = re.sub(r"[^A-Z0-9\s]", " ", line_upper)
+        for store in stores:
+            if store in line_upper or store in cleaned_line:
+                return store
+    return None
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [50, 500, 5000]
+    with open(DEFAULT_MERCHANTS_FILE, encoding="utf-8") as f:
+        known = json.load(f)
+    receipts = [[l.strip() for l in text.splitlines() if l.strip()] for text in load_corpus([DEFAULT_CORPUS])]
+
+    for size in sizes:
+        entries = grow_dictionary(known, size)
+        started = time.perf_counter()
+        matcher = MerchantMatcher(entries)
+        build = time.perf_counter() - started
+        stores = [entry["name"] for entry in entries]
+
+        loop = best_time(lambda: [substring_loop(lines, stores) for lines in receipts], repeat=5, number=20)
+        trie = best_time(lambda: [matcher.find(lines) for lines in receipts], repeat=5, number=20)
+        print(f"{size:>6} merchants  loop {loop / len(receipts) * 1e6:9.1f} us  "
+              f"trie {trie / len(receipts) * 1e6:7.1f} us per receipt  "
+              f"speedup {loop / trie:6.1f}x  build {build * 1000:6.1f} ms")
@@ -0,0 +1,69 @@
+"""Warm-invocation OCR latency of the pytesseract and in-process tesserocr backends.
+
+    python lambda/benchmarks/bench_ocr_backend.py receipts_dir/ [--invocations 5] [--backends pytesseract tesserocr]
+
+Every image in the directory is preprocessed once, as the Lambda would. Then,
+for each backend, this creates the backend (the container's init phase) and
+runs all the images through it for a number of invocations. The first
+invocation is reported on its own, because it includes any lazy
+initialization. The others are the warm invocations, reported as median
+per-image latency and total time per invocation. Each backend uses the
+production language and config from app.py.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ocr_engine import OCR_LANG, TESSERACT_CONFIG, create_backend
+from preprocess import preprocess
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp")
+
+
+def run_invocation(backend, images):
+    latencies = []
+    for img in images:
+        started = time.perf_counter()
+        backend.image_to_string(img)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="directory of receipt images")
+    parser.add_argument("--invocations", type=int, default=5, help="invocations per backend, the first one cold")
+    parser.add_argument("--backends", nargs="+", default=["pytesseract", "tesserocr"])
+    args = parser.parse_args()
+
+    paths = sorted(os.path.join(args.directory, name) for name in os.listdir(args.directory)
+                   if name.lower().endswith(IMAGE_EXTENSIONS))
+    images = [preprocess(Image.open(path))[0] for path in paths]
+    print(f"{len(images)} images preprocessed")
+
+    for name in args.backends:
+        started = time.perf_counter()
+        try:
+            backend = create_backend(OCR_LANG, TESSERACT_CONFIG, name)
+            init_ms = (time.perf_counter() - started) * 1000
+            first = run_invocation(backend, images)
+        except Exception as e:
+            print(f"{name}: unavailable ({e})")
+            continue
+        warm = [run_invocation(backend, images) for _ in range(args.invocations - 1)]
+        print(f"{name}: init {init_ms:.0f} ms, first invocation {sum(first):.0f} ms")
+        if warm:
+            per_image = [ms for latencies in warm for ms in latencies]
+            per_invocation = [sum(latencies) for latencies in warm]
+            print(f"  warm: median {statistics.median(per_image):.0f} ms per image, "
+                  f"{statistics.median(per_invocation):.0f} ms per invocation of {len(images)} images")
+
+
+if __name__ == "__main__":
+    main()
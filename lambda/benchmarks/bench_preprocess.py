@@ -0,0 +1,110 @@
+"""Compare the adaptive preprocessing with the previous fixed pipeline.
+
+    python lambda/benchmarks/bench_preprocess.py receipts_dir/ [--no-ocr] [--repeat 3]
+
+For every image in the directory, runs the previous pipeline (2000 px
+thumbnail, then blur, CLAHE, Otsu and close on the whole image) and
+preprocess.preprocess, and prints the best-of-N time of each, the new
+pipeline's per-stage timings and decisions, and the output size. Unless
+--no-ocr is given, both outputs are also OCR'd with the production
+Tesseract settings and backend, and the Tesseract time and the similarity of the two texts
+(difflib ratio) are printed too.
+
+The previous pipeline needs OpenCV (``pip install opencv-python-headless``),
+which the Lambda image no longer ships by default. Run this locally, or build
+the image with ``--build-arg OPENCV=true``.
+"""
+import argparse
+import difflib
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ocr_engine import OCR_LANG, TESSERACT_CONFIG, create_backend
+from preprocess import preprocess
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp")
+# The previous pipeline ran without --dpi
+LEGACY_TESSERACT_CONFIG = TESSERACT_CONFIG.replace(" --dpi 300", "")
+
+
+def legacy_preprocess(img):
+    """The pipeline before adaptive preprocessing, as it was in app.py."""
+    img = img.copy()
+    if img.width > 2000 or img.height > 2000:
+        img.thumbnail((2000, 2000), Image.Resampling.LANCZOS)
+    img_array = np.array(img)
+    if len(img_array.shape) == 3:
+        gray = cv2.cvtColor(cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR), cv2.COLOR_BGR2GRAY)
+    else:
+        gray = img_array
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    enhanced = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(blurred)
+    _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    cleaned = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, np.ones((2, 2), np.uint8))
+    return Image.fromarray(cleaned)
+
+
+def best_of(fn, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def ocr(backend, img):
+    started = time.perf_counter()
+    text = backend.image_to_string(img)
+    return (time.perf_counter() - started) * 1000, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="directory of receipt images")
+    parser.add_argument("--source", choices=["photo", "pdf"], default="photo")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-ocr", action="store_true", help="only time preprocessing")
+    args = parser.parse_args()
+
+    paths = sorted(os.path.join(args.directory, name) for name in os.listdir(args.directory)
+                   if name.lower().endswith(IMAGE_EXTENSIONS))
+    if not args.no_ocr:
+        legacy_backend = create_backend(OCR_LANG, LEGACY_TESSERACT_CONFIG)
+        adaptive_backend = create_backend(OCR_LANG, TESSERACT_CONFIG)
+    totals = {"legacy": 0.0, "adaptive": 0.0, "legacy_ocr": 0.0, "adaptive_ocr": 0.0}
+    for path in paths:
+        img = Image.open(path)
+        img.load()
+        legacy_ms, legacy_img = best_of(lambda: legacy_preprocess(img), args.repeat)
+        adaptive_ms, (adaptive_img, timings, decisions) = best_of(lambda: preprocess(img, args.source), args.repeat)
+        totals["legacy"] += legacy_ms
+        totals["adaptive"] += adaptive_ms
+        print(f"{os.path.basename(path)} {img.width}x{img.height}")
+        print(f"  legacy   {legacy_ms:8.1f} ms  -> {legacy_img.width}x{legacy_img.height}")
+        print(f"  adaptive {adaptive_ms:8.1f} ms  -> {adaptive_img.width}x{adaptive_img.height}  {timings}  {decisions}")
+        if not args.no_ocr:
+            legacy_ocr_ms, legacy_text = ocr(legacy_backend, legacy_img)
+            adaptive_ocr_ms, adaptive_text = ocr(adaptive_backend, adaptive_img)
+            totals["legacy_ocr"] += legacy_ocr_ms
+            totals["adaptive_ocr"] += adaptive_ocr_ms
+            similarity = difflib.SequenceMatcher(None, legacy_text, adaptive_text).ratio()
+            print(f"  tesseract legacy {legacy_ocr_ms:.0f} ms, adaptive {adaptive_ocr_ms:.0f} ms, "
+                  f"text similarity {similarity:.3f}")
+
+    if paths:
+        print(f"{len(paths)} images, preprocessing legacy {totals['legacy']:.0f} ms, adaptive {totals['adaptive']:.0f} ms")
+        if not args.no_ocr:
+            print(f"end to end legacy {totals['legacy'] + totals['legacy_ocr']:.0f} ms, "
+                  f"adaptive {totals['adaptive'] + totals['adaptive_ocr']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
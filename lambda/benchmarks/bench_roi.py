@@ -0,0 +1,70 @@
+"""Compare region-of-interest OCR with full-text OCR on receipt photos.
+
+    python lambda/benchmarks/bench_roi.py receipts_dir/
+
+Every image in the directory is preprocessed once. Then it is OCR'd whole,
+as with OCR_FULL_TEXT, and with roi.ocr_regions, using the production
+backend and config. For each mode this prints the OCR time, the regions
+used, and whether extract_fields gives the same merchant, date, time and
+total. Long grocery receipts, where line items dominate, gain the most.
+"""
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from extraction import extract_fields
+from ocr_engine import OCR_LANG, TESSERACT_CONFIG, create_backend
+from preprocess import StageTimer, preprocess
+from roi import ocr_regions
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp")
+FIELDS = ("merchant", "purchase_date", "purchase_time", "total_amount")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="directory of receipt photos")
+    args = parser.parse_args()
+
+    backend = create_backend(OCR_LANG, TESSERACT_CONFIG)
+    recognize = lambda img: (backend.image_to_string(img), None)
+    is_complete = lambda text: all(extract_fields(text)[field] for field in ("merchant", "purchase_date", "total_amount"))
+
+    paths = sorted(os.path.join(args.directory, name) for name in os.listdir(args.directory)
+                   if name.lower().endswith(IMAGE_EXTENSIONS))
+    full_total = roi_total = 0.0
+    same = 0
+    for path in paths:
+        img, _, _ = preprocess(Image.open(path))
+        started = time.perf_counter()
+        full_text, _ = recognize(img)
+        full_ms = (time.perf_counter() - started) * 1000
+
+        timer = StageTimer()
+        started = time.perf_counter()
+        roi_text, _, decisions = ocr_regions(img, recognize, is_complete, timer)
+        roi_ms = (time.perf_counter() - started) * 1000
+
+        full_fields, roi_fields = extract_fields(full_text), extract_fields(roi_text)
+        matches = all(full_fields[field] == roi_fields[field] for field in FIELDS)
+        full_total += full_ms
+        roi_total += roi_ms
+        same += matches
+        print(f"{os.path.basename(path)}: full {full_ms:.0f} ms, roi {roi_ms:.0f} ms ({full_ms / roi_ms:.1f}x) "
+              f"{decisions} fields {'same' if matches else 'DIFFER'}")
+        if not matches:
+            print(f"  full {[full_fields[field] for field in FIELDS]}")
+            print(f"  roi  {[roi_fields[field] for field in FIELDS]}")
+
+    if paths:
+        print(f"{len(paths)} images: full {full_total:.0f} ms, roi {roi_total:.0f} ms "
+              f"({full_total / roi_total:.1f}x), same fields on {same}")
+
+
+if __name__ == "__main__":
+    main()
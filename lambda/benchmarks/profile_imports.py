@@ -0,0 +1,56 @@
+"""Import-time profile of the OCR lambda's cold start.
+
+    python lambda/benchmarks/profile_imports.py [--module app] [--warmup] [--top 20]
+
+Imports the module in a fresh interpreter with ``python -X importtime`` and
+prints the cumulative import time of each package the module imports directly
+(nested imports count towards their importer). Then it prints the time the
+module's own code took, such as creating the boto3 clients, and the total.
+OCR_WARMUP is off unless --warmup is given. Set AWS_REGION if boto3 has no
+region configured.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def import_times(module: str, warmup: bool) -> list[tuple[int, int, str]]:
+    """(cumulative us, nesting depth, package) for every import, in importtime's order."""
+    env = {**os.environ, "OCR_WARMUP": "true" if warmup else "false"}
+    env.setdefault("AWS_DEFAULT_REGION", env.get("AWS_REGION", "eu-central-1"))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=LAMBDA_DIR, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, package = line[len("import time:"):].split("|", 2)
+        name = package[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative), depth, name.strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--warmup", action="store_true", help="include the init-phase warmup")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = import_times(args.module, args.warmup)
+    total = next(cumulative for cumulative, depth, name in rows if depth == 0 and name == args.module)
+    # The packages the module imports directly are one level below it
+    direct = sorted((row for row in rows if row[1] == 1), reverse=True)
+    for cumulative, _, name in direct[:args.top]:
+        print(f"{cumulative / 1000:9.1f} ms  {cumulative / total:6.1%}  {name}")
+    own = total - sum(cumulative for cumulative, _, _ in direct)
+    print(f"{own / 1000:9.1f} ms  {own / total:6.1%}  {args.module} module body (boto3 clients, warmup)")
+    print(f"{total / 1000:9.1f} ms  total for import {args.module}")
+
+
+if __name__ == "__main__":
+    main()
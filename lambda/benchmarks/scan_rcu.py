@@ -0,0 +1,104 @@
+"""Read capacity of a full scan of the Receipts table, and how much of it is OCR text.
+
+    python lambda/benchmarks/scan_rcu.py [--table Receipts] [--page-size 0]
+
+Scans the table with ReturnConsumedCapacity=TOTAL and prints the RCUs
+DynamoDB reports. Alongside, it estimates the same figure from DynamoDB's
+item size rules: each page is billed on the summed item sizes, rounded up to
+4 KB, at half a unit for eventually consistent reads. The estimate is also
+worked out with the text attributes (raw_text, raw_text_gz) left out. That
+shows what moving the text out of the items saves before migrate_raw_text.py
+runs. Run again afterwards to measure the real after. The estimate also works
+against DynamoDB Local or moto, which don't report realistic capacity.
+"""
+import argparse
+import math
+import os
+import sys
+from decimal import Decimal
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from text_store import TEXT_ATTRIBUTES
+
+READ_UNIT_BYTES = 4096
+
+
+def value_size(value) -> int:
+    """Bytes DynamoDB counts for one attribute value."""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = len(str(abs(value)).replace(".", "").lstrip("0")) or 1
+        return math.ceil(digits / 2) + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if hasattr(value, "value"):  # boto3 Binary
+        return len(value.value)
+    if isinstance(value, (set, frozenset)):
+        return sum(value_size(element) for element in value)
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(1 + value_size(element) for element in value)
+    if isinstance(value, dict):
+        return 3 + sum(1 + len(name.encode("utf-8")) + value_size(element) for name, element in value.items())
+    raise TypeError(f"Unsupported attribute type {type(value)}")
+
+
+def item_size(item: dict, skip=()) -> int:
+    return sum(len(name.encode("utf-8")) + value_size(value) for name, value in item.items() if name not in skip)
+
+
+def page_rcu(size: int) -> float:
+    return math.ceil(size / READ_UNIT_BYTES) * 0.5 if size else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", default="Receipts")
+    parser.add_argument("--page-size", type=int, default=0, help="items per scan request (0 = DynamoDB's 1 MB pages)")
+    args = parser.parse_args()
+
+    table = boto3.resource("dynamodb", endpoint_url=os.environ.get("DYNAMODB_ENDPOINT_URL")).Table(args.table)
+    scan_kwargs = {"ReturnConsumedCapacity": "TOTAL"}
+    if args.page_size:
+        scan_kwargs["Limit"] = args.page_size
+
+    items = pages = 0
+    consumed = estimated = estimated_without_text = 0.0
+    total_bytes = text_bytes = 0
+    layouts = {}
+    while True:
+        response = table.scan(**scan_kwargs)
+        pages += 1
+        consumed += response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+        page_bytes = page_bytes_without_text = 0
+        for item in response["Items"]:
+            size = item_size(item)
+            without_text = item_size(item, skip=TEXT_ATTRIBUTES)
+            page_bytes += size
+            page_bytes_without_text += without_text
+            text_bytes += size - without_text
+            layout = next((name for name in TEXT_ATTRIBUTES if name in item), "none")
+            layouts[layout] = layouts.get(layout, 0) + 1
+        items += len(response["Items"])
+        total_bytes += page_bytes
+        estimated += page_rcu(page_bytes)
+        estimated_without_text += page_rcu(page_bytes_without_text)
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    print(f"{items} items in {pages} pages, text layouts {layouts}")
+    print(f"average item {total_bytes / max(items, 1):.0f} B, of which text {text_bytes / max(items, 1):.0f} B "
+          f"({text_bytes / max(total_bytes, 1):.0%})")
+    print(f"consumed (reported by DynamoDB)  {consumed:10.1f} RCU")
+    print(f"estimated from item sizes        {estimated:10.1f} RCU")
+    print(f"estimated without the text       {estimated_without_text:10.1f} RCU")
+
+
+if __name__ == "__main__":
+    main()
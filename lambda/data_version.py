@@ -0,0 +1,23 @@
+"""The per-user data_version the API's response cache is keyed by.
+
+Anything that changes a user's receipts bumps ``data_version`` on their Users
+item, so the API stops serving the analytics it cached for them and its old
+ETags stop matching (see api/response_cache.py).
+"""
+
+
+def bump_data_version(users_table, user_id: str):
+    """Add one to the user's data_version; creates the Users item if there is none."""
+    if users_table is not None:
+        users_table.update_item(
+            Key={"user_id": user_id},
+            UpdateExpression="ADD data_version :one",
+            ExpressionAttributeValues={":one": 1},
+        )
+
+
+def bump_data_versions(users_table, user_ids):
+    """Bump data_version once for each distinct user; empty ids are skipped."""
+    for user_id in set(user_ids):
+        if user_id:
+            bump_data_version(users_table, user_id)
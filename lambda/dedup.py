@@ -0,0 +1,142 @@
+"""Per-user duplicate detection for uploaded receipts.
+
+Every saved receipt is registered in the dedup table under its user and two
+hashes: the SHA-256 of the uploaded bytes (``sha256#<hex>``) and, for images,
+a 64-bit difference hash of the picture (``dhash#<hex>``).
+
+Only an exact SHA-256 match is trusted on its own. The OCR handler then reuses
+the original receipt's parsed fields and never runs Tesseract. It either links
+the upload to the original (``DEDUP_MODE=link``, the default, appends the file
+to ``duplicate_files``) or drops it (``DEDUP_MODE=skip``).
+
+The dHash barely changes when a photo is re-encoded or resized, but two
+different receipts photographed the same way are just as close. A dHash match
+(``find_similar``) is therefore only a hint. The upload is still OCR'd, and it
+is treated as a duplicate only if ``same_receipt`` finds the same merchant,
+date and total as the candidate. Otherwise it is saved as a receipt of its own.
+
+A confirmed duplicate never gets a second Receipts row, so analytics totals
+are not inflated.
+"""
+import os
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from normalize import parse_amount, parse_purchase_date
+
+DHASH_PREFIX = "dhash#"
+# Images whose dHashes differ in at most this many of the 64 bits are compared by their fields
+MAX_DHASH_DISTANCE = int(os.environ.get("DEDUP_MAX_DHASH_DISTANCE", "6"))
+
+# Attributes of the original receipt that a duplicate reuses
+REUSED_ATTRIBUTES = ["receipt_id", "file_name", "merchant", "purchase_date", "purchase_time", "total_amount", "category"]
+
+
+def perceptual_hash(img) -> str:
+    """64-bit dHash: brightness gradients of a 9x8 grayscale thumbnail, as 16 hex digits."""
+    small = img.convert("L").resize((9, 8))
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+def receipt_hashes(file_hash: str, img=None) -> list[str]:
+    """Dedup keys for an upload (file_hash is the SHA-256 from ingest.download), exact match first."""
+    hashes = [f"sha256#{file_hash}"]
+    if img is not None:
+        hashes.append(f"{DHASH_PREFIX}{perceptual_hash(img)}")
+    return hashes
+
+
+def _hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def _similar_image_entry(dedup_table, user_id: str, image_hash: str) -> dict | None:
+    """Closest dHash entry of the user within MAX_DHASH_DISTANCE bits, if any."""
+    best, best_distance = None, MAX_DHASH_DISTANCE + 1
+    query_kwargs = {
+        "KeyConditionExpression": Key("user_id").eq(user_id) & Key("content_hash").begins_with(DHASH_PREFIX),
+        "ProjectionExpression": "content_hash, receipt_id",
+    }
+    while True:
+        response = dedup_table.query(**query_kwargs)
+        for entry in response["Items"]:
+            distance = _hamming(entry["content_hash"][len(DHASH_PREFIX):], image_hash)
+            if distance < best_distance:
+                best, best_distance = entry, distance
+        if "LastEvaluatedKey" not in response:
+            return best
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def _original_receipt(receipts_table, entry: dict | None) -> dict | None:
+    """The receipt a dedup entry points to, or None if there is no entry or the receipt was deleted."""
+    if not entry:
+        return None
+    return receipts_table.get_item(
+        Key={"receipt_id": entry["receipt_id"]},
+        ProjectionExpression=", ".join(REUSED_ATTRIBUTES),
+    ).get("Item")
+
+
+def find_duplicate(dedup_table, receipts_table, user_id: str, hashes: list[str]) -> dict | None:
+    """Return the user's existing receipt with the same file bytes, or None."""
+    exact = next(content_key for content_key in hashes if not content_key.startswith(DHASH_PREFIX))
+    entry = dedup_table.get_item(Key={"user_id": user_id, "content_hash": exact}).get("Item")
+    original = _original_receipt(receipts_table, entry)
+    if original:
+        print(f"Duplicate of receipt {original['receipt_id']} (sha256 match)")
+    return original
+
+
+def find_similar(dedup_table, receipts_table, user_id: str, hashes: list[str]) -> dict | None:
+    """Return the user's receipt whose image is closest to this one's within MAX_DHASH_DISTANCE, or None.
+
+    Only a candidate: confirm it with same_receipt after OCR.
+    """
+    image_hash = next((content_key for content_key in hashes if content_key.startswith(DHASH_PREFIX)), None)
+    if image_hash is None:
+        return None
+    entry = _similar_image_entry(dedup_table, user_id, image_hash[len(DHASH_PREFIX):])
+    return _original_receipt(receipts_table, entry)
+
+
+def same_receipt(original: dict, fields: dict) -> bool:
+    """True if freshly extracted fields have the original's merchant, date and total, all of them present."""
+    merchant = (fields.get("merchant") or "").strip().lower()
+    amount = parse_amount(fields.get("total_amount"))
+    purchase_date = parse_purchase_date(fields.get("purchase_date"))
+    return (
+        bool(merchant) and amount is not None and purchase_date is not None
+        and merchant == (original.get("merchant") or "").strip().lower()
+        and amount == parse_amount(original.get("total_amount"))
+        and purchase_date == parse_purchase_date(original.get("purchase_date"))
+    )
+
+
+def link_duplicate(receipts_table, receipt_id: str, file_name: str) -> bool:
+    """Record an uploaded duplicate file on the original receipt."""
+    try:
+        receipts_table.update_item(
+            Key={"receipt_id": receipt_id},
+            UpdateExpression="SET duplicate_files = list_append(if_not_exists(duplicate_files, :empty), :file)",
+            ConditionExpression="attribute_exists(receipt_id)",
+            ExpressionAttributeValues={":empty": [], ":file": [file_name]},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+    return True
+
+
+def remember_receipt(dedup_table, user_id: str, hashes: list[str], receipt_id: str):
+    """Register a freshly saved receipt under all of its hashes."""
+    with dedup_table.batch_writer() as batch:
+        for content_key in hashes:
+            batch.put_item(Item={"user_id": user_id, "content_hash": content_key, "receipt_id": receipt_id})
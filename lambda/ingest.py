@@ -0,0 +1,150 @@
+"""Streaming ingest of uploaded receipts from S3.
+
+``download`` never holds the whole upload as one ``bytes`` object:
+
+* Objects whose ``ContentLength`` is over MAX_UPLOAD_BYTES are rejected
+  before any of the body is read. The limit is also enforced while streaming.
+* The format comes from the magic bytes of the first chunk, not from the
+  key's suffix, so a mis-named upload is still handled, and a file that is
+  neither a PDF nor an image is rejected before it reaches a decoder.
+* The body is streamed in CHUNK_SIZE chunks into a temporary file while the
+  SHA-256 is computed along the way. Images go to a SpooledTemporaryFile,
+  which stays in memory up to SPOOL_MAX_MEMORY and then moves to /tmp.
+  PDFs go straight to a named file in /tmp, since poppler needs a path.
+
+``open_image`` decodes JPEGs with PIL's ``draft()``, so the decoder itself
+downsamples oversized photos (by 1/2, 1/4 or 1/8) and decodes straight to
+grayscale. A longer side stays at least DRAFT_MIN_SIDE px.
+
+``UploadRejected`` marks uploads that retrying can't fix.
+"""
+import hashlib
+import os
+import tempfile
+from itertools import chain
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", "25")) * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+SPOOL_MAX_MEMORY = 4 * 1024 * 1024
+SNIFF_BYTES = 16
+DRAFT_MIN_SIDE = int(os.environ.get("JPEG_DRAFT_MIN_SIDE", "3000"))
+MAX_IMAGE_PIXELS = 60_000_000
+
+MAGIC_NUMBERS = [
+    (b"%PDF-", "pdf"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+]
+
+
+class UploadRejected(Exception):
+    """An upload that can't be processed no matter how often it is retried."""
+
+
+def sniff_format(prefix: bytes) -> str | None:
+    """File format from the first bytes of a file, or None if it isn't a PDF or a supported image."""
+    # A PDF may have some junk before its header
+    if b"%PDF-" in prefix[:1024]:
+        return "pdf"
+    for magic, file_format in MAGIC_NUMBERS:
+        if prefix.startswith(magic):
+            return file_format
+    if prefix[:4] == b"RIFF" and prefix[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+class Upload:
+    """A downloaded upload: its temporary file, sniffed format, size and SHA-256."""
+
+    def __init__(self, file, file_format: str, size: int, sha256: str):
+        self.file = file
+        self.format = file_format
+        self.size = size
+        self.sha256 = sha256
+
+    @property
+    def path(self) -> str:
+        """Path of the file in /tmp (PDFs only)."""
+        return self.file.name
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def download(s3, bucket: str, key: str, max_bytes: int = MAX_UPLOAD_BYTES) -> Upload:
+    """Stream an S3 object into a temporary file, rejecting oversized and unknown files early."""
+    obj = s3.get_object(Bucket=bucket, Key=key)
+    body = obj["Body"]
+    if obj["ContentLength"] > max_bytes:
+        body.close()
+        raise UploadRejected(f"File is {obj['ContentLength']} bytes, the limit is {max_bytes}")
+
+    chunks = body.iter_chunks(CHUNK_SIZE)
+    prefix = b""
+    for chunk in chunks:
+        prefix += chunk
+        if len(prefix) >= SNIFF_BYTES:
+            break
+    file_format = sniff_format(prefix)
+    if file_format is None:
+        body.close()
+        raise UploadRejected(f"Unsupported file type (starts with {prefix[:8]!r})")
+
+    if file_format == "pdf":
+        file = tempfile.NamedTemporaryFile(suffix=".pdf")
+    else:
+        file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        for chunk in chain([prefix], chunks):
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadRejected(f"File is over the limit of {max_bytes} bytes")
+            digest.update(chunk)
+            file.write(chunk)
+        file.flush()
+        file.seek(0)
+    except BaseException:
+        body.close()
+        file.close()
+        raise
+    return Upload(file, file_format, size, digest.hexdigest())
+
+
+def open_image(upload: Upload) -> "Image.Image":
+    """Decode an uploaded image, downsampling huge JPEGs in the decoder; the file can be closed afterwards."""
+    from PIL import Image
+
+    try:
+        img = Image.open(upload.file)
+    except Exception as e:
+        raise UploadRejected(f"Unreadable {upload.format} image: {e}") from e
+    if img.format == "JPEG":
+        reduce = max(1, max(img.size) // DRAFT_MIN_SIDE)
+        # draft() picks the largest 1/2, 1/4 or 1/8 scale that keeps the image at least this size
+        img.draft("L", (img.width // reduce, img.height // reduce))
+    # Checked after draft(), which has already set the size the JPEG decodes to
+    if img.width * img.height > MAX_IMAGE_PIXELS:
+        raise UploadRejected(f"Image is {img.width}x{img.height}, over {MAX_IMAGE_PIXELS} pixels")
+    try:
+        img.load()
+    except Exception as e:
+        raise UploadRejected(f"Unreadable {upload.format} image: {e}") from e
+    return img
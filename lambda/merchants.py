@@ -0,0 +1,79 @@
+"""Merchant dictionary and matcher.
+
+The dictionary is a JSON file (merchants.json next to this module, or
+MERCHANTS_FILE) listing each chain's canonical name, its aliases and its
+category:
+
+    [{"name": "MEDIAMARKT", "aliases": ["MEDIA MARKT"], "category": "electronics"}, ...]
+
+At import, every name and alias is normalized (uppercase, punctuation to
+spaces, runs of spaces collapsed) and compiled into one regex shaped like a
+trie: aliases that share a prefix share a branch, so the regex engine looks
+at each character of the OCR text once per trie level instead of once per
+merchant. A space in an alias matches any punctuation between the words
+("NEW-YORKER"). The matcher scans the uppercased receipt text in a single
+pass.
+Matches must start and end on word boundaries, so "DM" or "BP" no longer fire
+inside other words. The leftmost match wins, and at one position the longest
+alias wins.
+"""
+import json
+import os
+import re
+
+DEFAULT_MERCHANTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "merchants.json")
+# Known stores are only looked for on lines shorter than this
+MAX_LINE_LENGTH = 50
+
+_SEPARATORS = re.compile(r"[^\w&]|_")
+# A space in an alias matches any run of spaces and punctuation within the line
+SEPARATOR_PATTERN = r"[^\w&\n]+"
+
+
+def normalize(alias: str) -> str:
+    """Uppercase, turn punctuation into spaces and collapse runs of spaces."""
+    return " ".join(_SEPARATORS.sub(" ", alias.upper()).split())
+
+
+def _trie_pattern(node: dict) -> str:
+    """Regex for a trie node; "" marks the end of an alias. Longer continuations are tried first."""
+    branches = [(SEPARATOR_PATTERN if char == " " else re.escape(char)) + _trie_pattern(child)
+                for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    # Optional continuation when an alias also ends here; greedy, so the longest alias is preferred
+    return f"(?:{body})?" if "" in node else body
+
+
+class MerchantMatcher:
+    """Finds the first known merchant in receipt lines with one trie-shaped regex."""
+
+    def __init__(self, entries: list[dict]):
+        self.entries = {}
+        trie = {}
+        for entry in entries:
+            for alias in [entry["name"], *entry.get("aliases", [])]:
+                key = normalize(alias)
+                # The first entry claiming an alias keeps it
+                if not key or key in self.entries:
+                    continue
+                self.entries[key] = entry
+                node = trie
+                for char in key:
+                    node = node.setdefault(char, {})
+                node[""] = {}
+        self.regex = re.compile(rf"(?<!\w)(?:{_trie_pattern(trie)})(?!\w)") if trie else None
+
+    def find(self, lines: list[str]) -> dict | None:
+        """Dictionary entry of the leftmost merchant on the first line (under MAX_LINE_LENGTH) naming one."""
+        if self.regex is None:
+            return None
+        text = "\n".join(line if len(line) < MAX_LINE_LENGTH else "" for line in lines).upper()
+        match = self.regex.search(text)
+        return self.entries[normalize(match.group())] if match else None
+
+
+def load_merchants(path: str = None) -> MerchantMatcher:
+    with open(path or DEFAULT_MERCHANTS_FILE, encoding="utf-8") as f:
+        return MerchantMatcher(json.load(f))
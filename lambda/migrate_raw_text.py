@@ -0,0 +1,111 @@
+"""One-shot migration: move the raw_text of existing receipts out of their items.
+
+Scans the Receipts table page by page. For every item that still holds a plain
+``raw_text``, it stores the text with ``text_store.store_text`` (an S3 sidecar
+when RAW_TEXT_BUCKET is set, else a gzip binary attribute). It then replaces
+``raw_text`` in the item with the pointer. The update is conditional on
+``raw_text`` still being there, so a rerun or a concurrent reparse is
+harmless. Like migrate_receipts.py, it bumps the ``data_version`` of the users
+whose items a page moved and saves a checkpoint after every page:
+
+    python benchmarks/scan_rcu.py                        # before
+    RAW_TEXT_BUCKET=receipt-scanner-receipt-text python migrate_raw_text.py
+    python benchmarks/scan_rcu.py                        # after
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+from data_version import bump_data_versions
+from migrate_receipts import load_checkpoint, save_checkpoint
+from text_store import RAW_TEXT_BUCKET, store_text
+
+
+def offload_item(table, s3, item: dict, bucket: str) -> bool:
+    """Move one item's raw_text out of line; False if another writer got there first."""
+    attributes = store_text(s3, item["receipt_id"], item["raw_text"], bucket=bucket)
+    (name, value), = attributes.items()
+    try:
+        table.update_item(
+            Key={"receipt_id": item["receipt_id"]},
+            UpdateExpression="SET #t = :t REMOVE raw_text",
+            ConditionExpression=Attr("raw_text").exists(),
+            ExpressionAttributeNames={"#t": name},
+            ExpressionAttributeValues={":t": value},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+    return True
+
+
+def migrate(table, s3, bucket: str = RAW_TEXT_BUCKET, checkpoint_path: str = None, page_size: int = 200,
+            workers: int = 8, dry_run: bool = False, users_table=None) -> dict:
+    """Offload the raw_text of every receipt, resuming from the checkpoint if present."""
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint.get("done"):
+        print(f"Checkpoint {checkpoint_path} says the migration already finished")
+        return checkpoint
+    print(f"Moving raw_text to {f's3://{bucket}' if bucket else 'a gzip binary attribute'}")
+
+    scan_kwargs = {
+        "Limit": page_size,
+        "ProjectionExpression": "receipt_id, user_id, raw_text",
+        "FilterExpression": Attr("raw_text").exists(),
+    }
+    if checkpoint["last_key"]:
+        scan_kwargs["ExclusiveStartKey"] = checkpoint["last_key"]
+        print(f"Resuming after {checkpoint['scanned']} scanned items")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            response = table.scan(**scan_kwargs)
+            items = response["Items"]
+            if items and not dry_run:
+                offloaded = list(executor.map(lambda item: offload_item(table, s3, item, bucket), items))
+                moved = sum(offloaded)
+                bump_data_versions(users_table, [item.get("user_id") for item, done in zip(items, offloaded) if done])
+            else:
+                moved = len(items)
+
+            # Scanned counts every item read; the filter leaves only those still to migrate
+            checkpoint["scanned"] += response["ScannedCount"]
+            checkpoint["rewritten"] += moved
+            checkpoint["last_key"] = response.get("LastEvaluatedKey")
+            checkpoint["done"] = checkpoint["last_key"] is None
+            if not dry_run:
+                save_checkpoint(checkpoint_path, checkpoint)
+            print(f"Scanned {checkpoint['scanned']}, moved {checkpoint['rewritten']}")
+
+            if checkpoint["done"]:
+                return checkpoint
+            scan_kwargs["ExclusiveStartKey"] = checkpoint["last_key"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move raw_text out of existing Receipts items (see text_store.py)")
+    parser.add_argument("--table", default="Receipts")
+    parser.add_argument("--bucket", default=RAW_TEXT_BUCKET, help="S3 bucket for the sidecars (default $RAW_TEXT_BUCKET); "
+                                                                 "without one, texts become gzip binary attributes")
+    parser.add_argument("--checkpoint", default="migrate_raw_text.checkpoint.json")
+    parser.add_argument("--users-table", default="Users", help="where the data_version of affected users is bumped")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--dry-run", action="store_true", help="report what would move without writing")
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource("dynamodb")
+    migrate(
+        dynamodb.Table(args.table),
+        boto3.client("s3"),
+        bucket=args.bucket,
+        checkpoint_path=args.checkpoint,
+        page_size=args.page_size,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        users_table=dynamodb.Table(args.users_table),
+    )
@@ -0,0 +1,100 @@
+"""One-shot migration: add canonical amount/date fields to existing receipts.
+
+Scans the Receipts table page by page and rewrites every item that is not yet
+canonical (see normalize.py) through ``batch_writer``. After each page is
+written, the scan position is saved to a checkpoint file, so an interrupted
+run continues where it stopped:
+
+    python migrate_receipts.py --checkpoint migrate.checkpoint.json
+    python migrate_receipts.py --checkpoint migrate.checkpoint.json   # resumes
+
+Rebuild the monthly rollups (``python rollups.py``) afterwards, since receipts
+whose date could not be parsed move to their upload day. Then set
+RECEIPTS_MIGRATED=true on the API lambda. Until then it ignores the rollups,
+because its raw-receipt date queries can't place legacy DD.MM.YY dates.
+
+The ``data_version`` of every user whose receipts a page rewrote is bumped
+right after that page, so the API's cached responses for them go stale.
+"""
+import argparse
+import json
+import os
+
+import boto3
+
+from data_version import bump_data_versions
+from normalize import normalize_item
+
+
+def load_checkpoint(path: str) -> dict:
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"last_key": None, "scanned": 0, "rewritten": 0}
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    if not path:
+        return
+    # Write-then-rename so a crash never leaves a truncated checkpoint behind.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def migrate(table, checkpoint_path: str = None, page_size: int = 200, dry_run: bool = False,
+            users_table=None) -> dict:
+    """Canonicalize every receipt in the table, resuming from the checkpoint if present."""
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint.get("done"):
+        print(f"Checkpoint {checkpoint_path} says the migration already finished")
+        return checkpoint
+
+    scan_kwargs = {"Limit": page_size}
+    if checkpoint["last_key"]:
+        scan_kwargs["ExclusiveStartKey"] = checkpoint["last_key"]
+        print(f"Resuming after {checkpoint['scanned']} scanned items")
+
+    while True:
+        response = table.scan(**scan_kwargs)
+        updates = [item for item in map(normalize_item, response["Items"]) if item]
+        if updates and not dry_run:
+            with table.batch_writer(overwrite_by_pkeys=["receipt_id"]) as batch:
+                for item in updates:
+                    batch.put_item(Item=item)
+            # Before the checkpoint moves on, so a resumed run can't miss a user
+            bump_data_versions(users_table, [item.get("user_id") for item in updates])
+
+        checkpoint["scanned"] += len(response["Items"])
+        checkpoint["rewritten"] += len(updates)
+        checkpoint["last_key"] = response.get("LastEvaluatedKey")
+        checkpoint["done"] = checkpoint["last_key"] is None
+        if not dry_run:
+            save_checkpoint(checkpoint_path, checkpoint)
+        print(f"Scanned {checkpoint['scanned']}, rewritten {checkpoint['rewritten']}")
+
+        if checkpoint["done"]:
+            if not dry_run:
+                print("Done; rebuild the rollups and set RECEIPTS_MIGRATED=true on the API lambda")
+            return checkpoint
+        scan_kwargs["ExclusiveStartKey"] = checkpoint["last_key"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add amount_cents, ISO purchase_date and year_month to existing receipts")
+    parser.add_argument("--table", default="Receipts")
+    parser.add_argument("--checkpoint", default="migrate_receipts.checkpoint.json")
+    parser.add_argument("--users-table", default="Users", help="where the data_version of affected users is bumped")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource("dynamodb")
+    migrate(
+        dynamodb.Table(args.table),
+        checkpoint_path=args.checkpoint,
+        page_size=args.page_size,
+        dry_run=args.dry_run,
+        users_table=dynamodb.Table(args.users_table),
+    )
@@ -0,0 +1,76 @@
+"""Canonical, query-friendly receipt fields.
+
+OCR yields amounts like "41,21" or "41.21" and dates like "18.09.23". At
+write time we additionally persist:
+
+* ``amount_cents``: the total as an integer number of cents
+* ``purchase_date``: always ISO YYYY-MM-DD (the OCR text is kept in
+  ``purchase_date_raw`` when it could not be parsed and the upload day is used)
+* ``year_month``: YYYY-MM, derived from purchase_date
+
+``total_amount`` keeps the OCR string for display.
+"""
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+
+def parse_amount(value) -> Decimal | None:
+    """Parse a stored total_amount ("41,21", "41.21" or a number) into a Decimal."""
+    if isinstance(value, Decimal):
+        return value
+    if not value:
+        return None
+    try:
+        amount = Decimal(str(value).replace(",", "."))
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() else None
+
+
+def parse_purchase_date(value) -> date | None:
+    """Parse a stored purchase_date (ISO or German DD.MM.YY[YY]) into a date."""
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%d.%m.%y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def amount_to_cents(value) -> int | None:
+    """Convert a stored amount into integer cents, or None if it isn't a number."""
+    amount = parse_amount(value)
+    if amount is None:
+        return None
+    return int((amount * 100).to_integral_value())
+
+
+def canonical_fields(total_amount, purchase_date, upload_date: str) -> dict:
+    """Return the canonical attributes for a receipt's OCR amount and date."""
+    fields = {}
+    cents = amount_to_cents(total_amount)
+    if cents is not None:
+        fields["amount_cents"] = cents
+
+    parsed = parse_purchase_date(purchase_date)
+    if parsed is None:
+        # purchase_date is an index key and can't be empty; fall back to the upload day.
+        parsed = date.fromisoformat(upload_date[:10])
+        if purchase_date:
+            fields["purchase_date_raw"] = purchase_date
+    fields["purchase_date"] = parsed.isoformat()
+    fields["year_month"] = fields["purchase_date"][:7]
+    return fields
+
+
+def normalize_item(item: dict) -> dict | None:
+    """Return a canonicalized copy of a stored receipt, or None if it is already canonical."""
+    upload_date = item.get("upload_date") or datetime.utcnow().isoformat()
+    fields = canonical_fields(item.get("total_amount"), item.get("purchase_date"), upload_date)
+    if "amount_cents" in item:
+        fields["amount_cents"] = int(item["amount_cents"])
+    if all(item.get(name) == value for name, value in fields.items()):
+        return None
+    return {**item, **fields}
@@ -0,0 +1,58 @@
+"""Durable cache of raw OCR output.
+
+Every OCR result is stored as gzipped JSON in S3 under ``ocr-cache/<key>.json.gz``.
+The key is a SHA-256 over the uploaded file's hash, the Tesseract version, the
+language and the OCR pipeline/config string, so changing any of them (or
+upgrading Tesseract) naturally misses the cache instead of serving stale text.
+The entry holds the text and, when OCR_CACHE_WORDS is on, the word boxes with
+their confidences.
+
+Receipts remember their ``ocr_cache_key``, which lets ``reparse.py`` re-run
+field extraction over cached text without touching Tesseract.
+"""
+import gzip
+import hashlib
+import json
+from functools import lru_cache
+
+from botocore.exceptions import ClientError
+
+OCR_CACHE_PREFIX = "ocr-cache/"
+
+
+@lru_cache(maxsize=1)
+def tesseract_version() -> str:
+    import pytesseract
+
+    return str(pytesseract.get_tesseract_version())
+
+
+def ocr_cache_key(file_hash: str, lang: str, config: str) -> str:
+    """Cache key for one file OCR'd with one Tesseract version, language and pipeline config."""
+    material = json.dumps([file_hash, tesseract_version(), lang, config])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _object_key(cache_key: str) -> str:
+    return f"{OCR_CACHE_PREFIX}{cache_key}.json.gz"
+
+
+def load_ocr(s3, bucket: str, cache_key: str) -> dict | None:
+    """Return the cached {"text", "words"} entry, or None on a miss."""
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=_object_key(cache_key))
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+    return json.loads(gzip.decompress(obj["Body"].read()))
+
+
+def store_ocr(s3, bucket: str, cache_key: str, text: str, words: list | None = None):
+    entry = {"text": text, "words": words, "tesseract_version": tesseract_version()}
+    s3.put_object(
+        Bucket=bucket,
+        Key=_object_key(cache_key),
+        Body=gzip.compress(json.dumps(entry).encode("utf-8")),
+        ContentType="application/gzip",
+    )
@@ -0,0 +1,156 @@
+"""OCR backends: a persistent in-process Tesseract engine, or the tesseract CLI.
+
+pytesseract writes every image to a temp file, forks the ``tesseract`` binary
+and reloads the ``deu+eng`` traineddata on each call, once per image and
+once per PDF page. ``TesserocrBackend`` instead keeps initialized
+``tesserocr.PyTessBaseAPI`` engines in memory for the life of the container.
+One engine can't be shared by threads, so engines live in a pool: a call takes
+an idle engine, or initializes a new one when all are busy, and returns it
+afterwards. The pool grows to the peak number of concurrent OCR calls and is
+reused across warm invocations.
+
+``create_backend`` picks the backend from OCR_BACKEND (``auto``, ``tesserocr``
+or ``pytesseract``). ``auto`` uses tesserocr when it is installed and an engine
+initializes, and otherwise falls back to pytesseract. Both backends take the
+same CLI-style config string (``--oem``, ``--psm``, ``--dpi``, ``-c name=value``)
+and return image_to_data output as the same dict of columns.
+"""
+import os
+import queue
+import shlex
+from contextlib import contextmanager
+
+# Enhanced Tesseract config for better text recognition
+# (--dpi 300 because preprocessing scales text to about the height of a 300 DPI scan).
+# The whitelist is quoted so it keeps its trailing space: without a space in the
+# whitelist, the LSTM engine runs all the words of a line together.
+TESSERACT_CONFIG = r'--oem 3 --psm 6 --dpi 300 -c "tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyzÄÖÜäöüß.,:-€ "'
+OCR_LANG = "deu+eng"
+# Per-call limit for the tesseract CLI; the in-process engine can't be interrupted
+PYTESSERACT_TIMEOUT = 60
+TSV_INT_COLUMNS = ("level", "page_num", "block_num", "par_num", "line_num", "word_num", "left", "top", "width", "height")
+
+
+def parse_config(config: str) -> tuple[int | None, int | None, dict]:
+    """(oem, psm, variables) from a tesseract CLI config string."""
+    oem = psm = None
+    variables = {}
+    args = iter(shlex.split(config))
+    for arg in args:
+        if arg == "--oem":
+            oem = int(next(args))
+        elif arg == "--psm":
+            psm = int(next(args))
+        elif arg == "--dpi":
+            variables["user_defined_dpi"] = next(args)
+        elif arg == "-c":
+            name, _, value = next(args).partition("=")
+            variables[name] = value
+    return oem, psm, variables
+
+
+def parse_tsv(tsv: str) -> dict:
+    """Tesseract TSV output as a dict of columns, like pytesseract's Output.DICT."""
+    rows = [line.split("\t") for line in tsv.splitlines() if line]
+    if rows and rows[0][0] == "level":
+        rows = rows[1:]
+    data = {column: [] for column in (*TSV_INT_COLUMNS, "conf", "text")}
+    for row in rows:
+        row += [""] * (12 - len(row))
+        for column, value in zip(TSV_INT_COLUMNS, row):
+            data[column].append(int(value))
+        data["conf"].append(float(row[10]))
+        data["text"].append(row[11])
+    return data
+
+
+class PytesseractBackend:
+    """Runs the tesseract binary through pytesseract, one process per call."""
+
+    name = "pytesseract"
+
+    def __init__(self, lang: str, config: str):
+        import pytesseract
+
+        self._pytesseract = pytesseract
+        self.lang = lang
+        self.config = config
+
+    def image_to_string(self, img) -> str:
+        return self._pytesseract.image_to_string(img, lang=self.lang, config=self.config, timeout=PYTESSERACT_TIMEOUT)
+
+    def image_to_data(self, img) -> dict:
+        return self._pytesseract.image_to_data(img, lang=self.lang, config=self.config, timeout=PYTESSERACT_TIMEOUT,
+                                               output_type=self._pytesseract.Output.DICT)
+
+
+class TesserocrBackend:
+    """Pool of initialized in-process Tesseract engines, reused across calls and invocations."""
+
+    name = "tesserocr"
+
+    def __init__(self, lang: str, config: str, path: str = None):
+        import tesserocr
+
+        self._tesserocr = tesserocr
+        self.lang = lang
+        self.path = path or os.environ.get("TESSDATA_PREFIX")
+        self.oem, self.psm, self.variables = parse_config(config)
+        self._idle = queue.SimpleQueue()
+        self.engines = 0
+        # Initialize one engine now, so the traineddata is loaded in the init phase and bad setups fail early
+        self._idle.put(self._new_engine())
+
+    def _new_engine(self):
+        kwargs = {"lang": self.lang}
+        if self.path:
+            kwargs["path"] = self.path
+        if self.oem is not None:
+            kwargs["oem"] = self.oem
+        if self.psm is not None:
+            kwargs["psm"] = self.psm
+        engine = self._tesserocr.PyTessBaseAPI(**kwargs)
+        for name, value in self.variables.items():
+            if not engine.SetVariable(name, value):
+                engine.End()
+                raise ValueError(f"Unknown Tesseract variable: {name}")
+        self.engines += 1
+        print(f"Initialized Tesseract engine {self.engines} ({self._tesserocr.tesseract_version().splitlines()[0]})")
+        return engine
+
+    @contextmanager
+    def _engine(self, img):
+        try:
+            engine = self._idle.get_nowait()
+        except queue.Empty:
+            engine = self._new_engine()
+        try:
+            engine.SetImage(img)
+            yield engine
+        finally:
+            # Drop the image and recognition results, but keep the loaded language models
+            engine.Clear()
+            self._idle.put(engine)
+
+    def image_to_string(self, img) -> str:
+        with self._engine(img) as engine:
+            return engine.GetUTF8Text()
+
+    def image_to_data(self, img) -> dict:
+        with self._engine(img) as engine:
+            engine.Recognize()
+            return parse_tsv(engine.GetTSVText(0))
+
+
+def create_backend(lang: str, config: str, backend: str = None):
+    """OCR backend named by OCR_BACKEND (auto, tesserocr or pytesseract)."""
+    backend = (backend or os.environ.get("OCR_BACKEND", "auto")).lower()
+    if backend == "pytesseract":
+        return PytesseractBackend(lang, config)
+    try:
+        return TesserocrBackend(lang, config)
+    except Exception as e:
+        if backend == "tesserocr":
+            raise
+        print(f"tesserocr unavailable ({e}), falling back to pytesseract")
+        return PytesseractBackend(lang, config)
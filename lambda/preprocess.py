@@ -0,0 +1,234 @@
+"""Adaptive image preprocessing for OCR.
+
+Instead of always shrinking to 2000 px and running every filter, the pipeline
+looks at the image first:
+
+1. ``gray``: one PIL conversion to grayscale (no RGB -> BGR -> GRAY round trip).
+2. ``analyze``: a copy of at most ANALYSIS_SIDE px, used for all measurements.
+3. ``crop``: for photos, the bright paper is cropped out: the longest runs of
+   mostly-bright columns and rows. That way the expensive steps don't run on
+   the table around it.
+4. ``scale``: the median height of the text lines, taken from the rows that
+   contain ink, estimates the text size. The crop is rescaled so lines end up
+   about TARGET_LINE_HEIGHT px tall, roughly a 300 DPI scan. If too few lines
+   are found, it falls back to a MAX_SIDE px thumbnail.
+5. ``enhance``/``binarize``/``close``: the blur, CLAHE and morphology close
+   only run on photos. The blur runs before upscaling, on fewer pixels, and
+   is skipped when shrinking, whose averaging removes the noise already.
+   Clean renders (PDF pages) are binarized with Otsu alone, and
+   already-binary input is thresholded as is.
+
+Everything is Pillow and NumPy. OpenCV is optional: CLAHE, the one step
+without a cheap equivalent, runs only when cv2 is installed (see
+CLAHE_AVAILABLE, part of the OCR cache key).
+
+``preprocess`` returns the image for Tesseract together with the per-stage
+timings in milliseconds and the decisions taken.
+"""
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+from roi import text_lines
+
+CLAHE_AVAILABLE = cv2 is not None
+MAX_SIDE = 2000
+ANALYSIS_SIDE = 1000
+# Target median line height, ascenders to descenders, which puts the x-height at
+# the low end of where Tesseract's accuracy levels off; larger text only costs time
+TARGET_LINE_HEIGHT = 26
+MIN_SCALE, MAX_SCALE = 0.25, 2.0
+MAX_PIXELS = 16_000_000
+# Minimum number of text lines needed to trust the line height estimate
+MIN_LINES = 5
+# Crop only when the receipt covers between these fractions of the photo
+MIN_CROP_AREA, MAX_CROP_AREA = 0.10, 0.90
+# Columns and rows count as paper when at least this share of them is bright
+PAPER_FRACTION = 0.6
+# Share of pure black/white pixels above which an image counts as already binary
+BINARY_FRACTION = 0.97
+# Same smoothing as the 5x5 Gaussian kernel used before (OpenCV's sigma for ksize 5)
+BLUR_RADIUS = 1.1
+
+
+class StageTimer:
+    """Accumulates wall time per named stage, in milliseconds, into ``timings``."""
+
+    def __init__(self, timings: dict = None):
+        self.timings = {} if timings is None else timings
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(self.timings.get(name, 0) + (time.perf_counter() - started) * 1000, 1)
+
+
+def _resize(gray: np.ndarray, scale: float) -> np.ndarray:
+    size = (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale)))
+    # BOX averages like OpenCV's INTER_AREA when shrinking; bilinear is enough
+    # for upscaling an image that is binarized right after
+    resample = Image.Resampling.BOX if scale < 1 else Image.Resampling.BILINEAR
+    return np.asarray(Image.fromarray(gray).resize(size, resample))
+
+
+def _blur(gray: np.ndarray) -> np.ndarray:
+    return np.asarray(Image.fromarray(gray).filter(ImageFilter.GaussianBlur(BLUR_RADIUS)))
+
+
+def _analysis_copy(gray: np.ndarray) -> tuple[np.ndarray, float]:
+    scale = min(1.0, ANALYSIS_SIDE / max(gray.shape))
+    if scale == 1.0:
+        return gray, 1.0
+    return _resize(gray, scale), scale
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Otsu's threshold: the gray level that maximizes the variance between dark and bright pixels."""
+    # PIL's histogram is several times faster than np.bincount on a full-size page
+    hist = np.array(Image.fromarray(gray).histogram(), dtype=np.float64)
+    levels = np.arange(256)
+    weight_dark = np.cumsum(hist)
+    weight_bright = weight_dark[-1] - weight_dark
+    sum_dark = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_dark = sum_dark / weight_dark
+        mean_bright = (sum_dark[-1] - sum_dark) / weight_bright
+        between = weight_dark * weight_bright * (mean_dark - mean_bright) ** 2
+    return int(np.nanargmax(between)) if np.isfinite(between).any() else 127
+
+
+def _threshold(gray: np.ndarray, threshold: int) -> np.ndarray:
+    return (gray > threshold).astype(np.uint8) * 255
+
+
+def _close(binary: np.ndarray) -> np.ndarray:
+    """Morphological close with a 2x2 square: removes specks and gaps one pixel wide."""
+    dilated = binary.copy()
+    np.maximum(dilated[:, :-1], binary[:, 1:], out=dilated[:, :-1])
+    np.maximum(dilated[:-1], dilated[1:], out=dilated[:-1])
+    closed = dilated.copy()
+    np.minimum(closed[:, 1:], dilated[:, :-1], out=closed[:, 1:])
+    np.minimum(closed[1:], closed[:-1], out=closed[1:])
+    return closed
+
+
+def _longest_run(flags: np.ndarray) -> tuple[int, int] | None:
+    """(start, end) of the longest run of True values, end exclusive."""
+    padded = np.concatenate(([0], flags.astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(padded))
+    if not len(edges):
+        return None
+    starts, ends = edges[::2], edges[1::2]
+    longest = np.argmax(ends - starts)
+    return int(starts[longest]), int(ends[longest])
+
+
+def is_binary(small: np.ndarray) -> bool:
+    extremes = np.count_nonzero((small <= 10) | (small >= 245))
+    return bool(extremes >= BINARY_FRACTION * small.size)
+
+
+def receipt_bounds(small: np.ndarray) -> tuple[int, int, int, int] | None:
+    """(x, y, w, h) of the paper in the analysis copy, or None if cropping wouldn't help."""
+    blurred = np.asarray(Image.fromarray(small).filter(ImageFilter.GaussianBlur(2)))
+    bright = blurred > otsu_threshold(blurred)
+    columns = _longest_run(bright.mean(axis=0) >= PAPER_FRACTION)
+    if columns is None:
+        return None
+    rows = _longest_run(bright[:, columns[0]:columns[1]].mean(axis=1) >= PAPER_FRACTION)
+    if rows is None:
+        return None
+    x, y, w, h = columns[0], rows[0], columns[1] - columns[0], rows[1] - rows[0]
+    coverage = (w * h) / small.size
+    if not MIN_CROP_AREA <= coverage <= MAX_CROP_AREA:
+        return None
+    return x, y, w, h
+
+
+def estimate_line_height(small: np.ndarray) -> float | None:
+    """Median height in pixels of the text lines, or None if there's too little text."""
+    lines = text_lines(_threshold(small, otsu_threshold(small)))
+    heights = [bottom - top for top, bottom in lines if bottom - top <= small.shape[0] * 0.1]
+    if len(heights) < MIN_LINES:
+        return None
+    return float(np.median(heights))
+
+
+def target_scale(gray_shape: tuple, line_height: float | None) -> float:
+    if line_height:
+        scale = min(MAX_SCALE, max(MIN_SCALE, TARGET_LINE_HEIGHT / line_height))
+    else:
+        scale = min(1.0, MAX_SIDE / max(gray_shape))
+    pixels = gray_shape[0] * gray_shape[1] * scale * scale
+    if pixels > MAX_PIXELS:
+        scale *= (MAX_PIXELS / pixels) ** 0.5
+    return scale
+
+
+def preprocess(img: Image.Image, source: str = "photo") -> tuple[Image.Image, dict, dict]:
+    """Prepare an image for Tesseract; source is "photo" or "pdf" (a clean render).
+
+    Returns (image, stage timings in ms, decisions).
+    """
+    timer = StageTimer()
+    decisions = {"source": source}
+
+    with timer.stage("gray"):
+        gray = np.asarray(img.convert("L"))
+    with timer.stage("analyze"):
+        small, small_scale = _analysis_copy(gray)
+        binary_input = is_binary(small)
+    decisions["binary_input"] = binary_input
+
+    if source == "photo" and not binary_input:
+        with timer.stage("crop"):
+            bounds = receipt_bounds(small)
+            if bounds:
+                x, y, w, h = (round(v / small_scale) for v in bounds)
+                gray = gray[y:y + h, x:x + w]
+                small = small[bounds[1]:bounds[1] + bounds[3], bounds[0]:bounds[0] + bounds[2]]
+        decisions["cropped"] = bool(bounds)
+
+    with timer.stage("scale"):
+        line_height = estimate_line_height(small)
+        scale = target_scale(gray.shape, line_height / small_scale if line_height else None)
+    decisions["line_height"] = round(line_height / small_scale, 1) if line_height else None
+    decisions["scale"] = round(scale, 3)
+    resize = abs(scale - 1.0) > 0.05
+    photo = source == "photo" and not binary_input
+
+    if photo and not (resize and scale < 1):
+        # Shrinking averages the sensor noise away already (BOX); otherwise the blur
+        # runs before upscaling, on the fewer pixels
+        with timer.stage("enhance"):
+            gray = _blur(gray)
+    if resize:
+        with timer.stage("scale"):
+            gray = _resize(gray, scale)
+
+    if binary_input:
+        with timer.stage("binarize"):
+            binary = _threshold(gray, 127)
+    elif source == "pdf":
+        with timer.stage("binarize"):
+            binary = _threshold(gray, otsu_threshold(gray))
+    else:
+        if CLAHE_AVAILABLE:
+            with timer.stage("enhance"):
+                gray = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+        with timer.stage("binarize"):
+            binary = _threshold(gray, otsu_threshold(gray))
+        with timer.stage("close"):
+            binary = _close(binary)
+
+    return Image.fromarray(binary), timer.timings, decisions
@@ -0,0 +1,156 @@
+"""Re-run field extraction over stored OCR text, without running Tesseract.
+
+After a change to ``extract_fields`` (regexes, known stores, categories) this
+scans the Receipts table in parallel segments, re-extracts the fields from each
+receipt's stored text (see text_store.py) or its cached OCR entry (see
+ocr_cache.py) and updates only the receipts whose fields changed.
+``reparse_and_refresh`` then rebuilds the monthly rollups and bumps the
+data_version of the affected users, so the API stops serving their cached
+analytics. Both the command line and the lambda's reparse mode go through it:
+
+    python reparse.py --segments 8
+    python reparse.py --dry-run
+
+or invoke the OCR lambda with ``{"mode": "reparse"}``.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import boto3
+
+from data_version import bump_data_versions
+from normalize import canonical_fields, parse_purchase_date
+from rollups import rebuild_rollups
+from text_store import TEXT_ATTRIBUTES
+
+EXTRACTED_ATTRIBUTES = ["merchant", "purchase_time", "total_amount", "category"]
+CANONICAL_ATTRIBUTES = ["amount_cents", "purchase_date", "purchase_date_raw", "year_month"]
+SCANNED_ATTRIBUTES = ["receipt_id", "user_id", "upload_date", "ocr_cache_key"] + TEXT_ATTRIBUTES + EXTRACTED_ATTRIBUTES + CANONICAL_ATTRIBUTES
+
+
+def reparsed_fields(item: dict, text: str, extract) -> dict:
+    """The extracted and canonical attributes a receipt should have for its text."""
+    fields = extract(text)
+    upload_date = item.get("upload_date")
+    if not upload_date:
+        # An undated receipt stays on the day it is filed under instead of moving to today on every run
+        stored = parse_purchase_date(item.get("purchase_date"))
+        upload_date = (stored or datetime.utcnow().date()).isoformat()
+    return {
+        **{name: fields[name] for name in EXTRACTED_ATTRIBUTES},
+        **canonical_fields(fields["total_amount"], fields["purchase_date"], upload_date),
+    }
+
+
+def _update_receipt(receipts_table, item: dict, fields: dict):
+    names, values, assignments = {}, {}, []
+    for i, (name, value) in enumerate(fields.items()):
+        names[f"#a{i}"] = name
+        values[f":v{i}"] = value
+        assignments.append(f"#a{i} = :v{i}")
+    removed = [name for name in CANONICAL_ATTRIBUTES if name in item and name not in fields]
+    for i, name in enumerate(removed):
+        names[f"#r{i}"] = name
+
+    update = "SET " + ", ".join(assignments)
+    if removed:
+        update += " REMOVE " + ", ".join(f"#r{i}" for i in range(len(removed)))
+    receipts_table.update_item(
+        Key={"receipt_id": item["receipt_id"]},
+        UpdateExpression=update,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+
+
+def _reparse_segment(receipts_table, extract, load_text, segment: int, total_segments: int, dry_run: bool,
+                     changed_users: set) -> dict:
+    counts = {"scanned": 0, "changed": 0, "no_text": 0}
+    scan_kwargs = {
+        "ProjectionExpression": ", ".join(f"#p{i}" for i in range(len(SCANNED_ATTRIBUTES))),
+        "ExpressionAttributeNames": {f"#p{i}": name for i, name in enumerate(SCANNED_ATTRIBUTES)},
+        "Segment": segment,
+        "TotalSegments": total_segments,
+    }
+    while True:
+        response = receipts_table.scan(**scan_kwargs)
+        for item in response["Items"]:
+            counts["scanned"] += 1
+            text = load_text(item) if load_text else item.get("raw_text")
+            if text is None:
+                counts["no_text"] += 1
+                continue
+
+            fields = reparsed_fields(item, text, extract)
+            changed = any(item.get(name) != value for name, value in fields.items()) or any(
+                name in item and name not in fields for name in CANONICAL_ATTRIBUTES
+            )
+            if changed:
+                counts["changed"] += 1
+                changed_users.add(item.get("user_id"))
+                if not dry_run:
+                    _update_receipt(receipts_table, item, fields)
+        if "LastEvaluatedKey" not in response:
+            return counts
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def reparse_receipts(receipts_table, extract, load_text=None, segments: int = 4, dry_run: bool = False,
+                     changed_users: set | None = None) -> dict:
+    """Re-extract every receipt's fields from its stored text; returns scanned/changed/no_text counts.
+
+    load_text(item) returns a scanned receipt's text wherever it is stored, or None;
+    without it only items holding a plain raw_text are reparsed. The owners of
+    changed receipts are added to changed_users when it is given.
+    """
+    if changed_users is None:
+        changed_users = set()
+    totals = {"scanned": 0, "changed": 0, "no_text": 0}
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        results = executor.map(
+            lambda s: _reparse_segment(receipts_table, extract, load_text, s, segments, dry_run, changed_users),
+            range(segments)
+        )
+        for counts in results:
+            for name, value in counts.items():
+                totals[name] += value
+    print(f"Reparsed {totals['scanned']} receipts, {totals['changed']} changed, {totals['no_text']} without text")
+    return totals
+
+
+def reparse_and_refresh(receipts_table, extract, load_text=None, rollups_table=None, users_table=None,
+                        segments: int = 4, dry_run: bool = False) -> dict:
+    """reparse_receipts, then rebuild the rollups and bump the data_version of users whose receipts changed."""
+    changed_users = set()
+    counts = reparse_receipts(receipts_table, extract, load_text=load_text, segments=segments, dry_run=dry_run,
+                              changed_users=changed_users)
+    if counts["changed"] and not dry_run:
+        if rollups_table is not None:
+            rebuild_rollups(receipts_table, rollups_table)
+        bump_data_versions(users_table, changed_users)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run extract_fields over stored OCR text for every receipt")
+    parser.add_argument("--table", default="Receipts")
+    parser.add_argument("--rollups-table", default="ReceiptMonthlyRollups")
+    parser.add_argument("--users-table", default="Users", help="where the data_version of affected users is bumped")
+    parser.add_argument("--segments", type=int, default=4, help="parallel scan segments")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+
+    from app import load_receipt_text
+    from extraction import extract_fields
+
+    dynamodb = boto3.resource("dynamodb")
+    reparse_and_refresh(
+        dynamodb.Table(args.table),
+        extract_fields,
+        load_text=load_receipt_text,
+        rollups_table=dynamodb.Table(args.rollups_table),
+        users_table=dynamodb.Table(args.users_table),
+        segments=args.segments,
+        dry_run=args.dry_run,
+    )
@@ -0,0 +1,112 @@
+"""Region-of-interest OCR for receipt photos.
+
+extract_fields only needs the merchant from the top of the receipt, and the
+total, date and time, which German receipts print below the line items. A
+long grocery receipt is mostly line items, so recognizing every line spends
+most of the Tesseract time on text nobody reads.
+
+``ocr_regions`` works in two stages:
+
+1. Layout: a horizontal projection of the binarized image finds the text
+   lines. This is pure NumPy and takes a few milliseconds.
+2. Recognition: full-quality OCR runs on the header band (the first
+   HEADER_LINES lines) and the footer band (the last FOOTER_FRACTION of the
+   lines), where the SUMME/TOTAL/Betrag and date lines are. If the text of
+   those bands is still missing a field (``is_complete`` returns False),
+   the skipped middle is recognized as well, so a total printed mid-receipt
+   is never lost.
+
+Short receipts (fewer than MIN_LINES lines) are recognized whole, since there
+is nothing worth skipping. The text is the regions' text top to bottom, so
+``raw_text`` lacks the skipped line items; OCR_FULL_TEXT turns this mode off
+when the full text is needed.
+"""
+import numpy as np
+from PIL import Image
+
+HEADER_LINES = 6
+FOOTER_FRACTION = 0.35
+MIN_LINES = 20
+# A pixel row is text when at least this share of it is ink
+MIN_ROW_INK = 0.003
+# Gaps up to this many rows don't split a line (dots, umlauts, descenders)
+MAX_LINE_GAP = 2
+MIN_LINE_HEIGHT = 5
+
+
+def text_lines(binary: np.ndarray) -> list[tuple[int, int]]:
+    """(top, bottom) pixel rows of the text lines in a black-on-white binary image."""
+    ink_rows = np.count_nonzero(binary < 128, axis=1) >= max(1, MIN_ROW_INK * binary.shape[1])
+    lines = []
+    start = gap = None
+    for y, is_ink in enumerate(ink_rows):
+        if is_ink:
+            if start is None:
+                start = y
+            gap = None
+        elif start is not None:
+            gap = y if gap is None else gap
+            if y - gap >= MAX_LINE_GAP:
+                lines.append((start, gap))
+                start = gap = None
+    if start is not None:
+        lines.append((start, gap if gap is not None else len(ink_rows)))
+    return [(top, bottom) for top, bottom in lines if bottom - top >= MIN_LINE_HEIGHT]
+
+
+def _band(lines: list[tuple[int, int]], height: int) -> tuple[int, int]:
+    """Pixel rows spanning the given lines, padded by half a line."""
+    padding = max(bottom - top for top, bottom in lines) // 2
+    return max(0, lines[0][0] - padding), min(height, lines[-1][1] + padding)
+
+
+def plan_regions(lines: list[tuple[int, int]], height: int) -> tuple[list[tuple[int, int]], tuple[int, int] | None]:
+    """(header and footer bands, the skipped middle band) for the detected lines."""
+    footer_start = max(HEADER_LINES, len(lines) - max(1, round(len(lines) * FOOTER_FRACTION)))
+    header, middle, footer = lines[:HEADER_LINES], lines[HEADER_LINES:footer_start], lines[footer_start:]
+    if not middle:
+        return [_band(lines, height)], None
+    return [_band(header, height), _band(footer, height)], _band(middle, height)
+
+
+def _recognize_band(recognize, img: Image.Image, band: tuple[int, int], region: int):
+    top, bottom = band
+    text, words = recognize(img.crop((0, top, img.width, bottom)))
+    for word in words or []:
+        word["box"][1] += top
+        word["region"] = region
+    return text, words
+
+
+def ocr_regions(img: Image.Image, recognize, is_complete, timer) -> tuple[str, list | None, dict]:
+    """OCR the header and footer bands of a preprocessed receipt, and the middle only if fields are missing.
+
+    ``recognize(image)`` returns (text, word boxes or None) for one band,
+    ``is_complete(text)`` tells whether the extracted fields are all there,
+    and ``timer`` is the preprocess.StageTimer of this image.
+    Returns (text, word boxes or None, decisions).
+    """
+    with timer.stage("layout"):
+        lines = text_lines(np.asarray(img))
+    decisions = {"lines": len(lines)}
+    if len(lines) < MIN_LINES:
+        decisions["regions"] = "full"
+        with timer.stage("tesseract"):
+            text, words = recognize(img)
+        return text, words, decisions
+
+    bands, middle = plan_regions(lines, img.height)
+    with timer.stage("tesseract"):
+        results = [_recognize_band(recognize, img, band, region) for region, band in enumerate(bands)]
+    text = "\n".join(band_text for band_text, _ in results)
+    decisions["regions"] = "header+footer"
+    if middle and not is_complete(text):
+        # Something is missing from the bands: recognize the line items too and keep the text in page order
+        with timer.stage("tesseract_middle"):
+            results.insert(1, _recognize_band(recognize, img, middle, len(bands)))
+        text = "\n".join(band_text for band_text, _ in results)
+        decisions["regions"] = "all"
+    decisions["ocr_rows"] = sum(bottom - top for top, bottom in bands) + (
+        middle[1] - middle[0] if decisions["regions"] == "all" else 0)
+    words = None if results[0][1] is None else [word for _, band_words in results for word in band_words]
+    return text, words, decisions
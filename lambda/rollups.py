@@ -0,0 +1,144 @@
+"""Per-user monthly spending rollups.
+
+Each rollup item is keyed by (user_id, year_month) and holds running totals
+for that month: overall amount and count, weekday/weekend splits and one
+``category_<name>`` total per category. The OCR handler bumps them with atomic
+ADD updates after every receipt it saves, so concurrent uploads never lose an
+increment, and the analytics API reads one item per month instead of every
+receipt.
+
+Run this module directly to rebuild the rollups from the Receipts table:
+
+    python rollups.py --receipts-table Receipts --rollups-table ReceiptMonthlyRollups
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import boto3
+
+from normalize import parse_amount, parse_purchase_date
+
+CATEGORY_PREFIX = "category_"
+
+# Only the attributes a rollup needs; keeps raw_text out of rebuild scans.
+RECEIPT_PROJECTION = "user_id, purchase_date, total_amount, amount_cents, category"
+
+
+def rollup_increments(item: dict):
+    """Return (year_month, {attribute: increment}) for a receipt, or None if it can't be rolled up."""
+    if "amount_cents" in item:
+        amount = Decimal(item["amount_cents"]) / 100
+    else:
+        amount = parse_amount(item.get("total_amount"))
+    purchase_date = parse_purchase_date(item.get("purchase_date"))
+    if amount is None or purchase_date is None:
+        return None
+
+    day_type = "weekday" if purchase_date.weekday() < 5 else "weekend"
+    category = item.get("category") or "other"
+    return purchase_date.strftime("%Y-%m"), {
+        "total_amount": amount,
+        "receipt_count": Decimal(1),
+        f"{day_type}_total": amount,
+        f"{day_type}_count": Decimal(1),
+        f"{CATEGORY_PREFIX}{category}": amount,
+    }
+
+
+def apply_rollup(rollups_table, item: dict) -> bool:
+    """Atomically add a freshly saved receipt to its user's monthly rollup."""
+    increments = rollup_increments(item)
+    if not increments:
+        return False
+    year_month, values = increments
+
+    names, placeholders = {}, {}
+    clauses = []
+    for i, (attribute, value) in enumerate(values.items()):
+        names[f"#a{i}"] = attribute
+        placeholders[f":v{i}"] = value
+        clauses.append(f"#a{i} :v{i}")
+
+    rollups_table.update_item(
+        Key={"user_id": item["user_id"], "year_month": year_month},
+        UpdateExpression="ADD " + ", ".join(clauses),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=placeholders,
+    )
+    return True
+
+
+def _scan_segment(receipts_table, segment: int, total_segments: int) -> dict:
+    """Aggregate one parallel-scan segment of the Receipts table in memory."""
+    rollups = {}
+    scan_kwargs = {
+        "ProjectionExpression": RECEIPT_PROJECTION,
+        "Segment": segment,
+        "TotalSegments": total_segments,
+    }
+    while True:
+        response = receipts_table.scan(**scan_kwargs)
+        for item in response["Items"]:
+            increments = rollup_increments(item)
+            if not item.get("user_id") or not increments:
+                continue
+            year_month, values = increments
+            totals = rollups.setdefault((item["user_id"], year_month), {})
+            for attribute, value in values.items():
+                totals[attribute] = totals.get(attribute, Decimal(0)) + value
+        if "LastEvaluatedKey" not in response:
+            return rollups
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def rebuild_rollups(receipts_table, rollups_table, segments: int = 4) -> int:
+    """Recompute every rollup from the raw receipts and replace the stored ones.
+
+    Receipts saved while the rebuild runs may be counted twice or not at all,
+    so run it when uploads are quiet. Returns the number of rollup items written.
+    """
+    rollups = {}
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        results = executor.map(lambda s: _scan_segment(receipts_table, s, segments), range(segments))
+        for segment_rollups in results:
+            for key, values in segment_rollups.items():
+                totals = rollups.setdefault(key, {})
+                for attribute, value in values.items():
+                    totals[attribute] = totals.get(attribute, Decimal(0)) + value
+
+    # Drop stale rollups (e.g. months whose receipts were deleted) before rewriting.
+    stale_keys = []
+    scan_kwargs = {"ProjectionExpression": "user_id, year_month"}
+    while True:
+        response = rollups_table.scan(**scan_kwargs)
+        for item in response["Items"]:
+            if (item["user_id"], item["year_month"]) not in rollups:
+                stale_keys.append({"user_id": item["user_id"], "year_month": item["year_month"]})
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    with rollups_table.batch_writer() as batch:
+        for key in stale_keys:
+            batch.delete_item(Key=key)
+        for (user_id, year_month), values in rollups.items():
+            batch.put_item(Item={"user_id": user_id, "year_month": year_month, **values})
+
+    print(f"Rebuilt {len(rollups)} monthly rollups, removed {len(stale_keys)} stale ones")
+    return len(rollups)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild monthly spending rollups from the Receipts table")
+    parser.add_argument("--receipts-table", default="Receipts")
+    parser.add_argument("--rollups-table", default="ReceiptMonthlyRollups")
+    parser.add_argument("--segments", type=int, default=4, help="parallel scan segments")
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource("dynamodb")
+    rebuild_rollups(
+        dynamodb.Table(args.receipts_table),
+        dynamodb.Table(args.rollups_table),
+        segments=args.segments,
+    )
@@ -0,0 +1,30 @@
+import pytest
+
+from extraction import categorize, extract_fields
+
+
+@pytest.mark.parametrize("merchant", ["Friseur Barbara", "Schuhhaus Kjetil", "Buchhandlung Totalbuch", "BIOMARKT DMITRI"])
+def test_keywords_inside_other_words_dont_categorize(merchant):
+    assert categorize(merchant) == "other"
+
+
+@pytest.mark.parametrize("merchant, category", [
+    ("Cafe Central", "restaurant"),
+    ("Bar Celona", "restaurant"),
+    ("McDonald's", "restaurant"),
+    ("Burger-King", "restaurant"),
+    ("Total Tankstelle", "gas_station"),
+    ("BP", "gas_station"),
+    ("Drogeriemarkt DM", "drogerie"),
+    ("H&M Hennes", "clothing"),
+    ("Backstube am Markt", "other"),
+])
+def test_whole_keywords_categorize(merchant, category):
+    assert categorize(merchant) == category
+
+
+def test_heuristic_merchant_is_categorized_by_whole_words():
+    fields = extract_fields("Friseur Barbara\nHauptstr. 1\nDatum 18.09.23 \nSUMME 25,00\n")
+    assert fields["merchant"] == "Friseur Barbara"
+    assert fields["category"] == "other"
+    assert fields["total_amount"] == "25,00"
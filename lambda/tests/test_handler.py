@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+import app
+
+
+def s3_record(key: str, bucket: str = "receipt-uploads") -> dict:
+    return {"eventSource": "aws:s3", "s3": {"bucket": {"name": bucket}, "object": {"key": key}}}
+
+
+def sqs_message(message_id: str, *keys: str) -> dict:
+    return {"eventSource": "aws:sqs", "messageId": message_id,
+            "body": json.dumps({"Records": [s3_record(key) for key in keys]})}
+
+
+@pytest.fixture
+def outcomes(monkeypatch):
+    """Stand-in for process_receipt; maps each key to the result (or exception) it produces"""
+    outcomes = {}
+
+    def process_receipt(bucket, key, trace):
+        outcome = outcomes.get(key, {"status": "success", "receipt_id": f"id-{key}"})
+        if isinstance(outcome, Exception):
+            raise outcome
+        return dict(outcome)
+
+    monkeypatch.setattr(app, "process_receipt", process_receipt)
+    return outcomes
+
+
+def failures(response: dict) -> list:
+    return [failure["itemIdentifier"] for failure in response["batchItemFailures"]]
+
+
+def test_all_succeed(outcomes):
+    response = app.lambda_handler({"Records": [sqs_message("m1", "users/u/a.jpg"), sqs_message("m2", "users/u/b.jpg")]}, None)
+    assert response["status"] == "success"
+    assert failures(response) == []
+    assert [result["key"] for result in response["results"]] == ["users/u/a.jpg", "users/u/b.jpg"]
+
+
+def test_only_failed_messages_are_retried(outcomes):
+    outcomes["users/u/bad.jpg"] = {"status": "error", "message": "DynamoDB throttled"}
+    outcomes["users/u/boom.jpg"] = RuntimeError("OCR crashed")
+    outcomes["users/u/huge.jpg"] = {"status": "error", "message": "Too large", "retryable": False}
+    event = {"Records": [
+        sqs_message("m1", "users/u/ok.jpg"),
+        sqs_message("m2", "users/u/bad.jpg"),
+        sqs_message("m3", "users/u/boom.jpg"),
+        # Rejected uploads would fail again, so they are not retried
+        sqs_message("m4", "users/u/huge.jpg"),
+    ]}
+    response = app.lambda_handler(event, None)
+    assert response["status"] == "partial"
+    assert failures(response) == ["m2", "m3"]
+
+
+def test_message_with_several_objects_is_reported_once(outcomes):
+    outcomes["users/u/b.jpg"] = {"status": "error", "message": "failed"}
+    outcomes["users/u/c.jpg"] = {"status": "error", "message": "failed"}
+    response = app.lambda_handler({"Records": [sqs_message("m1", "users/u/a.jpg", "users/u/b.jpg", "users/u/c.jpg")]}, None)
+    assert failures(response) == ["m1"]
+
+
+def test_malformed_messages_fail_alone(outcomes):
+    event = {"Records": [
+        sqs_message("m1", "users/u/a.jpg"),
+        {"eventSource": "aws:sqs", "messageId": "m2", "body": "not json"},
+        {"eventSource": "aws:sqs", "messageId": "m3", "body": json.dumps({"Records": [{"s3": {}}]})},
+        sqs_message("m4", "users/u/b.jpg"),
+    ]}
+    response = app.lambda_handler(event, None)
+    assert response["status"] == "partial"
+    assert failures(response) == ["m2", "m3"]
+    assert sorted(result["key"] for result in response["results"] if result["status"] == "success") == ["users/u/a.jpg", "users/u/b.jpg"]
+
+
+def test_test_events_are_acknowledged(outcomes):
+    event = {"Records": [{"eventSource": "aws:sqs", "messageId": "m1", "body": json.dumps({"Event": "s3:TestEvent"})}]}
+    response = app.lambda_handler(event, None)
+    assert response["results"] == [] and failures(response) == []
+
+
+def test_keys_are_unquoted(outcomes):
+    response = app.lambda_handler({"Records": [s3_record("users/u/my+receipt%281%29.jpg")]}, None)
+    assert response["results"][0]["key"] == "users/u/my receipt(1).jpg"
+    # Direct S3 notifications have no message to retry
+    assert failures(response) == []
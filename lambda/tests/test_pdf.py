@@ -0,0 +1,38 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pdf2image
+
+import app
+
+
+def test_pages_in_memory_are_capped_across_the_batch(monkeypatch):
+    lock = threading.Lock()
+    held = {"now": 0, "peak": 0}
+
+    def convert_from_path(pdf_path, first_page, **kwargs):
+        with lock:
+            held["now"] += 1
+            held["peak"] = max(held["peak"], held["now"])
+        return [f"{pdf_path}:{first_page}"]
+
+    def ocr_image(page, source):
+        time.sleep(0.01)
+        with lock:
+            held["now"] -= 1
+        return page, None, {"ocr": 1.0}
+
+    monkeypatch.setattr(pdf2image, "convert_from_path", convert_from_path)
+    monkeypatch.setattr(pdf2image, "pdfinfo_from_path", lambda pdf_path: {"Pages": 6})
+    monkeypatch.setattr(app, "ocr_image", ocr_image)
+    monkeypatch.setattr(app, "PDF_PAGE_WORKERS", 4)
+    monkeypatch.setattr(app, "_pdf_page_slots", threading.BoundedSemaphore(2))
+
+    # Four PDFs at once, as in a batch, each with its own page pool of four threads
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(app.ocr_pdf, ["a.pdf", "b.pdf", "c.pdf", "d.pdf"]))
+
+    assert held["peak"] <= 2
+    assert results[1][0] == "\n".join(f"b.pdf:{page}" for page in range(1, 7))
+    assert results[1][2]["ocr"] == 6.0
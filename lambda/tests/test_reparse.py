@@ -0,0 +1,77 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from reparse import reparse_and_refresh
+
+
+def extract(text: str) -> dict:
+    """Stand-in for extract_fields: the text is "merchant;date;total"."""
+    merchant, purchase_date, total = text.split(";")
+    return {"merchant": merchant, "purchase_date": purchase_date, "purchase_time": "", "total_amount": total,
+            "category": "grocery"}
+
+
+def create_table(dynamodb, name: str, *keys: str):
+    return dynamodb.create_table(
+        TableName=name,
+        BillingMode="PAY_PER_REQUEST",
+        KeySchema=[{"AttributeName": key, "KeyType": key_type} for key, key_type in zip(keys, ["HASH", "RANGE"])],
+        AttributeDefinitions=[{"AttributeName": key, "AttributeType": "S"} for key in keys],
+    )
+
+
+@pytest.fixture
+def tables():
+    with mock_aws():
+        dynamodb = boto3.resource("dynamodb")
+        receipts = create_table(dynamodb, "Receipts", "receipt_id")
+        rollups = create_table(dynamodb, "ReceiptMonthlyRollups", "user_id", "year_month")
+        users = create_table(dynamodb, "Users", "user_id")
+        receipts.put_item(Item={"receipt_id": "1", "user_id": "alice", "raw_text": "REWE;01.02.2024;12,50",
+                                "upload_date": "2024-02-01T10:00:00"})
+        receipts.put_item(Item={"receipt_id": "2", "user_id": "bob", "raw_text": "ALDI;03.02.2024;3,00",
+                                "upload_date": "2024-02-03T10:00:00"})
+        yield receipts, rollups, users
+
+
+def versions(users) -> dict:
+    return {item["user_id"]: item["data_version"] for item in users.scan()["Items"]}
+
+
+def test_changed_receipts_refresh_rollups_and_versions(tables):
+    receipts, rollups, users = tables
+    counts = reparse_and_refresh(receipts, extract, rollups_table=rollups, users_table=users, segments=2)
+    assert counts["changed"] == 2
+    assert versions(users) == {"alice": 1, "bob": 1}
+    assert {(item["user_id"], item["year_month"]) for item in rollups.scan()["Items"]} == {
+        ("alice", "2024-02"), ("bob", "2024-02")
+    }
+
+    # Only bob's receipt changes on the next run
+    receipts.update_item(Key={"receipt_id": "2"}, UpdateExpression="SET raw_text = :t",
+                         ExpressionAttributeValues={":t": "ALDI;03.03.2024;3,00"})
+    assert reparse_and_refresh(receipts, extract, rollups_table=rollups, users_table=users, segments=2)["changed"] == 1
+    assert versions(users) == {"alice": 1, "bob": 2}
+    assert ("bob", "2024-03") in {(item["user_id"], item["year_month"]) for item in rollups.scan()["Items"]}
+
+
+def test_unchanged_run_writes_nothing(tables):
+    receipts, rollups, users = tables
+    reparse_and_refresh(receipts, extract, rollups_table=rollups, users_table=users)
+    assert reparse_and_refresh(receipts, extract, rollups_table=rollups, users_table=users)["changed"] == 0
+    assert versions(users) == {"alice": 1, "bob": 1}
+
+
+def test_undated_receipt_is_not_rewritten_on_every_run(tables):
+    receipts, rollups, users = tables
+    receipts.put_item(Item={"receipt_id": "3", "user_id": "carol", "raw_text": "KIOSK;;1,00"})
+    reparse_and_refresh(receipts, extract, users_table=users)
+    assert reparse_and_refresh(receipts, extract, users_table=users)["changed"] == 0
+
+
+def test_dry_run(tables):
+    receipts, rollups, users = tables
+    assert reparse_and_refresh(receipts, extract, rollups_table=rollups, users_table=users, dry_run=True)["changed"] == 2
+    assert users.scan()["Items"] == [] and rollups.scan()["Items"] == []
+    assert "purchase_date" not in receipts.get_item(Key={"receipt_id": "1"})["Item"]
@@ -0,0 +1,56 @@
+"""Storage of a receipt's OCR text outside its DynamoDB item.
+
+DynamoDB bills reads by item size, and the raw OCR text is most of a
+receipt item. Every listing query and analytics scan used to pay for it,
+although only the single-receipt view shows it. The text is therefore stored
+gzip-compressed next to the item:
+
+* With RAW_TEXT_BUCKET set, it goes to an S3 sidecar object
+  ``raw-text/<receipt_id>.json.gz``, together with the word boxes when
+  OCR_CACHE_WORDS is on. The item keeps only ``raw_text_key``.
+* Without a bucket, it is stored as the binary attribute ``raw_text_gz``.
+  That is about a third of the size, but still read with the item.
+
+``read_text`` understands all three layouts, including items written before
+this change that still hold a plain ``raw_text``. The API lambda has its own
+copy of the reader (api/receipt_store.py); keep the two in step.
+"""
+import gzip
+import json
+import os
+
+from boto3.dynamodb.types import Binary
+
+RAW_TEXT_BUCKET = os.environ.get("RAW_TEXT_BUCKET")
+RAW_TEXT_PREFIX = "raw-text/"
+TEXT_ATTRIBUTES = ["raw_text", "raw_text_gz", "raw_text_key"]
+
+
+def text_object_key(receipt_id: str) -> str:
+    return f"{RAW_TEXT_PREFIX}{receipt_id}.json.gz"
+
+
+def store_text(s3, receipt_id: str, text: str, words: list | None = None, bucket: str = RAW_TEXT_BUCKET) -> dict:
+    """Write the text out of line and return the item attributes that point to it."""
+    if bucket:
+        key = text_object_key(receipt_id)
+        s3.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=gzip.compress(json.dumps({"text": text, "words": words}).encode("utf-8")),
+            ContentType="application/gzip",
+        )
+        return {"raw_text_key": key}
+    return {"raw_text_gz": Binary(gzip.compress(text.encode("utf-8")))}
+
+
+def read_text(s3, item: dict, bucket: str = RAW_TEXT_BUCKET) -> str | None:
+    """A receipt's OCR text in whichever layout its item uses, or None if it has none."""
+    if "raw_text" in item:
+        return item["raw_text"]
+    if "raw_text_gz" in item:
+        return gzip.decompress(bytes(item["raw_text_gz"])).decode("utf-8")
+    if "raw_text_key" in item and bucket:
+        obj = s3.get_object(Bucket=bucket, Key=item["raw_text_key"])
+        return json.loads(gzip.decompress(obj["Body"].read()))["text"]
+    return None
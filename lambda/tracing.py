@@ -0,0 +1,143 @@
+"""Per-stage latency tracing for the OCR pipeline.
+
+A ``Trace`` collects the spans of one receipt. A span is a named stage with
+its monotonic duration, plus optional counters such as bytes and pixels:
+
+    with trace.span("download") as span:
+        upload = download(s3, bucket, key)
+        span["bytes"] = upload.size
+
+Stages that are timed elsewhere (preprocess.StageTimer) are added with
+``trace.add``. ``trace.result()`` goes into the handler result. Once per
+invocation, ``emf_record`` folds the traces of all receipts in the batch into a
+single CloudWatch Embedded Metric Format (EMF) line. CloudWatch turns every
+``<stage>_ms``, ``<stage>_bytes`` and ``<stage>_pixels`` value into a metric
+without any PutMetricData calls. The spans themselves stay in the log line
+for Logs Insights.
+
+With TRACING=false, ``new_trace`` returns NULL_TRACE. Its span() hands out
+one shared no-op context manager and records nothing, so the instrumentation
+costs a method call per stage.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+
+TRACING = os.environ.get("TRACING", "true").lower() == "true"
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "ReceiptScanner")
+# EMF accepts at most 100 values per metric in one record
+MAX_METRIC_VALUES = 100
+COUNTER_UNITS = {"bytes": "Bytes", "pixels": "Count"}
+
+
+class Trace:
+    """The spans of one receipt, in the order they finished."""
+
+    enabled = True
+
+    def __init__(self):
+        self.spans = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time a stage; counters can be set on the yielded dict while it runs."""
+        span = {"name": name, **attributes}
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException:
+            span["error"] = True
+            raise
+        finally:
+            span["ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self.spans.append(span)
+
+    def add(self, name: str, ms: float, **attributes):
+        """Record a stage that was timed elsewhere."""
+        self.spans.append({"name": name, "ms": ms, **attributes})
+
+    def result(self) -> dict:
+        return {"total_ms": round((time.perf_counter() - self._started) * 1000, 1), "spans": self.spans}
+
+
+class _NullSpan(dict):
+    """Accepts counters and drops them."""
+
+    def __setitem__(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _NullTrace:
+    enabled = False
+    _span = _NullSpan()
+
+    def span(self, name: str, **attributes):
+        return self._span
+
+    def add(self, name: str, ms: float, **attributes):
+        pass
+
+    def result(self) -> None:
+        return None
+
+
+NULL_TRACE = _NullTrace()
+
+
+def new_trace():
+    return Trace() if TRACING else NULL_TRACE
+
+
+def emf_record(traces: list, function_name: str = None) -> dict | None:
+    """One EMF record with the stage durations and counters of every receipt in the batch, or None if nothing was traced."""
+    results = [trace.result() for trace in traces if trace.enabled]
+    if not results:
+        return None
+    values, units = {}, {}
+    for result in results:
+        # A stage that ran more than once for a receipt (PDF pages, retries) counts once, summed
+        per_receipt = {}
+        for span in result["spans"]:
+            metric = f"{span['name']}_ms"
+            per_receipt[metric] = per_receipt.get(metric, 0) + span["ms"]
+            units[metric] = "Milliseconds"
+            for counter, unit in COUNTER_UNITS.items():
+                if counter in span:
+                    metric = f"{span['name']}_{counter}"
+                    per_receipt[metric] = per_receipt.get(metric, 0) + span[counter]
+                    units[metric] = unit
+        per_receipt["total_ms"] = result["total_ms"]
+        units["total_ms"] = "Milliseconds"
+        for metric, value in per_receipt.items():
+            values.setdefault(metric, []).append(round(value, 1))
+
+    function_name = function_name or os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local")
+    return {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["FunctionName"]],
+                "Metrics": [{"Name": metric, "Unit": unit} for metric, unit in units.items()],
+            }],
+        },
+        "FunctionName": function_name,
+        "receipts": len(results),
+        **{metric: metric_values[:MAX_METRIC_VALUES] for metric, metric_values in values.items()},
+        "traces": results,
+    }
+
+
+def emit(traces: list):
+    """Print the invocation's EMF line; Lambda ships stdout to CloudWatch Logs, which extracts the metrics."""
+    record = emf_record(traces)
+    if record is not None:
+        print(json.dumps(record, separators=(",", ":"), default=str))